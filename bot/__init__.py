@@ -128,6 +128,7 @@ admin_p = user_p + [
     BotCommand("auditip", "根据IP地址审计用户活动 [管理]"),
     BotCommand("auditdevice", "根据设备名审计用户 [管理]"),
     BotCommand("auditclient", "根据客户端名审计用户 [管理]"),
+    BotCommand("auditshare", "检测共用IP/网段/设备的账号簇 [管理]"),
     BotCommand("renew_all", "一键派送天数给所有未封禁的用户 [管理]"),
     BotCommand("coins_all", "一键派送币币给指定等级的用户 [管理]"),
     BotCommand("coins_clear", "一键清除所有用户的币币 [管理]"),
@@ -0,0 +1,199 @@
+"""
+客户端拦截规则匹配器
+- 纯子串规则（如 .*curl.*）走 `in` 判断，其余正则合并成一个预编译的分支表达式
+- 按客户端名缓存判定结果（LRU），同一客户端的后续事件不再执行匹配
+- 统计每条规则的命中次数
+- SessionVerdicts 按 (服务器, 会话) 记录判定结果与是否已处置，同一会话只处置一次
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 出现这些字符的规则按正则处理
+_REGEX_CHARS = set('.^$*+?{}[]\\|()')
+# 按编号引用分组（\1、(?(1)...)）的规则：合并后分组编号会偏移，只能逐条匹配
+_NUMERIC_REF = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d+\)')
+
+
+def _literal(pattern: str) -> Optional[str]:
+    """去掉首尾的 .* 后不含正则元字符时，返回可直接做子串判断的小写文本"""
+    core = pattern
+    while core.startswith('.*'):
+        core = core[2:]
+    while core.endswith('.*') and not core.endswith('\\.*'):
+        core = core[:-2]
+    if not core or any(c in _REGEX_CHARS for c in core):
+        return None
+    return core.lower()
+
+
+class ClientMatcher:
+    """
+    一组拦截规则编译后的只读匹配器
+    规则变化时整体新建一个实例替换，不修改旧实例
+    """
+
+    def __init__(self, patterns: Sequence[str], cache_size: int = 1024, counts: Dict[str, int] = None):
+        self.patterns: Tuple[str, ...] = tuple(patterns)
+        self.cache_size = cache_size
+        self.invalid: List[Tuple[str, str]] = []
+        self._literals: List[Tuple[str, str]] = []
+        regexes: List[str] = []
+        for pattern in self.patterns:
+            literal = _literal(pattern)
+            if literal is not None:
+                self._literals.append((literal, pattern))
+                continue
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                self.invalid.append((pattern, str(e)))
+                continue
+            regexes.append(pattern)
+        # 每条正则放进一个命名分组，匹配后按分组找回是哪条规则；
+        # 按编号引用分组的规则单独匹配，含内联全局标记等无法合并的规则时全部退回逐条匹配
+        merged = [p for p in regexes if not _NUMERIC_REF.search(p)]
+        separate = [p for p in regexes if _NUMERIC_REF.search(p)]
+        self._regex = None
+        if merged:
+            try:
+                self._regex = re.compile('|'.join(f'(?P<_p{i}>{p})' for i, p in enumerate(merged)),
+                                         re.IGNORECASE)
+            except re.error:
+                merged, separate = [], regexes
+        self._regex_patterns = merged
+        self._regex_list: List[Tuple[re.Pattern, str]] = [(re.compile(p, re.IGNORECASE), p) for p in separate]
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.counts: Dict[str, int] = {p: (counts or {}).get(p, 0) for p in self.patterns}
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, client: str) -> Optional[str]:
+        """返回命中的规则，未命中返回 None"""
+        if not client:
+            return None
+        if client in self._cache:
+            self._cache.move_to_end(client)
+            self.hits += 1
+            pattern = self._cache[client]
+        else:
+            self.misses += 1
+            pattern = self._search(client)
+            self._cache[client] = pattern
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if pattern is not None:
+            self.counts[pattern] += 1
+        return pattern
+
+    def is_blocked(self, client: str) -> bool:
+        return self.match(client) is not None
+
+    def _search(self, client: str) -> Optional[str]:
+        lower = client.lower()
+        for literal, pattern in self._literals:
+            if literal in lower:
+                return pattern
+        if self._regex is not None:
+            m = self._regex.search(client)
+            if m:
+                for i, pattern in enumerate(self._regex_patterns):
+                    if m.group(f'_p{i}') is not None:
+                        return pattern
+        for regex, pattern in self._regex_list:
+            if regex.search(client):
+                return pattern
+        return None
+
+    def top(self, n: int = 5) -> List[Tuple[str, int]]:
+        """命中次数最多的规则"""
+        return sorted(((p, c) for p, c in self.counts.items() if c), key=lambda x: -x[1])[:n]
+
+
+class _Session:
+    __slots__ = ('pattern', 'actioned', 'ended', 'expires')
+
+    def __init__(self, pattern: Optional[str], expires: float):
+        self.pattern = pattern
+        self.actioned = False
+        self.ended = False
+        self.expires = expires
+
+    @property
+    def blocked(self) -> bool:
+        return self.pattern is not None
+
+
+class SessionVerdicts:
+    """
+    会话判定表，键为 (server_id, session_id)
+    - 每次事件刷新过期时间；playback.stop 后只保留 end_grace 秒，session.end 立即删除
+    - claim 保证一个被拦截的会话只被处置（终止、封禁、通知）一次
+    """
+
+    def __init__(self, ttl: float = 6 * 3600, end_grace: float = 60, maxsize: int = 10000):
+        self.ttl = ttl
+        self.end_grace = end_grace
+        self.maxsize = maxsize
+        self._sessions: "OrderedDict[tuple, _Session]" = OrderedDict()
+        self._clock = time.monotonic
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, key: tuple) -> Optional[_Session]:
+        """已知会话返回记录并续期，未知或已过期返回 None"""
+        entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        if entry.expires < now:
+            del self._sessions[key]
+            return None
+        if not entry.ended:
+            entry.expires = now + self.ttl
+        self._sessions.move_to_end(key)
+        return entry
+
+    def set(self, key: tuple, pattern: Optional[str]) -> _Session:
+        """记录判定结果（pattern 为命中的规则，None 表示放行），已有记录时保留处置状态"""
+        entry = self._sessions.get(key)
+        if entry is None:
+            entry = self._sessions[key] = _Session(pattern, self._clock() + self.ttl)
+            self._prune()
+        else:
+            entry.pattern = pattern
+        return entry
+
+    def claim(self, key: tuple) -> bool:
+        """被拦截且尚未处置的会话返回 True 并标记为已处置，其余返回 False"""
+        entry = self._sessions.get(key)
+        if entry is None or not entry.blocked or entry.actioned:
+            return False
+        entry.actioned = True
+        return True
+
+    def end(self, key: tuple, grace: bool = True):
+        """
+        会话结束
+        :param grace: True 时保留 end_grace 秒吸收迟到的进度事件，False 时立即删除
+        """
+        if not grace:
+            self._sessions.pop(key, None)
+            return
+        entry = self._sessions.get(key)
+        if entry is not None and not entry.ended:
+            entry.ended = True
+            entry.expires = min(entry.expires, self._clock() + self.end_grace)
+
+    def _prune(self):
+        if len(self._sessions) <= self.maxsize:
+            return
+        now = self._clock()
+        for key in [k for k, e in self._sessions.items() if e.expires < now]:
+            del self._sessions[key]
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
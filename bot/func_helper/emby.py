@@ -4,14 +4,26 @@
 emby的api操作方法 - 使用aiohttp重构版本
 """
 import asyncio
+import copy
+import hashlib
+import json
+import random
+import time
 import aiohttp
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple, Dict, Any, List, Union
+from typing import Optional, Tuple, Dict, Any, List, Union, AsyncIterator
 from contextlib import asynccontextmanager
 
-from bot import emby_url, emby_api, emby_block, extra_emby_libs, LOGGER
+from bot import emby_url, emby_api, emby_block, extra_emby_libs, LOGGER, config
 from bot.sql_helper.sql_emby import sql_update_emby, Emby
-from bot.func_helper.utils import pwd_create, convert_runtime, cache, Singleton, _async_ttl_cache
+from bot.sql_helper import sql_playback
+from bot.func_helper.playback_mirror import playback_mirror
+from bot.func_helper import ip_range
+from bot.func_helper.emby_guard import AdaptiveRateLimiter, CircuitBreaker, guard_status
+from bot.func_helper.user_directory import UserDirectory
+from bot.func_helper.session_table import SessionTable
+from bot.func_helper.image_cache import image_cache
+from bot.func_helper.utils import pwd_create, convert_runtime, cache, Singleton
 
 
 def create_policy(admin=False, disable=False, limit: int = 2, block: list = None):
@@ -75,31 +87,136 @@ def pwd_policy(embyid: str, stats: bool = False, new: str = None) -> Dict[str, A
     return policy
 
 
+def _naive(dt: datetime) -> datetime:
+    """
+    去掉时区信息，与 PlaybackActivity 中的服务器本地时间比较
+    :param dt: 带时区的时间
+    :return: naive datetime
+    """
+    return dt.replace(tzinfo=None, microsecond=0)
+
+
+_ITEM_FIELDS = ('Id', 'Name', 'Type', 'SeriesName', 'ProductionYear', 'DateCreated')
+
+
+def _compact_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从 UserDto 中只保留批量任务需要的字段
+    :param user: Emby 返回的用户
+    :return: 精简后的用户记录
+    """
+    policy = user.get('Policy') or {}
+    return {
+        'Id': user.get('Id'),
+        'Name': user.get('Name'),
+        'IsAdministrator': bool(policy.get('IsAdministrator', False)),
+        'IsDisabled': bool(policy.get('IsDisabled', False)),
+        'LastActivityDate': user.get('LastActivityDate'),
+        'LastLoginDate': user.get('LastLoginDate'),
+    }
+
+
+class EmbyApiError(Exception):
+    """分页迭代等无法返回 (success, data) 的场景下，Emby 请求失败时抛出"""
+
+
 class EmbyApiResult:
     """API 结果统一封装"""
-    def __init__(self, success: bool, data: Any = None, error: str = None):
+    def __init__(self, success: bool, data: Any = None, error: str = None, status: int = None,
+                 headers: Dict[str, str] = None):
         self.success = success
         self.data = data
         self.error = error
+        self.status = status
+        self.headers = headers or {}
     
     def __bool__(self):
         return self.success
 
 
+def _copy_result(result: EmbyApiResult) -> EmbyApiResult:
+    """合并请求的共享结果保持不变，每个调用方得到独立的副本"""
+    return EmbyApiResult(result.success, copy.deepcopy(result.data), result.error,
+                         result.status, dict(result.headers))
+
+
+def _backoff(attempt: int) -> float:
+    """
+    重试等待时间：指数退避 + 随机抖动，避免多个任务同时重试
+    :param attempt: 已尝试次数（从 0 开始）
+    :return: 等待秒数
+    """
+    return min(10.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+def _request_fingerprint(kwargs: Dict[str, Any]) -> str:
+    """
+    请求参数（params/json/data 等）的稳定哈希，用于识别相同请求
+    :param kwargs: 传给 aiohttp 的请求参数
+    :return: sha1 摘要
+    """
+    payload = json.dumps(kwargs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class BulkJob:
+    """
+    批量操作中的单个任务
+    :param emby_id: 用户ID
+    :param method: 要调用的 Embyservice 方法名，如 emby_change_policy / emby_del / disable_all_folders_for_user
+    :param server_id: 所属服务器 ID，多服务器批量时用于分发
+    :param tag: 调用方附带的上下文（如数据库记录），原样带回结果
+    :param kwargs: 传给方法的其余参数
+    """
+    def __init__(self, emby_id: str, method: str = 'emby_change_policy', server_id: str = None,
+                 tag: Any = None, **kwargs):
+        self.emby_id = emby_id
+        self.method = method
+        self.server_id = server_id
+        self.tag = tag
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return f"<BulkJob {self.method}({self.emby_id}) server={self.server_id}>"
+
+
+class BulkResult:
+    """批量操作结果，succeeded 为成功的任务，failed 为 (任务, 错误信息)"""
+    def __init__(self):
+        self.succeeded: List[BulkJob] = []
+        self.failed: List[Tuple[BulkJob, str]] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.succeeded) + len(self.failed)
+
+    def merge(self, other: 'BulkResult') -> 'BulkResult':
+        self.succeeded.extend(other.succeeded)
+        self.failed.extend(other.failed)
+        return self
+
+    def __bool__(self):
+        return not self.failed
+
+
 class Embyservice:
     """
     Emby API 服务类 - 使用 aiohttp 重构版本
     提供统一的异步HTTP请求、错误处理、重试机制和资源管理
     """
 
-    def __init__(self, url: str, api_key: str, timeout: int = 10, max_retries: int = 1):
+    _COALESCE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, url: str, api_key: str, timeout: int = 10, max_retries: int = 1, server_id: str = None):
         """
         初始化 Emby 服务
         :param url: Emby 服务器地址
         :param api_key: API 密钥
         :param timeout: 请求超时时间（秒）
         :param max_retries: 最大重试次数
+        :param server_id: 服务器 ID（多服务器配置中的 id）
         """
+        self.server_id = server_id
         self.url = url.rstrip('/')
         self.api_key = api_key
         self.max_retries = max_retries
@@ -119,6 +236,22 @@ class Embyservice:
         self._session: Optional[aiohttp.ClientSession] = None
         self._session_lock = asyncio.Lock()
 
+        # 按服务器的自适应限速与熔断
+        guard = config.emby_guard
+        self.limiter = AdaptiveRateLimiter(guard.rate, guard.min_rate, guard.max_rate, guard.burst,
+                                           guard.latency_target_ms)
+        self.breaker = CircuitBreaker(guard.failure_threshold, guard.cooldown_seconds)
+
+        # 按 Id / Name 索引的用户目录，减少逐个查询用户
+        self.directory = UserDirectory(self)
+
+        # 活跃会话表，由定时任务拉取 /Sessions 快照，在线人数与并发监控共用
+        self.sessions = SessionTable(self)
+
+        # 进行中的幂等请求，用于合并并发的相同请求
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.coalesce_stats = {'leader': 0, 'coalesced': 0}
+
     @asynccontextmanager
     async def session(self):
         """
@@ -156,17 +289,57 @@ class Embyservice:
     async def _request(self, method: str, endpoint: str, **kwargs) -> EmbyApiResult:
         """
         统一的HTTP请求方法，包含重试机制和错误处理
+        并发的相同 GET/HEAD 请求合并为一次（single-flight），共享结果只读，每个调用方（含发起者）都拿到各自的副本
+        :param method: HTTP方法
+        :param endpoint: API端点
+        :param kwargs: 请求参数
+        :return: EmbyApiResult
+        """
+        method = method.upper()
+        if method not in self._COALESCE_METHODS:
+            return await self._send(method, endpoint, **kwargs)
+
+        key = (method, endpoint, _request_fingerprint(kwargs))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesce_stats['coalesced'] += 1
+            LOGGER.debug(f"合并并发请求: {method} {endpoint}")
+            # shield：某个调用方被取消时不影响共享请求
+            return _copy_result(await asyncio.shield(task))
+
+        self.coalesce_stats['leader'] += 1
+        task = asyncio.ensure_future(self._send(method, endpoint, **kwargs))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 发起者也只拿副本，避免其先恢复执行时修改共享结果、影响尚未复制的跟随者
+        return _copy_result(await asyncio.shield(task))
+
+    async def _send(self, method: str, endpoint: str, **kwargs) -> EmbyApiResult:
+        """
+        实际发送HTTP请求
         :param method: HTTP方法
         :param endpoint: API端点
         :param kwargs: 请求参数
         :return: EmbyApiResult
         """
         url = f"{self.url}{endpoint}"
-        
+
         for attempt in range(self.max_retries):
+            allowed, probe = self.breaker.allow()
+            if not allowed:
+                LOGGER.debug(f"服务器熔断中，拒绝请求: {method} {endpoint}")
+                return EmbyApiResult(False, error=f"服务器暂时不可用（熔断中，{self.breaker.retry_after():.0f}s 后重试）")
             try:
+                await self.limiter.acquire()
+                started = time.monotonic()
                 async with self.session() as session:
                     async with session.request(method, url, **kwargs) as response:
+                        # 5xx 视为服务器不健康，其余状态码说明服务器可正常响应
+                        if response.status >= 500:
+                            self._record_failure()
+                        else:
+                            self._record_success(time.monotonic() - started)
+
                         # 检查HTTP状态码
                         if response.status in [200, 204]:
                             # 处理不同的响应类型
@@ -181,14 +354,19 @@ class Embyservice:
                             else:
                                 # 处理二进制内容（如图片）
                                 content = await response.read()
-                                return EmbyApiResult(True, content)
+                                return EmbyApiResult(True, content, status=response.status,
+                                                     headers=dict(response.headers))
+
+                        elif response.status == 304:
+                            # 条件请求命中，资源未变化
+                            return EmbyApiResult(True, status=304, headers=dict(response.headers))
                         
                         elif response.status == 404:
-                            return EmbyApiResult(False, error="资源不存在")
+                            return EmbyApiResult(False, error="资源不存在", status=404)
                         elif response.status == 401:
-                            return EmbyApiResult(False, error="认证失败，请检查API密钥")
+                            return EmbyApiResult(False, error="认证失败，请检查API密钥", status=401)
                         elif response.status == 403:
-                            return EmbyApiResult(False, error="权限不足")
+                            return EmbyApiResult(False, error="权限不足", status=403)
                         else:
                             error_msg = f"HTTP {response.status}"
                             try:
@@ -200,27 +378,56 @@ class Embyservice:
                             
                             LOGGER.warning(f"API请求失败: {method} {url} - {error_msg}")
                             return EmbyApiResult(False, error=error_msg)
-            
+
+            except asyncio.CancelledError:
+                # 探测请求被取消（如 gather_servers 超时）时成功/失败都不会记录，需释放 half_open 的探测名额；
+                # 熔断前已发出的普通请求被取消时不能动探测名额，否则会放进第二个并发探测
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
             except asyncio.TimeoutError:
+                self._record_failure()
                 LOGGER.warning(f"请求超时 (尝试 {attempt + 1}/{self.max_retries}): {url}")
                 if attempt == self.max_retries - 1:
                     return EmbyApiResult(False, error="请求超时")
-                await asyncio.sleep(1 * (attempt + 1))  # 指数退避
+                await asyncio.sleep(_backoff(attempt))
             
             except aiohttp.ClientError as e:
+                self._record_failure()
                 LOGGER.error(f"网络请求异常 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
                 if attempt == self.max_retries - 1:
                     return EmbyApiResult(False, error=f"网络请求失败: {str(e)}")
-                await asyncio.sleep(1 * (attempt + 1))
+                await asyncio.sleep(_backoff(attempt))
             
             except Exception as e:
+                self._record_failure()
                 LOGGER.error(f"未知异常 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
                 if attempt == self.max_retries - 1:
                     return EmbyApiResult(False, error=f"未知错误: {str(e)}")
-                await asyncio.sleep(1 * (attempt + 1))
+                await asyncio.sleep(_backoff(attempt))
         
         return EmbyApiResult(False, error="达到最大重试次数")
 
+    def _record_success(self, latency: float):
+        self.limiter.on_success(latency)
+        self.breaker.record_success()
+
+    def _record_failure(self):
+        self.limiter.on_failure()
+        state = self.breaker.state
+        self.breaker.record_failure()
+        if state != CircuitBreaker.OPEN and self.breaker.state == CircuitBreaker.OPEN:
+            LOGGER.warning(f"Emby 服务器 {self.server_id or self.url} 连续失败 {self.breaker.failures} 次，"
+                           f"熔断 {self.breaker.cooldown:.0f}s")
+
+    def guard_status(self) -> Dict[str, Any]:
+        """
+        准入控制状态（熔断器、当前限速、请求合并计数）
+        :return: 状态字典
+        """
+        return dict(guard_status(self.limiter, self.breaker), **self.coalesce_stats)
+
     async def emby_create(self, name: str, days: int) -> Union[Tuple[str, str, datetime], bool]:
         """
         创建 Emby 账户
@@ -287,6 +494,7 @@ class Embyservice:
             result = await self._request('DELETE', f'/emby/Users/{emby_id}')
             if result.success:
                 LOGGER.info(f"成功删除用户: {emby_id}")
+                self.directory.remove(emby_id)
                 return True
             else:
                 LOGGER.error(f"删除用户失败: {emby_id} - {result.error}")
@@ -576,27 +784,13 @@ class Embyservice:
 
     async def get_current_playing_count(self) -> int:
         """
-        获取当前播放用户数量
-        :return: 播放用户数量
+        获取当前播放用户数量（读会话表，快照过期时拉取一次 /Sessions）
+        :return: 播放用户数量，无法获取时返回 -1
         """
-        async def _fetch():
-            try:
-                result = await self._request('GET', '/emby/Sessions')
-                if result.success and result.data:
-                    count = 0
-                    for session in result.data:
-                        if session.get("NowPlayingItem"):
-                            count += 1
-                    LOGGER.debug(f"当前播放用户数: {count}")
-                    return count
-                else:
-                    LOGGER.error(f"获取播放数量失败: {result.error}")
-                    return -1
-            except Exception as e:
-                LOGGER.error(f"获取播放数量异常: {str(e)}")
-                return -1
-
-        return await _async_ttl_cache("get_current_playing_count", 120, _fetch)
+        if not await self.sessions.ensure_fresh(max(120, config.session_poll.interval_seconds * 2)):
+            return -1
+        LOGGER.debug(f"当前播放用户数: {self.sessions.playing_count}")
+        return self.sessions.playing_count
 
     async def terminate_session(self, session_id: str, reason: str = "Unauthorized client detected") -> bool:
         """
@@ -644,6 +838,9 @@ class Embyservice:
             result = await self._request('POST', f'/emby/Users/{emby_id}/Policy', json=policy)
             if result.success:
                 LOGGER.info(f"成功修改用户策略: {emby_id}")
+                cached = self.directory.get(emby_id)
+                if cached:
+                    cached.is_admin, cached.is_disabled = admin, disable
                 return True
             else:
                 LOGGER.error(f"修改用户策略失败: {emby_id} - {result.error}")
@@ -652,6 +849,47 @@ class Embyservice:
             LOGGER.error(f"修改用户策略异常: {emby_id} - {str(e)}")
             return False
 
+    async def bulk_apply(self, jobs: List[BulkJob], concurrency: int = None,
+                         retries: int = None) -> BulkResult:
+        """
+        并发执行一批用户操作（限制并发数，失败重试，汇总部分失败）
+        :param jobs: 任务列表
+        :param concurrency: 最大并发数，默认取 config.bulk_ops.concurrency
+        :param retries: 失败重试次数，默认取 config.bulk_ops.retries
+        :return: BulkResult
+        """
+        settings = config.bulk_ops
+        concurrency = max(1, concurrency or settings.concurrency)
+        retries = settings.retries if retries is None else retries
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _run(job: BulkJob) -> Tuple[BulkJob, Optional[str]]:
+            handler = getattr(self, job.method, None)
+            if handler is None:
+                return job, f"不支持的操作: {job.method}"
+            error = None
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    try:
+                        if await handler(job.emby_id, **job.kwargs):
+                            return job, None
+                        error = "Emby API 返回失败"
+                    except Exception as e:
+                        error = str(e)
+                    if attempt < retries:
+                        await asyncio.sleep(settings.retry_delay * (attempt + 1))
+            return job, error
+
+        result = BulkResult()
+        for job, error in await asyncio.gather(*(_run(job) for job in jobs)):
+            if error is None:
+                result.succeeded.append(job)
+            else:
+                result.failed.append((job, error))
+        LOGGER.info(f"批量操作完成 server={self.server_id}: 共 {result.total} 个，"
+                    f"成功 {len(result.succeeded)} 个，失败 {len(result.failed)} 个")
+        return result
+
     async def authority_account(self, tg_id: int, username: str, password: str = None) -> Tuple[bool, Union[str, int]]:
         """
         验证账户
@@ -693,7 +931,15 @@ class Embyservice:
             sub_time = datetime.now(timezone(timedelta(hours=8)))
             start_time = (sub_time - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
             end_time = sub_time.strftime("%Y-%m-%d %H:%M:%S")
-            
+
+            # 本地镜像就绪时直接查本地表
+            if playback_mirror.is_ready(self.server_id):
+                start, end = _naive(sub_time - timedelta(days=days)), _naive(sub_time)
+                if method == 'sp':
+                    rows = await sql_playback.sql_playback_watch_time.aio(self.server_id, start, end)
+                    return [[self.directory.name_of(uid), watch] for uid, watch in rows]
+                return await sql_playback.sql_playback_user_summary.aio(self.server_id, emby_id, start, end)
+
             # 注意：由于Emby API的限制，这里仍然需要拼接SQL
             # 在实际生产环境中，建议在Emby服务器端实现参数化查询
             if method == 'sp':
@@ -734,6 +980,53 @@ class Embyservice:
             LOGGER.error(f"获取用户列表异常: {str(e)}")
             return False, {'error': str(e)}
 
+    async def iter_users(self, page_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """
+        分页遍历用户（/emby/Users/Query），逐个产出精简记录，内存占用与用户总数无关
+        遍历过程中删除用户会使后续分页错位，需要删除时先收集再执行
+        :param page_size: 每页数量
+        :return: 异步迭代器，元素为 {Id, Name, IsAdministrator, IsDisabled, LastActivityDate, LastLoginDate}
+        :raises EmbyApiError: 某一页请求失败
+        """
+        start = 0
+        while True:
+            result = await self._request('GET', '/emby/Users/Query',
+                                         params={'StartIndex': start, 'Limit': page_size})
+            if not result.success:
+                LOGGER.error(f"分页获取用户失败: StartIndex={start} - {result.error}")
+                raise EmbyApiError(f"🤕Emby 服务器连接失败: {result.error}")
+            items = result.data.get('Items', [])
+            for u in items:
+                yield _compact_user(u)
+            start += len(items)
+            if not items or start >= result.data.get('TotalRecordCount', 0):
+                break
+
+    async def iter_items(self, query: Dict[str, Any] = None, page_size: int = 200,
+                         fields: Tuple[str, ...] = _ITEM_FIELDS) -> AsyncIterator[Dict[str, Any]]:
+        """
+        分页遍历媒体项（/emby/Items），逐个产出只含指定字段的记录
+        :param query: Items 查询参数，如 {'IncludeItemTypes': 'Movie', 'Recursive': True}
+        :param page_size: 每页数量
+        :param fields: 保留的字段
+        :return: 异步迭代器
+        :raises EmbyApiError: 某一页请求失败
+        """
+        params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in (query or {}).items()}
+        start = 0
+        while True:
+            params.update(StartIndex=start, Limit=page_size)
+            result = await self._request('GET', '/emby/Items', params=params)
+            if not result.success:
+                LOGGER.error(f"分页获取媒体失败: StartIndex={start} - {result.error}")
+                raise EmbyApiError(f"🤕Emby 服务器连接失败: {result.error}")
+            items = result.data.get('Items', [])
+            for item in items:
+                yield {k: item.get(k) for k in fields}
+            start += len(items)
+            if not items or start >= result.data.get('TotalRecordCount', 0):
+                break
+
     async def user(self, emby_id: str) -> Tuple[bool, Union[Dict, Dict[str, str]]]:
         """
         通过ID获取用户信息
@@ -874,6 +1167,8 @@ class Embyservice:
         :return: (是否成功, 图片数据或错误信息)
         """
         try:
+            if config.image_cache.status:
+                return await image_cache.fetch(self, item_id, 'Primary', width=width, height=height, quality=quality)
             url = f'/emby/Items/{item_id}/Images/Primary?maxHeight={height}&maxWidth={width}&quality={quality}'
             result = await self._request('GET', url)
             if result.success:
@@ -895,6 +1190,8 @@ class Embyservice:
         :return: (是否成功, 图片数据或错误信息)
         """
         try:
+            if config.image_cache.status:
+                return await image_cache.fetch(self, item_id, 'Backdrop', width=width, quality=quality)
             url = f'/emby/Items/{item_id}/Images/Backdrop?maxWidth={width}&quality={quality}'
             result = await self._request('GET', url)
             if result.success:
@@ -943,7 +1240,20 @@ class Embyservice:
             
             start_time = (end_date - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
             end_time = end_date.strftime('%Y-%m-%d %H:%M:%S')
-            
+
+            if emby_id and not emby_id.replace('-', '').replace('_', '').isalnum():
+                LOGGER.error(f"无效的用户ID格式: {emby_id}")
+                return False, "无效的用户ID格式"
+
+            # 本地镜像就绪时直接查本地表
+            if playback_mirror.is_ready(self.server_id):
+                rows = await sql_playback.sql_playback_report.aio(
+                    self.server_id, types, _naive(end_date - timedelta(days=days)), _naive(end_date),
+                    emby_id=emby_id, limit=limit, exclude_users=playback_mirror.hidden_users(self.server_id))
+                if not rows:
+                    return False, "无数据"
+                return True, rows
+
             # 构建安全的SQL查询
             sql_parts = [
                 "SELECT UserId, ItemId, ItemType,",
@@ -957,10 +1267,6 @@ class Embyservice:
             ]
             
             if emby_id:
-                # 验证user_id格式，防止SQL注入
-                if not emby_id.replace('-', '').replace('_', '').isalnum():
-                    LOGGER.error(f"无效的用户ID格式: {emby_id}")
-                    return False, "无效的用户ID格式"
                 sql_parts.append(f"AND UserId = '{emby_id}'")
             
             sql_parts.extend([
@@ -1001,7 +1307,13 @@ class Embyservice:
             if not emby_id.replace('-', '').replace('_', '').isalnum():
                 LOGGER.error(f"无效的用户ID格式: {emby_id}")
                 return False, "无效的用户ID格式"
-            
+
+            if playback_mirror.is_ready(self.server_id):
+                rows = await sql_playback.sql_playback_user_ips.aio(self.server_id, emby_id)
+                if not rows:
+                    return False, "无数据"
+                return True, rows
+
             sql = f"SELECT DeviceName,ClientName, RemoteAddress FROM PlaybackActivity WHERE UserId = '{emby_id}'"
             data = {
                 "CustomQueryString": sql,
@@ -1023,86 +1335,186 @@ class Embyservice:
             LOGGER.error(f"获取用户设备信息异常: {emby_id} - {str(e)}")
             return False, str(e)
 
-    async def get_users_by_ip(self, ip_address: str, days: int = None) -> Tuple[bool, Union[List[Dict], str]]:
+    async def get_playback_activity_since(self, since: str = None, limit: int = 5000,
+                                          offset: int = 0) -> Tuple[bool, Union[List[list], str]]:
         """
-        根据IP地址查询使用该IP的用户信息（已修复SQL注入问题）
-        :param ip_address: IP地址
-        :param days: 查询天数范围，默认30天
-        :return: (是否成功, 用户信息列表或错误信息)
+        按 DateCreated 升序增量拉取 PlaybackActivity 原始记录，供本地镜像同步使用
+        :param since: 起始时间（%Y-%m-%d %H:%M:%S），None 表示从头拉取
+        :param limit: 单批条数
+        :param offset: 跳过的条数（同一秒内的记录超过一批时按 rowid 稳定排序续拉）
+        :return: (是否成功, [[DateCreated, UserId, ItemId, ItemType, ItemName, ClientName, DeviceName,
+                 RemoteAddress, PlayDuration, PauseDuration], ...] 或错误信息)
         """
         try:
-            # 验证IP地址格式（简单验证）
-            import re
-            ip_pattern = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-            if not re.match(ip_pattern, ip_address):
-                LOGGER.error(f"无效的IP地址格式: {ip_address}")
-                return False, "无效的IP地址格式"
-            
-            
-            
-            # 构建安全的SQL查询，查询使用指定IP的用户
-            sql = f"""
-                SELECT DISTINCT UserId, 
-                       DeviceName, 
-                       ClientName, 
-                       RemoteAddress,
-                       MAX(DateCreated) AS LastActivity,
-                       COUNT(*) AS ActivityCount
-                FROM PlaybackActivity 
-                WHERE RemoteAddress = '{ip_address}' 
-                
-            """
-            if days:
-                # 计算查询时间范围
-                sub_time = datetime.now(timezone(timedelta(hours=8)))
-                start_time = (sub_time - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-                end_time = sub_time.strftime("%Y-%m-%d %H:%M:%S")
-                sql += f" AND DateCreated >= '{start_time}' AND DateCreated <= '{end_time}'"
-            sql += " GROUP BY UserId, DeviceName, ClientName, RemoteAddress"
-            sql += " ORDER BY LastActivity DESC"
-            
+            if since and not since.replace('-', '').replace(':', '').replace(' ', '').isdigit():
+                LOGGER.error(f"无效的时间格式: {since}")
+                return False, "无效的时间格式"
+
+            sql_parts = [
+                "SELECT DateCreated, UserId, ItemId, ItemType, ItemName, ClientName, DeviceName,",
+                "RemoteAddress, PlayDuration, PauseDuration FROM PlaybackActivity",
+            ]
+            if since:
+                sql_parts.append(f"WHERE DateCreated >= '{since}'")
+            sql_parts.extend([
+                "ORDER BY DateCreated ASC, rowid ASC",
+                f"LIMIT {int(limit)} OFFSET {int(offset)}"
+            ])
             data = {
-                "CustomQueryString": sql,
+                "CustomQueryString": " ".join(sql_parts),
                 "ReplaceUserId": False
             }
-            
+
             result = await self._request('POST', f'/emby/user_usage_stats/submit_custom_query?api_key={emby_api}', json=data)
             if result.success and result.data:
                 ret = result.data
                 if len(ret.get("colums", [])) == 0:
-                    return False, ret.get("message", "无数据")
-                
-                # 获取查询结果
-                results = ret.get("results", [])
-                
-                # 为每个用户获取用户名信息
-                enriched_results = []
-                for result_item in results:
-                    user_id = result_item[0]  # UserId 是第一列
-                    
-                    # 获取用户详细信息
-                    user_success, user_info = await self.user(user_id)
-                    username = "未知用户"
-                    if user_success and isinstance(user_info, dict):
-                        username = user_info.get("Name", "未知用户")
-                    
-                    enriched_item = {
-                        "UserId": user_id,
-                        "Username": username,
-                        "DeviceName": result_item[1],
-                        "ClientName": result_item[2], 
-                        "RemoteAddress": result_item[3],
-                        "LastActivity": result_item[4],
-                        "ActivityCount": result_item[5]
-                    }
-                    enriched_results.append(enriched_item)
-                
-                LOGGER.info(f"根据IP查询用户成功: {ip_address} - 找到 {len(enriched_results)} 个用户")
-                return True, enriched_results
+                    # 没有新记录时插件同样不返回列
+                    return True, []
+                return True, ret.get("results", [])
+            return False, f"🤕Emby 服务器连接失败: {result.error}"
+
+        except Exception as e:
+            LOGGER.error(f"拉取播放记录异常: {str(e)}")
+            return False, str(e)
+
+    async def get_playback_hidden_users(self) -> Optional[set]:
+        """
+        获取 Playback Reporting 插件中设置为隐藏的用户（UserList 表）
+        :return: 用户ID集合，失败返回 None
+        """
+        try:
+            data = {
+                "CustomQueryString": "SELECT UserId FROM UserList",
+                "ReplaceUserId": False
+            }
+            result = await self._request('POST', f'/emby/user_usage_stats/submit_custom_query?api_key={emby_api}', json=data)
+            if not result.success or not result.data:
+                LOGGER.warning(f"获取播放统计隐藏用户失败: {result.error}")
+                return None
+            return {row[0] for row in result.data.get("results", []) if row}
+        except Exception as e:
+            LOGGER.error(f"获取播放统计隐藏用户异常: {str(e)}")
+            return None
+
+    async def _query_activity(self, where: str, days: int = None, **local_filter) -> Tuple[bool, Union[List[list], str]]:
+        """
+        按条件查询用户+设备+客户端+IP 聚合的播放活动
+        本地镜像就绪时读本地表，否则向插件提交自定义查询
+        :param where: 插件查询的 WHERE 条件（调用方负责转义）
+        :param days: 查询天数范围，None 表示所有时间
+        :param local_filter: 本地查询条件 ip / ip_range / device / client
+        :return: (是否成功, [[UserId, DeviceName, ClientName, RemoteAddress, LastActivity, ActivityCount], ...] 或错误信息)
+        """
+        sub_time = datetime.now(timezone(timedelta(hours=8)))
+        if playback_mirror.is_ready(self.server_id):
+            start = _naive(sub_time - timedelta(days=days)) if days else None
+            end = _naive(sub_time) if days else None
+            rows = await sql_playback.sql_playback_activity_by.aio(
+                self.server_id, start=start, end=end, **local_filter)
+            if not rows:
+                return False, "无数据"
+            return True, rows
+
+        sql = f"""
+            SELECT DISTINCT UserId, 
+                   DeviceName, 
+                   ClientName, 
+                   RemoteAddress,
+                   MAX(DateCreated) AS LastActivity,
+                   COUNT(*) AS ActivityCount
+            FROM PlaybackActivity 
+            WHERE {where} 
+        """
+        if days:
+            # 计算查询时间范围
+            start_time = (sub_time - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            end_time = sub_time.strftime("%Y-%m-%d %H:%M:%S")
+            sql += f" AND DateCreated >= '{start_time}' AND DateCreated <= '{end_time}'"
+        sql += " GROUP BY UserId, DeviceName, ClientName, RemoteAddress"
+        sql += " ORDER BY LastActivity DESC"
+
+        data = {
+            "CustomQueryString": sql,
+            "ReplaceUserId": False
+        }
+
+        result = await self._request('POST', f'/emby/user_usage_stats/submit_custom_query?api_key={emby_api}', json=data)
+        if result.success and result.data:
+            ret = result.data
+            if len(ret.get("colums", [])) == 0:
+                return False, ret.get("message", "无数据")
+            return True, ret.get("results", [])
+        return False, f"🤕Emby 服务器连接失败: {result.error}"
+
+    async def _enrich_activity(self, results: List[list]) -> List[Dict]:
+        """
+        为活动查询结果补充用户名
+        :param results: _query_activity 返回的行
+        :return: 字典列表
+        """
+        # UserId 是第一列，通过用户目录一次批量解析（未命中较多时整表刷新，否则有限并发回退）
+        users = await self.directory.resolve_many(r[0] for r in results)
+        enriched_results = []
+        for result_item in results:
+            user_id = result_item[0]
+            user = users.get(user_id)
+            username = user.name if user else "未知用户"
+
+            enriched_item = {
+                "UserId": user_id,
+                "Username": username,
+                "DeviceName": result_item[1],
+                "ClientName": result_item[2],
+                "RemoteAddress": result_item[3],
+                "LastActivity": result_item[4] if len(result_item) > 4 else "未知",
+                "ActivityCount": result_item[5] if len(result_item) > 5 else 0
+            }
+            enriched_results.append(enriched_item)
+        return enriched_results
+
+    async def get_users_by_ip(self, ip_address: str, days: int = None) -> Tuple[bool, Union[List[Dict], str]]:
+        """
+        根据IP地址或网段查询使用过的用户信息
+        支持 IPv4 / IPv6 单个地址和 CIDR 网段（如 1.2.3.0/24、2001:db8::/48）；
+        本地镜像按 ip_bin 区间查询，插件查询只能按文本匹配，网段取八位组对齐的前缀再精确过滤
+        :param ip_address: IP地址或CIDR网段
+        :param days: 查询天数范围，默认30天
+        :return: (是否成功, 用户信息列表或错误信息)
+        """
+        try:
+            network = ip_range.parse_network(ip_address)
+            if network is None:
+                LOGGER.error(f"无效的IP地址格式: {ip_address}")
+                return False, "无效的IP地址或网段格式"
+
+            if playback_mirror.is_ready(self.server_id):
+                # 单个地址也按 ip_bin 区间查询，1.2.3.4 与 ::ffff:1.2.3.4 两种写法都能命中
+                success, results = await self._query_activity(
+                    "", days, ip_range=ip_range.network_bounds(network))
+            elif ip_range.is_single(network):
+                address = str(network.network_address)
+                where = f"RemoteAddress = '{address}'"
+                if network.version == 4:
+                    where = f"({where} OR RemoteAddress = '::ffff:{address}')"
+                success, results = await self._query_activity(where, days)
             else:
-                LOGGER.error(f"根据IP查询用户失败: {ip_address} - {result.error}")
-                return False, f"🤕Emby 服务器连接失败: {result.error}"
-                
+                prefix = ip_range.like_prefix(network)
+                if prefix is None:
+                    return False, "IPv6 网段查询需要启用播放记录本地同步"
+                success, results = await self._query_activity(f"RemoteAddress LIKE '{prefix}'", days)
+                if success:
+                    results = [r for r in results if ip_range.in_network(r[3] or '', network)]
+                    if not results:
+                        success, results = False, "无数据"
+            if not success:
+                LOGGER.error(f"根据IP查询用户失败: {ip_address} - {results}")
+                return False, results
+
+            enriched_results = await self._enrich_activity(results)
+            LOGGER.info(f"根据IP查询用户成功: {ip_address} - 找到 {len(enriched_results)} 个用户")
+            return True, enriched_results
+
         except Exception as e:
             LOGGER.error(f"根据IP查询用户异常: {ip_address} - {str(e)}")
             return False, str(e)
@@ -1119,72 +1531,20 @@ class Embyservice:
             if not device_name or len(device_name.strip()) == 0:
                 LOGGER.error("设备名关键词不能为空")
                 return False, "设备名关键词不能为空"
-            
+
             # 清理关键词，防止SQL注入
             safe_keyword = device_name.replace("'", "''").replace(";", "").replace("--", "")
-            
-            # 构建安全的SQL查询，查询使用包含指定关键词的设备名的用户
-            sql = f"""
-                SELECT DISTINCT UserId, 
-                       DeviceName, 
-                       ClientName, 
-                       RemoteAddress,
-                       MAX(DateCreated) AS LastActivity,
-                       COUNT(*) AS ActivityCount
-                FROM PlaybackActivity 
-                WHERE DeviceName LIKE '%{safe_keyword}%' 
-            """
-            if days:
-                # 计算查询时间范围
-                sub_time = datetime.now(timezone(timedelta(hours=8)))
-                start_time = (sub_time - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-                end_time = sub_time.strftime("%Y-%m-%d %H:%M:%S")
-                sql += f" AND DateCreated >= '{start_time}' AND DateCreated <= '{end_time}'"
-            sql += " GROUP BY UserId, DeviceName, ClientName, RemoteAddress"
-            sql += " ORDER BY LastActivity DESC"
-            
-            data = {
-                "CustomQueryString": sql,
-                "ReplaceUserId": False
-            }
-            
-            result = await self._request('POST', f'/emby/user_usage_stats/submit_custom_query?api_key={emby_api}', json=data)
-            if result.success and result.data:
-                ret = result.data
-                if len(ret.get("colums", [])) == 0:
-                    return False, ret.get("message", "无数据")
-                
-                # 获取查询结果
-                results = ret.get("results", [])
-                
-                # 为每个用户获取用户名信息
-                enriched_results = []
-                for result_item in results:
-                    user_id = result_item[0]  # UserId 是第一列
-                    
-                    # 获取用户详细信息
-                    user_success, user_info = await self.user(user_id)
-                    username = "未知用户"
-                    if user_success and isinstance(user_info, dict):
-                        username = user_info.get("Name", "未知用户")
-                    
-                    enriched_item = {
-                        "UserId": user_id,
-                        "Username": username,
-                        "DeviceName": result_item[1],
-                        "ClientName": result_item[2], 
-                        "RemoteAddress": result_item[3],
-                        "LastActivity": result_item[4] if len(result_item) > 4 else "未知",
-                        "ActivityCount": result_item[5] if len(result_item) > 5 else 0
-                    }
-                    enriched_results.append(enriched_item)
-                
-                LOGGER.info(f"根据设备名查询用户成功: {device_name} - 找到 {len(enriched_results)} 个用户")
-                return True, enriched_results
-            else:
-                LOGGER.error(f"根据设备名查询用户失败: {device_name} - {result.error}")
-                return False, f"🤕Emby 服务器连接失败: {result.error}"
-                
+
+            success, results = await self._query_activity(
+                f"DeviceName LIKE '%{safe_keyword}%'", days, device=device_name)
+            if not success:
+                LOGGER.error(f"根据设备名查询用户失败: {device_name} - {results}")
+                return False, results
+
+            enriched_results = await self._enrich_activity(results)
+            LOGGER.info(f"根据设备名查询用户成功: {device_name} - 找到 {len(enriched_results)} 个用户")
+            return True, enriched_results
+
         except Exception as e:
             LOGGER.error(f"根据设备名查询用户异常: {device_name} - {str(e)}")
             return False, str(e)
@@ -1201,72 +1561,20 @@ class Embyservice:
             if not client_name or len(client_name.strip()) == 0:
                 LOGGER.error("客户端名关键词不能为空")
                 return False, "客户端名关键词不能为空"
-            
+
             # 清理关键词，防止SQL注入
             safe_keyword = client_name.replace("'", "''").replace(";", "").replace("--", "")
-            
-            # 构建安全的SQL查询，查询使用包含指定关键词的客户端名的用户
-            sql = f"""
-                SELECT DISTINCT UserId, 
-                       DeviceName, 
-                       ClientName, 
-                       RemoteAddress,
-                       MAX(DateCreated) AS LastActivity,
-                       COUNT(*) AS ActivityCount
-                FROM PlaybackActivity 
-                WHERE ClientName LIKE '%{safe_keyword}%' 
-            """
-            if days:
-                # 计算查询时间范围
-                sub_time = datetime.now(timezone(timedelta(hours=8)))
-                start_time = (sub_time - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-                end_time = sub_time.strftime("%Y-%m-%d %H:%M:%S")
-                sql += f" AND DateCreated >= '{start_time}' AND DateCreated <= '{end_time}'"
-            sql += " GROUP BY UserId, DeviceName, ClientName, RemoteAddress"
-            sql += " ORDER BY LastActivity DESC"
-            
-            data = {
-                "CustomQueryString": sql,
-                "ReplaceUserId": False
-            }
-            
-            result = await self._request('POST', f'/emby/user_usage_stats/submit_custom_query?api_key={emby_api}', json=data)
-            if result.success and result.data:
-                ret = result.data
-                if len(ret.get("colums", [])) == 0:
-                    return False, ret.get("message", "无数据")
-                
-                # 获取查询结果
-                results = ret.get("results", [])
-                
-                # 为每个用户获取用户名信息
-                enriched_results = []
-                for result_item in results:
-                    user_id = result_item[0]  # UserId 是第一列
-                    
-                    # 获取用户详细信息
-                    user_success, user_info = await self.user(user_id)
-                    username = "未知用户"
-                    if user_success and isinstance(user_info, dict):
-                        username = user_info.get("Name", "未知用户")
-                    
-                    enriched_item = {
-                        "UserId": user_id,
-                        "Username": username,
-                        "DeviceName": result_item[1],
-                        "ClientName": result_item[2], 
-                        "RemoteAddress": result_item[3],
-                        "LastActivity": result_item[4] if len(result_item) > 4 else "未知",
-                        "ActivityCount": result_item[5] if len(result_item) > 5 else 0
-                    }
-                    enriched_results.append(enriched_item)
-                
-                LOGGER.info(f"根据客户端名查询用户成功: {client_name} - 找到 {len(enriched_results)} 个用户")
-                return True, enriched_results
-            else:
-                LOGGER.error(f"根据客户端名查询用户失败: {client_name} - {result.error}")
-                return False, f"🤕Emby 服务器连接失败: {result.error}"
-                
+
+            success, results = await self._query_activity(
+                f"ClientName LIKE '%{safe_keyword}%'", days, client=client_name)
+            if not success:
+                LOGGER.error(f"根据客户端名查询用户失败: {client_name} - {results}")
+                return False, results
+
+            enriched_results = await self._enrich_activity(results)
+            LOGGER.info(f"根据客户端名查询用户成功: {client_name} - 找到 {len(enriched_results)} 个用户")
+            return True, enriched_results
+
         except Exception as e:
             LOGGER.error(f"根据客户端名查询用户异常: {client_name} - {str(e)}")
             return False, str(e)
@@ -1279,6 +1587,14 @@ class Embyservice:
         :return: (是否成功, 设备数据, 是否有上一页, 是否有下一页)
         """
         try:
+            if playback_mirror.is_ready(self.server_id):
+                rows = await sql_playback.sql_playback_user_devices.aio(self.server_id, offset=offset, limit=limit)
+                results = [[self.directory.name_of(r[0]), r[1], r[2]] for r in rows]
+                has_next = len(results) > limit
+                if has_next:
+                    results = results[:-1]
+                return True, results, offset > 0, has_next
+
             sql = f"""
                 SELECT UserId, 
                        COUNT(DISTINCT DeviceName || '' || ClientName) AS device_count,
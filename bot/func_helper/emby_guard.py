@@ -0,0 +1,132 @@
+"""
+Emby 请求准入控制
+- AdaptiveRateLimiter：按服务器的令牌桶，速率随延迟与错误率做 AIMD 调整
+- CircuitBreaker：连续失败后熔断，冷却后放行单个探测请求
+"""
+import asyncio
+import time
+from typing import Any, Dict, Tuple
+
+
+class AdaptiveRateLimiter:
+    """
+    自适应令牌桶
+    请求正常时速率加性增长，延迟超标或出错时乘性下降
+    """
+
+    def __init__(self, rate: float, min_rate: float, max_rate: float, burst: int, latency_target_ms: float):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.burst = max(1, int(burst))
+        self.latency_target = latency_target_ms / 1000
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """取一个令牌，不足时按当前速率等待（先到先得）"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self, latency: float):
+        """
+        记录一次成功请求
+        :param latency: 请求耗时（秒）
+        """
+        if latency > self.latency_target:
+            self._decrease(0.7)
+        else:
+            # 加性增长：大约每秒提升 1 req/s
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+
+    def on_failure(self):
+        """记录一次超时/连接错误/5xx"""
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float):
+        # 同一批并发请求同时失败时只降一次
+        now = time.monotonic()
+        if now - self._last_decrease < 1:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+
+
+class CircuitBreaker:
+    """
+    熔断器：closed -> open（连续失败达到阈值）-> half_open（冷却结束，放行一个探测）-> closed/open
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        当前是否允许发出请求
+        :return: (是否放行, 是否占用了 half_open 的探测名额)
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False, False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False, False
+            self._probing = True
+            return True, True
+        return True, False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        """探测请求未得出结果（被取消）时释放探测名额，下一个请求重新探测；只应由占用名额的请求调用"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """熔断剩余冷却秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+
+def guard_status(limiter: AdaptiveRateLimiter, breaker: CircuitBreaker) -> Dict[str, Any]:
+    """
+    准入控制状态快照，供健康检查与 /servers 展示
+    """
+    return {
+        'breaker': breaker.state,
+        'failures': breaker.failures,
+        'retry_after': round(breaker.retry_after(), 1),
+        'rate': round(limiter.rate, 2),
+    }
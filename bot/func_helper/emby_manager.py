@@ -3,13 +3,39 @@ Emby 服务器管理器
 管理多个 Emby 服务器实例
 """
 
-from typing import Dict, Optional
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from loguru import logger
 
-from bot.func_helper.emby import Embyservice
+from bot import config
+from bot.func_helper.emby import Embyservice, BulkJob, BulkResult
 from bot.schemas.schemas import EmbyServerConfig
 
 
+class FanOutResult:
+    """跨服务器并发调用结果，results 为 server_id -> 返回值，errors 为 server_id -> 错误信息"""
+
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+
+    def values(self) -> List[Any]:
+        """按服务器注册顺序排列的成功结果"""
+        return list(self.results.values())
+
+    def __bool__(self):
+        return not self.errors
+
+
+class FanOutError(Exception):
+    """return_partial=False 时有服务器失败或超时"""
+
+    def __init__(self, result: FanOutResult):
+        self.result = result
+        super().__init__('; '.join(f'{sid}: {err}' for sid, err in result.errors.items()))
+
+
 class EmbyServerManager:
     """
     Emby 服务器管理器（单例模式）
@@ -30,6 +56,10 @@ class EmbyServerManager:
         if not self._initialized:
             self._servers: Dict[str, Embyservice] = {}
             self._configs: Dict[str, EmbyServerConfig] = {}
+            # 路由表：会话 / Emby 用户 / Emby 服务器自身 Id -> 配置中的 server_id
+            self._session_owner: "OrderedDict[str, str]" = OrderedDict()
+            self._user_owner: "OrderedDict[str, str]" = OrderedDict()
+            self._emby_server_ids: Dict[str, str] = {}
             self._initialized = True
             logger.info("EmbyServerManager 初始化完成")
 
@@ -56,7 +86,8 @@ class EmbyServerManager:
                 url=server_config.url,
                 api_key=server_config.api_key,
                 timeout=10,
-                max_retries=1
+                max_retries=config.emby_guard.max_retries,
+                server_id=server_id
             )
 
             self._servers[server_id] = instance
@@ -135,6 +166,170 @@ class EmbyServerManager:
         """
         return len(self._servers)
 
+    # ==================== 会话 / 用户路由 ====================
+
+    # 路由表容量，超出后淘汰最早记录
+    _MAX_ROUTES = 20000
+
+    def _remember(self, table: OrderedDict, key: str, server_id: str):
+        if not key or server_id not in self._servers:
+            return
+        table[key] = server_id
+        table.move_to_end(key)
+        if len(table) > self._MAX_ROUTES:
+            table.popitem(last=False)
+
+    def note_webhook(self, server_id: str, webhook_data: dict):
+        """
+        从按服务器区分的 Webhook 中记录会话、用户与 Emby 服务器 Id 的归属
+
+        Args:
+            server_id: Webhook 路由中的服务器 ID
+            webhook_data: Webhook 原始数据
+        """
+        if not webhook_data or server_id not in self._servers:
+            return
+        emby_server_id = (webhook_data.get("Server") or {}).get("Id")
+        if emby_server_id:
+            self._emby_server_ids[emby_server_id] = server_id
+        self._remember(self._session_owner, (webhook_data.get("Session") or {}).get("Id"), server_id)
+        self._remember(self._user_owner, (webhook_data.get("User") or {}).get("Id"), server_id)
+
+    def server_of_webhook(self, webhook_data: dict) -> Optional[str]:
+        """根据 Webhook 中 Emby 服务器自身的 Id 找到配置中的 server_id（需先在按服务器的路由上见过）"""
+        emby_server_id = (webhook_data.get("Server") or {}).get("Id")
+        return self._emby_server_ids.get(emby_server_id) if emby_server_id else None
+
+    def owner_of(self, emby_id: str = None, session_id: str = None) -> Optional[str]:
+        """
+        查找会话或 Emby 用户所在的服务器
+        依次查会话表、用户表、各服务器的用户目录，都没有时返回 None
+        """
+        if session_id and session_id in self._session_owner:
+            return self._session_owner[session_id]
+        if emby_id:
+            if emby_id in self._user_owner:
+                return self._user_owner[emby_id]
+            for server_id, server in self._servers.items():
+                if server.directory.get(emby_id) is not None:
+                    return server_id
+        return None
+
+    def route(self, server_id: str = None, emby_id: str = None,
+              session_id: str = None) -> List[Tuple[str, Embyservice]]:
+        """
+        按优先级排列的候选服务器：已知归属的服务器在前，其余服务器作为兜底
+
+        Returns:
+            [(server_id, Embyservice), ...]
+        """
+        owner = server_id if server_id in self._servers else self.owner_of(emby_id, session_id)
+        servers = list(self._servers.items())
+        if owner is not None:
+            servers.sort(key=lambda item: item[0] != owner)
+        return servers
+
+    async def terminate_session(self, session_id: str, reason: str, server_id: str = None,
+                                emby_id: str = None) -> Optional[str]:
+        """
+        终止会话，优先发往会话所在服务器，失败时依次尝试其他服务器
+
+        Returns:
+            成功终止会话的 server_id，全部失败返回 None
+        """
+        for sid, server in self.route(server_id, emby_id, session_id):
+            try:
+                if await server.terminate_session(session_id, reason):
+                    self._remember(self._session_owner, session_id, sid)
+                    return sid
+            except Exception as e:
+                logger.debug(f"服务器 {sid} 终止会话失败: {e}")
+        return None
+
+    async def change_policy(self, emby_id: str, disable: bool, server_id: str = None,
+                            session_id: str = None) -> Optional[str]:
+        """
+        修改用户策略（封禁/解封），优先发往用户所在服务器，失败时依次尝试其他服务器
+
+        Returns:
+            操作成功的 server_id，全部失败返回 None
+        """
+        for sid, server in self.route(server_id, emby_id, session_id):
+            try:
+                if await server.emby_change_policy(emby_id=emby_id, disable=disable):
+                    self._remember(self._user_owner, emby_id, sid)
+                    return sid
+            except Exception as e:
+                logger.debug(f"服务器 {sid} 修改用户策略失败: {e}")
+        return None
+
+    async def bulk_apply(self, jobs: List[BulkJob], concurrency: int = None,
+                         retries: int = None) -> BulkResult:
+        """
+        按 server_id 分发批量任务，各服务器并行执行，服务器内部限制并发
+
+        Args:
+            jobs: 任务列表，每个任务需设置 server_id
+            concurrency: 每个服务器的最大并发数，默认取配置
+            retries: 失败重试次数，默认取配置
+
+        Returns:
+            合并后的 BulkResult
+        """
+        result = BulkResult()
+        grouped: Dict[str, List[BulkJob]] = {}
+        for job in jobs:
+            if job.server_id in self._servers:
+                grouped.setdefault(job.server_id, []).append(job)
+            else:
+                result.failed.append((job, f"服务器不存在: {job.server_id}"))
+
+        server_results = await asyncio.gather(*(
+            self._servers[server_id].bulk_apply(server_jobs, concurrency=concurrency, retries=retries)
+            for server_id, server_jobs in grouped.items()
+        ))
+        for server_result in server_results:
+            result.merge(server_result)
+        return result
+
+    async def gather_servers(self, fn: Callable[[str, Embyservice], Awaitable[Any]], timeout: float = None,
+                             return_partial: bool = True, server_ids: List[str] = None) -> FanOutResult:
+        """
+        对每个服务器并发执行同一协程，单个服务器超时或出错不影响其他服务器
+
+        Args:
+            fn: 协程函数 (server_id, emby_service) -> 结果
+            timeout: 单个服务器的最长等待时间（秒），默认取配置，0 表示不限时（批量写操作）
+            return_partial: False 时任一服务器失败即抛出 FanOutError
+            server_ids: 只在这些服务器上执行，默认全部
+
+        Returns:
+            FanOutResult，results 按服务器注册顺序排列
+        """
+        if timeout is None:
+            timeout = config.emby_guard.fanout_timeout
+        targets = [(sid, self._servers[sid]) for sid in (server_ids or self._servers) if sid in self._servers]
+
+        async def _one(server_id: str, service: Embyservice):
+            try:
+                return True, await asyncio.wait_for(fn(server_id, service), timeout or None)
+            except asyncio.TimeoutError:
+                return False, f"超时（{timeout}s）"
+            except Exception as e:
+                return False, str(e) or type(e).__name__
+
+        outcomes = await asyncio.gather(*(_one(sid, service) for sid, service in targets))
+        result = FanOutResult()
+        for (server_id, _), (ok, value) in zip(targets, outcomes):
+            if ok:
+                result.results[server_id] = value
+            else:
+                result.errors[server_id] = value
+                logger.warning(f"服务器 {server_id} 并发调用失败: {value}")
+        if result.errors and not return_partial:
+            raise FanOutError(result)
+        return result
+
     async def close_all(self) -> None:
         """
         关闭所有服务器连接
@@ -27,11 +27,11 @@ def get_user_emby_service(tg: int, server_id: str = None) -> Tuple[Optional[Emby
         >>> if emby_service:
         >>>     result = await emby_service.user(emby_id=user.embyid)
     """
-    from bot.sql_helper.sql_emby import sql_get_emby
+    from bot.sql_helper.sql_emby import sql_get_emby_by_tg
     from bot.sql_helper.sql_server_bindings import get_primary_binding, get_binding
 
     # 查询用户基础信息
-    user = sql_get_emby(tg)
+    user = sql_get_emby_by_tg(tg)
     if not user:
         logger.warning(f"用户不存在: tg={tg}")
         return None, None, None
@@ -2,6 +2,7 @@
 from pyrogram.errors import BadRequest
 from pyrogram.filters import create
 from bot import admins, owner, group, LOGGER
+from bot.func_helper.group_members import group_members
 from pyrogram.enums import ChatMemberStatus
 
 
@@ -47,9 +48,13 @@ async def user_in_group_filter(client, update):
     """
     uid = update.from_user or update.sender_chat
     uid = uid.id
+    known = group_members.is_member(uid)
+    if known is not None:
+        return known
     for i in group:
         try:
             u = await client.get_chat_member(chat_id=int(i), user_id=uid)
+            group_members.record(i, uid, u.status, u.user.first_name if u.user else None)
             if u.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER, ChatMemberStatus.OWNER]:
                 return True
         except BadRequest as e:
@@ -76,9 +81,14 @@ async def user_in_group_on_filter(filt, client, update):
     uid = uid.id
     if uid in group:
         return True
+    # 成员索引命中时不再调用 API；索引未就绪时回退逐群查询
+    known = group_members.is_member(uid)
+    if known is not None:
+        return known
     for i in group:
         try:
             u = await client.get_chat_member(chat_id=int(i), user_id=uid)
+            group_members.record(i, uid, u.status, u.user.first_name if u.user else None)
             if u.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER,
                             ChatMemberStatus.OWNER]:  # 移除了 'ChatMemberStatus.RESTRICTED' 防止有人进群直接注册不验证
                 return True  # 因为被限制用户无法使用bot，所以需要检查权限。
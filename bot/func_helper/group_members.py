@@ -0,0 +1,122 @@
+"""
+授权群组成员索引
+启动后从 get_chat_members 全量拉取一次，之后由 chat_member 更新事件即时维护，
+定时全量对账兜底；群组过滤器与 get_users 直接查索引，不再逐条调用 Telegram API
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from pyrogram.enums import ChatMemberStatus
+
+from bot import bot, group, LOGGER
+
+# 视为群组成员的状态（受限成员无法使用 bot，与群组过滤器保持一致）
+ACTIVE_STATUSES = (ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER)
+
+
+class GroupMembers:
+    """
+    各授权群组的成员索引
+    - _active: 群组 -> 有效成员 tg 集合，用于成员判断
+    - _names: tg -> first_name，包含受限成员，用于榜单等显示名
+    未完成首次拉取的群组按“未知”处理，由调用方回退到 API 查询
+    """
+
+    def __init__(self, chat_ids: Iterable[int]):
+        self.chat_ids = [int(i) for i in chat_ids]
+        self._active: Dict[int, Set[int]] = {}
+        self._names: Dict[int, str] = {}
+        self.reconciled_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        """所有群组都已完成首次拉取"""
+        return all(chat_id in self._active for chat_id in self.chat_ids)
+
+    def is_member(self, tg: int) -> Optional[bool]:
+        """
+        :return: True 在任一授权群组中；False 确定不在；None 尚有群组未拉取，需回退 API 查询
+        """
+        if any(tg in members for members in self._active.values()):
+            return True
+        return False if self.ready else None
+
+    def members(self, chat_id: int = None) -> Set[int]:
+        """某个群组（默认主群组）的有效成员集合副本"""
+        return set(self._active.get(int(chat_id) if chat_id is not None else self.chat_ids[0], ()))
+
+    def name_of(self, tg: int, default=None):
+        return self._names.get(tg, default)
+
+    def names(self) -> Dict[int, str]:
+        """tg -> first_name 的副本"""
+        return dict(self._names)
+
+    def record(self, chat_id: int, tg: int, status: ChatMemberStatus, first_name: str = None):
+        """写入一次成员状态（更新事件或 API 回退查询的结果）"""
+        chat_id = int(chat_id)
+        members = self._active.get(chat_id)
+        if status in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+            if members is not None:
+                members.discard(tg)
+            if not any(tg in m for m in self._active.values()):
+                self._names.pop(tg, None)
+            return
+        if first_name is not None:
+            self._names[tg] = first_name
+        if members is not None:
+            if status in ACTIVE_STATUSES:
+                members.add(tg)
+            else:
+                members.discard(tg)
+
+    def apply(self, event):
+        """处理 ChatMemberUpdated 事件"""
+        member = event.new_chat_member or event.old_chat_member
+        if member is None or member.user is None:
+            return
+        status = event.new_chat_member.status if event.new_chat_member else ChatMemberStatus.LEFT
+        self.record(event.chat.id, member.user.id, status, member.user.first_name)
+
+    async def reconcile(self, chat_ids: Iterable[int] = None) -> Dict[str, int]:
+        """
+        全量拉取群组成员并替换索引，拉取失败的群组保留现有索引
+
+        Returns:
+            {'added': n, 'removed': n, 'failed': 拉取失败的群组数}
+        """
+        added = removed = failed = 0
+        all_names: Dict[int, str] = {}
+        complete = chat_ids is None
+        for chat_id in chat_ids or self.chat_ids:
+            active, names = set(), {}
+            try:
+                async for member in bot.get_chat_members(chat_id):
+                    if member.user is None:
+                        continue
+                    names[member.user.id] = member.user.first_name
+                    if member.status in ACTIVE_STATUSES:
+                        active.add(member.user.id)
+            except Exception as e:
+                LOGGER.warning(f"【群组成员】{chat_id} 拉取失败，保留现有索引: {e}")
+                complete = False
+                failed += 1
+                continue
+            old = self._active.get(chat_id, set())
+            added += len(active - old)
+            removed += len(old - active)
+            self._active[chat_id] = active
+            all_names.update(names)
+        # 全部群组都拉取成功时整体替换显示名，清理已离开的用户
+        if complete:
+            self._names = all_names
+        else:
+            self._names.update(all_names)
+        self.reconciled_at = datetime.now()
+        if added or removed:
+            LOGGER.info(f"【群组成员】对账完成 新增 {added}，移除 {removed}，"
+                        f"共 {sum(len(m) for m in self._active.values())} 人")
+        return {'added': added, 'removed': removed, 'failed': failed}
+
+
+group_members = GroupMembers(group)
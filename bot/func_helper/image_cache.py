@@ -0,0 +1,208 @@
+"""
+海报/背景图磁盘缓存
+- 条目键：(server_id, item_id, 图片类型, 宽, 高, 质量)
+- 图片内容按 sha256 存储，多个服务器上的同一张图只占一份空间
+- 超出容量时按最近使用时间淘汰
+- 超过 revalidate_hours 的条目用 ETag / Last-Modified 向 Emby 发条件请求
+- 记录每个 item_id 所属服务器，下次优先向该服务器请求
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from bot import LOGGER, config
+
+
+class ImageCache:
+    """按字节预算做 LRU 淘汰的图片缓存，索引保存在 index.json"""
+
+    _INDEX_FILE = 'index.json'
+    # 使用时间变化后最多多久落盘一次索引（秒）
+    _TOUCH_FLUSH_INTERVAL = 60
+
+    def __init__(self, path: str, max_bytes: int, revalidate_seconds: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: Dict[str, dict] = {}
+        self._owners: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._last_flush = 0.0
+        self._loaded = False
+        self.stats = {'hit': 0, 'revalidated': 0, 'miss': 0, 'evicted': 0}
+
+    # ==================== 对外接口 ====================
+
+    def owner(self, item_id: str) -> Optional[str]:
+        """item_id 上次成功取图的服务器"""
+        self._load()
+        return self._owners.get(item_id)
+
+    async def fetch(self, emby_service, item_id: str, image_type: str, width: int = None, height: int = None,
+                    quality: int = 90) -> Tuple[bool, Union[bytes, Dict[str, str]]]:
+        """
+        取图：命中且未过期直接读本地；过期则条件请求；未命中才下载
+
+        Args:
+            emby_service: Embyservice 实例
+            item_id: 项目 ID
+            image_type: Primary / Backdrop
+            width / height / quality: 图片参数
+
+        Returns:
+            (是否成功, 图片字节或错误信息)，与 Embyservice.primary / backdrop 一致
+        """
+        self._load()
+        key = self._key(emby_service.server_id, item_id, image_type, width, height, quality)
+        entry = self._entries.get(key)
+        data = self._read_blob(entry['blob']) if entry else None
+        if data is not None and time.time() - entry['validated'] < self.revalidate_seconds:
+            self.stats['hit'] += 1
+            await self._touch(key)
+            return True, data
+
+        headers = {}
+        if data is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        result = await emby_service._request('GET', _image_url(item_id, image_type, width, height, quality),
+                                             headers=headers or None)
+        if not result.success:
+            if data is not None:
+                # Emby 暂不可用时沿用旧图
+                return True, data
+            return False, {'error': f"🤕Emby 服务器连接失败: {result.error}"}
+
+        if result.status == 304 and data is not None:
+            self.stats['revalidated'] += 1
+            entry['validated'] = time.time()
+            await self._touch(key)
+            return True, data
+
+        if not result.data:
+            return False, {'error': "🤕Emby 未返回图片"}
+        self.stats['miss'] += 1
+        await self._put(key, emby_service.server_id, item_id, result.data, result.headers)
+        return True, result.data
+
+    # ==================== 内部实现 ====================
+
+    @staticmethod
+    def _key(server_id, item_id, image_type, width, height, quality) -> str:
+        raw = f"{server_id}|{item_id}|{image_type}|{width}x{height}|{quality}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.path, blob[:2], blob)
+
+    def _read_blob(self, blob: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(blob), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(os.path.join(self.path, self._INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self._entries = index.get('entries', {})
+            self._owners = index.get('owners', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            LOGGER.warning(f"【图片缓存】索引读取失败，重新建立: {e}")
+
+    def _flush(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, self._INDEX_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self._entries, 'owners': self._owners}, f)
+        os.replace(tmp, os.path.join(self.path, self._INDEX_FILE))
+        self._last_flush = time.time()
+
+    async def _touch(self, key: str):
+        # 条件请求期间条目可能已被并发的 _put 淘汰，图片字节已在内存中，直接跳过
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry['used'] = time.time()
+        if time.time() - self._last_flush > self._TOUCH_FLUSH_INTERVAL:
+            async with self._lock:
+                await asyncio.to_thread(self._flush)
+
+    async def _put(self, key: str, server_id: str, item_id: str, data: bytes, headers: Dict[str, str]):
+        blob = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(blob)
+        async with self._lock:
+            if not os.path.exists(path):
+                await asyncio.to_thread(_write_file, path, data)
+            now = time.time()
+            self._entries[key] = {
+                'blob': blob,
+                'size': len(data),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'validated': now,
+                'used': now,
+            }
+            self._owners[item_id] = server_id
+            self._evict()
+            await asyncio.to_thread(self._flush)
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小回到预算内（共享的图片只算一次）"""
+        blob_sizes: Dict[str, int] = {}
+        refs: Dict[str, int] = {}
+        for e in self._entries.values():
+            blob_sizes[e['blob']] = e['size']
+            refs[e['blob']] = refs.get(e['blob'], 0) + 1
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._entries.items(), key=lambda kv: kv[1]['used']):
+            if total <= self.max_bytes:
+                break
+            del self._entries[key]
+            self.stats['evicted'] += 1
+            blob = entry['blob']
+            refs[blob] -= 1
+            if refs[blob]:
+                continue
+            total -= blob_sizes[blob]
+            try:
+                os.remove(self._blob_path(blob))
+            except OSError:
+                pass
+
+
+def _write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _image_url(item_id: str, image_type: str, width: int = None, height: int = None, quality: int = 90) -> str:
+    url = f'/emby/Items/{item_id}/Images/{image_type}?quality={quality}'
+    if height:
+        url += f'&maxHeight={height}'
+    if width:
+        url += f'&maxWidth={width}'
+    return url
+
+
+image_cache = ImageCache(
+    path=config.image_cache.path,
+    max_bytes=config.image_cache.max_mb * 1024 * 1024,
+    revalidate_seconds=config.image_cache.revalidate_hours * 3600,
+)
@@ -0,0 +1,85 @@
+"""
+IP 地址与网段的整数区间表示
+所有地址统一编码为 16 字节大端整数（IPv4 映射为 ::ffff:a.b.c.d），字节序即数值序，
+在 (server_id, ip_bin) 索引上一个 CIDR 就是一段连续区间，单个 IP、前缀和范围查询都是 B 树区间扫描
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import ipaddress
+from typing import Optional, Tuple, Union
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# IPv4 映射到 IPv6 的前缀 ::ffff:0:0/96
+_V4_MAPPED = b'\x00' * 10 + b'\xff\xff'
+
+
+def ip_to_bin(value: str) -> Optional[bytes]:
+    """IP 字符串转 16 字节整数，无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        addr = ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+    if addr.version == 4:
+        return _V4_MAPPED + addr.packed
+    mapped = addr.ipv4_mapped
+    return _V4_MAPPED + mapped.packed if mapped else addr.packed
+
+
+def parse_network(text: str) -> Optional[Network]:
+    """
+    解析审计参数：单个 IPv4 / IPv6 地址或 CIDR（主机位不为 0 时自动归整），无效返回 None
+    单个地址返回 /32 或 /128
+    """
+    if not text:
+        return None
+    try:
+        return ipaddress.ip_network(text.strip(), strict=False)
+    except ValueError:
+        return None
+
+
+def network_bounds(network: Network) -> Tuple[bytes, bytes]:
+    """网段对应的闭区间 [起始, 结束]（16 字节整数）"""
+    first, last = network.network_address, network.broadcast_address
+    if network.version == 4:
+        return _V4_MAPPED + first.packed, _V4_MAPPED + last.packed
+    return first.packed, last.packed
+
+
+def in_network(value: str, network: Network) -> bool:
+    """IP 字符串是否落在网段内（IPv4 映射地址按 IPv4 比较）"""
+    packed = ip_to_bin(value)
+    if packed is None:
+        return False
+    lo, hi = network_bounds(network)
+    return lo <= packed <= hi
+
+
+def is_single(network: Network) -> bool:
+    return network.num_addresses == 1
+
+
+def like_prefix(network: Network) -> Optional[str]:
+    """
+    IPv4 网段按整段八位组对齐后的 LIKE 前缀（如 10.2.0.0/15 -> '10.%'），用于无法做区间查询的插件 SQL，
+    结果需再用 in_network 精确过滤；IPv6 和单个地址返回 None
+    """
+    if network.version != 4 or is_single(network):
+        return None
+    octets = network.prefixlen // 8
+    if octets == 0:
+        return '%'
+    return '.'.join(str(network.network_address).split('.')[:octets]) + '.%'
+
+
+def host_bits(network: Network) -> int:
+    """
+    网段覆盖的主机位数，用于按范围放宽风险阈值
+    IPv6 的 /64 通常只是一户，按单个地址计算
+    """
+    if network.version == 6:
+        return max(0, 64 - network.prefixlen)
+    return network.max_prefixlen - network.prefixlen
@@ -9,7 +9,8 @@ from pyrogram import filters, enums
 from pyrogram.errors import FloodWait, Forbidden, BadRequest
 from pyrogram.types import CallbackQuery
 from pyromod.exceptions import ListenerTimeout
-from bot import LOGGER, group, bot
+from bot import LOGGER, group
+from bot.func_helper.outbox import outbox, Lane
 from typing import Optional
 
 
@@ -31,9 +32,11 @@ async def sendMessage(message, text: str, buttons=None, timer=None, send=False,
         if send is True:
             if chat_id is None:
                 chat_id = group[0]
-            return await bot.send_message(chat_id=chat_id, text=text, reply_markup=buttons, parse_mode=parse_mode)
+            return await outbox.send_message(chat_id, text, lane=Lane.INTERACTIVE, reply_markup=buttons,
+                                             parse_mode=parse_mode)
         # 禁用通知 disable_notification=True,
-        send = await message.reply(text=text, quote=True, disable_web_page_preview=True, reply_markup=buttons)
+        send = await outbox.submit(message.chat.id, lambda: message.reply(
+            text=text, quote=True, disable_web_page_preview=True, reply_markup=buttons), lane=Lane.INTERACTIVE)
         if timer is not None:
             return await deleteMessage(send, timer)
         return True
@@ -123,10 +126,11 @@ async def sendPhoto(message, photo, caption=None, buttons=None, timer=None, send
         if send is True:
             if chat_id is None:
                 chat_id = group[0]
-            return await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption, reply_markup=buttons)
+            return await outbox.send_photo(chat_id, photo, lane=Lane.INTERACTIVE, caption=caption,
+                                           reply_markup=buttons)
         # quote=True 引用回复
-        send = await message.reply_photo(photo=photo, caption=caption, disable_notification=True,
-                                         reply_markup=buttons)
+        send = await outbox.submit(message.chat.id, lambda: message.reply_photo(
+            photo=photo, caption=caption, disable_notification=True, reply_markup=buttons), lane=Lane.INTERACTIVE)
         if timer is not None:
             return await deleteMessage(send, timer)
         return True
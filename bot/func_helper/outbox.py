@@ -0,0 +1,68 @@
+"""
+Telegram 出站消息调度
+- 所有群发/通知/交互回复统一排队，按全局与单会话令牌桶限速
+- 三条优先级通道：交互回复 > 普通推送 > 批量群发
+- 遇到 FloodWait 只暂停触发它的通道，任务放回队首稍后重试
+- metrics() 提供各通道队列深度与发送统计
+调度逻辑在 send_scheduler 中，这里接入 pyrogram 的发送方法与 FloodWait
+"""
+import asyncio
+from typing import Optional
+
+from pyrogram.errors import FloodWait
+
+from bot import bot, LOGGER, config
+from bot.func_helper.send_scheduler import LANE_TEXT, Lane, SendScheduler
+
+class Outbox(SendScheduler):
+    """
+    接入 pyrogram 的出站消息调度器
+    send_message / send_photo / forward / copy 返回 Future，put 为发出即不管的通知
+    """
+
+    def send_message(self, chat_id: int, text: str, lane: Lane = Lane.BULK, **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, lambda: bot.send_message(chat_id, text, **kwargs), lane)
+
+    def send_photo(self, chat_id: int, photo, lane: Lane = Lane.NORMAL, **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, lambda: bot.send_photo(chat_id, photo, **kwargs), lane)
+
+    def forward(self, message, chat_id: int, lane: Lane = Lane.BULK) -> asyncio.Future:
+        return self.submit(chat_id, lambda: message.forward(chat_id), lane)
+
+    def copy(self, message, chat_id: int, lane: Lane = Lane.BULK) -> asyncio.Future:
+        return self.submit(chat_id, lambda: message.copy(chat_id), lane)
+
+    def put(self, chat_id: int, text: str, forward_to: int = None, lane: Lane = Lane.BULK):
+        """
+        发出即不管的通知，失败只记日志
+        :param forward_to: 发送成功后再转发到的会话（如群组），转发同样排队限速
+        """
+        future = self.send_message(chat_id, text, lane)
+
+        def _done(f: asyncio.Future):
+            if f.cancelled():
+                return
+            if f.exception():
+                LOGGER.error(f"【消息队列】发送到 {chat_id} 失败: {f.exception()}")
+            elif forward_to and f.result():
+                self.forward(f.result(), forward_to, lane).add_done_callback(_log_error)
+
+        future.add_done_callback(_done)
+
+    def _flood_wait(self, error: Exception) -> Optional[float]:
+        return error.value if isinstance(error, FloodWait) else None
+
+    def _on_flood_wait(self, lane: Lane, seconds: float):
+        LOGGER.warning(f"【消息队列】{LANE_TEXT[lane]}通道触发 FloodWait，暂停 {seconds}s")
+
+
+def _log_error(f: asyncio.Future):
+    if not f.cancelled() and f.exception():
+        LOGGER.error(f"【消息队列】转发失败: {f.exception()}")
+
+
+outbox = Outbox(
+    global_rate=config.outbox.global_rate,
+    private_rate=config.outbox.private_rate,
+    group_rate=config.outbox.group_rate,
+)
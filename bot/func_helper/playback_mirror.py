@@ -0,0 +1,130 @@
+"""
+PlaybackActivity 本地镜像
+按服务器增量拉取 Playback Reporting 的播放记录到本地表，
+Embyservice 的排行/审计查询在镜像就绪后改读本地
+"""
+from datetime import timedelta
+from typing import Dict, Set
+
+from bot import LOGGER, config
+from bot.func_helper.ip_range import ip_to_bin
+from bot.sql_helper.sql_playback import (
+    DATE_FORMAT, parse_emby_date, sql_add_playback_rows, sql_get_playback_watermark, sql_touch_playback_state
+)
+
+
+class PlaybackMirror:
+    """
+    播放记录镜像状态（每个服务器一份）
+    - 水位：本地表中已同步的最大 DateCreated
+    - 隐藏用户：插件 UserList 中的用户，排行时排除
+    """
+
+    def __init__(self):
+        self._ready: Set[str] = set()
+        self._hidden_users: Dict[str, Set[str]] = {}
+        self._running: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return config.playback_sync.status
+
+    def is_ready(self, server_id: str) -> bool:
+        """服务器是否已完成首轮追平，可以改读本地"""
+        return self.enabled and server_id in self._ready
+
+    def hidden_users(self, server_id: str) -> Set[str]:
+        return self._hidden_users.get(server_id, set())
+
+    async def sync_server(self, server_id: str, emby_service) -> int:
+        """
+        拉取一个服务器自水位以来的新记录
+
+        Args:
+            server_id: 服务器 ID
+            emby_service: Embyservice 实例
+
+        Returns:
+            本次拉取的行数，失败返回 -1
+        """
+        if server_id in self._running:
+            LOGGER.debug(f"【播放记录同步】{server_id} 上一轮尚未结束，跳过")
+            return 0
+        self._running.add(server_id)
+        try:
+            return await self._sync_server(server_id, emby_service)
+        finally:
+            self._running.discard(server_id)
+
+    async def _sync_server(self, server_id: str, emby_service) -> int:
+        settings = config.playback_sync
+        watermark = await sql_get_playback_watermark.aio(server_id)
+        # 插件在播放结束时才写入记录，DateCreated 为开始时间，回看一段时间避免漏掉长片
+        since = watermark - timedelta(minutes=settings.lookback_minutes) if watermark else None
+        since_text = since.strftime(DATE_FORMAT) if since else None
+        offset = 0
+        pulled = 0
+
+        while True:
+            success, rows = await emby_service.get_playback_activity_since(
+                since_text, limit=settings.batch_size, offset=offset)
+            if not success:
+                LOGGER.warning(f"【播放记录同步】{server_id} 拉取失败: {rows}")
+                return -1
+            if not rows:
+                break
+            records = [_to_record(r) for r in rows]
+            last_date = await sql_add_playback_rows.aio(server_id, records)
+            if last_date is None:
+                return -1
+            pulled += len(rows)
+            if len(rows) < settings.batch_size:
+                break
+            batch_last = max(r['date_created'] for r in records if r['date_created'])
+            next_text = batch_last.strftime(DATE_FORMAT)
+            # 始终用 >= 续拉，跳过最后一秒内已拉到的行；同一秒超过一批时偏移量累加，重复行由唯一键去重
+            tail = sum(1 for r in records if r['date_created'] and r['date_created'].strftime(DATE_FORMAT) == next_text)
+            offset = (offset if next_text == since_text else 0) + tail
+            since_text = next_text
+
+        if not pulled:
+            await sql_touch_playback_state.aio(server_id)
+
+        hidden = await emby_service.get_playback_hidden_users()
+        if hidden is not None:
+            self._hidden_users[server_id] = hidden
+        # ReplaceUserId 由用户目录替代，目录尚未加载时先拉一次
+        if emby_service.directory.refreshed_at is None:
+            await emby_service.directory.refresh()
+
+        if server_id not in self._ready:
+            LOGGER.info(f"【播放记录同步】{server_id} 已追平，排行与审计改读本地镜像")
+        self._ready.add(server_id)
+        return pulled
+
+
+def _to_record(row: list) -> dict:
+    """将插件返回的行转换为本地表列"""
+    def _int(value):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+    date_created, user_id, item_id, item_type, item_name, client, device, ip, play, pause = row
+    return {
+        'date_created': parse_emby_date(date_created),
+        'user_id': user_id,
+        'item_id': item_id or '',
+        'item_type': item_type,
+        'item_name': item_name or '',
+        'client_name': client or '',
+        'device_name': device or '',
+        'remote_address': ip or '',
+        'ip_bin': ip_to_bin(ip),
+        'play_duration': _int(play),
+        'pause_duration': _int(pause),
+    }
+
+
+playback_mirror = PlaybackMirror()
@@ -0,0 +1,273 @@
+"""
+出站消息调度核心
+- 三条优先级通道，按全局与单会话令牌桶限速
+- 遇到限流错误只暂停触发它的通道，任务放回队首稍后重试
+- 限流错误的识别与日志由子类实现（见 outbox.Outbox）
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+
+class Lane(IntEnum):
+    """发送通道，数值越小优先级越高"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+
+LANE_TEXT = {Lane.INTERACTIVE: '交互', Lane.NORMAL: '普通', Lane.BULK: '群发'}
+
+
+class _Bucket:
+    """非阻塞令牌桶，由调度循环统一等待"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """距离下一个令牌的秒数，0 表示现在可取"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _Job:
+    __slots__ = ('chat_id', 'factory', 'future', 'lane', 'attempts')
+
+    def __init__(self, chat_id: int, factory: Callable[[], Awaitable], future: asyncio.Future, lane: Lane):
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = future
+        self.lane = lane
+        self.attempts = 0
+
+
+class _LaneState:
+    __slots__ = ('queue', 'paused_until', 'sent', 'failed', 'flood_waits')
+
+    def __init__(self):
+        self.queue: Deque[_Job] = deque()
+        self.paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+
+
+class SendScheduler:
+    """
+    出站消息调度器
+    submit 返回 Future，需要结果（如 Message 对象）的调用方 await 它即可
+    """
+
+    # 同一任务遇到限流（FloodWait）的最大重试次数
+    _MAX_FLOOD_RETRIES = 3
+    # 每次调度在一个通道中向后查找可发送任务的数量，避免单个会话限速堵住整条通道
+    _SCAN = 50
+    # 单会话令牌桶数量超过该值时清理空闲的桶
+    _MAX_BUCKETS = 5000
+
+    def __init__(self, global_rate: float, private_rate: float, group_rate: float):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self._global = _Bucket(global_rate, max(1.0, global_rate))
+        self._chats: Dict[int, _Bucket] = {}
+        self._lanes: Dict[Lane, _LaneState] = {lane: _LaneState() for lane in Lane}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        # 持有发送任务的引用，避免未完成的任务被回收
+        self._tasks: Set[asyncio.Task] = set()
+        self._unfinished = 0
+        self._in_flight = 0
+
+    # ==================== 对外接口 ====================
+
+    def submit(self, chat_id: int, factory: Callable[[], Awaitable], lane: Lane = Lane.NORMAL) -> asyncio.Future:
+        """
+        提交一个发送任务
+
+        Args:
+            chat_id: 目标会话，用于单会话限速
+            factory: 无参函数，调用后返回实际发送的协程（FloodWait 重试时会再次调用）
+            lane: 发送通道
+
+        Returns:
+            Future，结果为 factory 协程的返回值
+        """
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].queue.append(_Job(chat_id, factory, future, lane))
+        self._unfinished += 1
+        self._idle.clear()
+        self._wakeup.set()
+        return future
+
+    async def join(self):
+        """等待队列中所有任务完成"""
+        # 转发等后续任务在前一个任务完成的回调里提交，唤醒后需要再确认一次
+        while self._idle is not None and self._unfinished:
+            await self._idle.wait()
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列深度与发送统计快照"""
+        now = time.monotonic()
+        return {
+            'lanes': {
+                lane.name.lower(): {
+                    'depth': len(state.queue),
+                    'paused': round(max(0.0, state.paused_until - now), 1),
+                    'sent': state.sent,
+                    'failed': state.failed,
+                    'flood_waits': state.flood_waits,
+                } for lane, state in self._lanes.items()
+            },
+            'in_flight': self._in_flight,
+            'chats': len(self._chats),
+        }
+
+    def metrics_text(self) -> str:
+        """一行文字的队列状态，供状态命令展示"""
+        parts = []
+        for lane, state in self._lanes.items():
+            text = f"{LANE_TEXT[lane]} {len(state.queue)}"
+            if state.paused_until > time.monotonic():
+                text += f"（暂停 {state.paused_until - time.monotonic():.0f}s）"
+            parts.append(text)
+        sent = sum(s.sent for s in self._lanes.values())
+        floods = sum(s.flood_waits for s in self._lanes.values())
+        return f"{' | '.join(parts)} | 已发送 {sent} | FloodWait {floods}"
+
+    # ==================== 限流识别（子类实现） ====================
+
+    def _flood_wait(self, error: Exception) -> Optional[float]:
+        """发送异常为限流错误时返回需要等待的秒数，否则返回 None"""
+        return None
+
+    def _on_flood_wait(self, lane: Lane, seconds: float):
+        """通道因限流暂停时调用，供子类记录日志"""
+
+    # ==================== 调度 ====================
+
+    def _ensure_dispatcher(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._idle.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._run())
+
+    def _chat_bucket(self, chat_id: int) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > self._MAX_BUCKETS:
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            # 负数 chat_id 为群组/频道
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            rate = self.group_rate if is_group else self.private_rate
+            bucket = self._chats[chat_id] = _Bucket(rate, 3.0 if is_group else 1.0)
+        return bucket
+
+    def _pick(self):
+        """
+        按优先级取一个现在可以发送的任务
+        :return: (任务, None) 或 (None, 需要等待的秒数；队列为空时为 None)
+        """
+        now = time.monotonic()
+        wait = None
+        global_delay = self._global.delay(now)
+        for state in self._lanes.values():
+            if not state.queue:
+                continue
+            if state.paused_until > now:
+                wait = _min(wait, state.paused_until - now)
+                continue
+            if global_delay:
+                wait = _min(wait, global_delay)
+                continue
+            for i, job in enumerate(state.queue):
+                if i >= self._SCAN:
+                    break
+                bucket = self._chat_bucket(job.chat_id)
+                delay = bucket.delay(now)
+                if delay:
+                    wait = _min(wait, delay)
+                    continue
+                del state.queue[i]
+                bucket.take()
+                self._global.take()
+                return job, None
+        return None, wait
+
+    async def _run(self):
+        while True:
+            job, wait = self._pick()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._in_flight += 1
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: _Job):
+        state = self._lanes[job.lane]
+        requeued = False
+        try:
+            result = await job.factory()
+        except Exception as e:
+            wait = self._flood_wait(e)
+            if wait is not None:
+                state.flood_waits += 1
+                state.paused_until = max(state.paused_until, time.monotonic() + wait * 1.2)
+                self._on_flood_wait(job.lane, wait)
+                job.attempts += 1
+            if wait is not None and job.attempts <= self._MAX_FLOOD_RETRIES:
+                state.queue.appendleft(job)
+                requeued = True
+            else:
+                state.failed += 1
+                _settle(job.future, exception=e)
+        else:
+            state.sent += 1
+            _settle(job.future, result=result)
+        finally:
+            self._in_flight -= 1
+            if not requeued:
+                self._unfinished -= 1
+                if not self._unfinished:
+                    self._idle.set()
+            self._wakeup.set()
+
+
+def _min(a: Optional[float], b: float) -> float:
+    return b if a is None else min(a, b)
+
+
+def _settle(future: asyncio.Future, result: Any = None, exception: BaseException = None):
+    """设置任务结果；调用方已取消 Future（如 wait_for 超时）时直接忽略"""
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
@@ -0,0 +1,167 @@
+"""
+Emby 活跃会话表
+每个服务器一份，由定时任务拉取 /Sessions 快照，与上一次快照比对后维护按用户索引的播放中会话；
+在线人数、并发播放监控、服务器状态等直接读表或订阅变化，不再各自调用 API
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from bot import LOGGER
+
+
+class ActiveSession:
+    """正在播放内容的会话"""
+    __slots__ = ('id', 'user_id', 'user_name', 'device_name', 'client_name', 'now_playing', 'play_method',
+                 'first_seen')
+
+    def __init__(self, id: str, user_id: str, user_name: str, device_name: str, client_name: str,
+                 now_playing: str, play_method: str, first_seen: float):
+        self.id = id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.device_name = device_name
+        self.client_name = client_name
+        self.now_playing = now_playing
+        self.play_method = play_method
+        self.first_seen = first_seen
+
+    @classmethod
+    def from_emby(cls, session: dict, first_seen: float) -> Optional['ActiveSession']:
+        """从 SessionInfo 构造，未在播放的会话返回 None"""
+        now_playing = session.get('NowPlayingItem')
+        if not now_playing or not session.get('Id'):
+            return None
+        return cls(
+            id=session['Id'],
+            user_id=session.get('UserId'),
+            user_name=session.get('UserName'),
+            device_name=session.get('DeviceName', '未知设备'),
+            client_name=session.get('Client', '未知客户端'),
+            now_playing=now_playing.get('Name', '未知内容'),
+            play_method=(session.get('PlayState') or {}).get('PlayMethod', 'Unknown'),
+            first_seen=first_seen,
+        )
+
+    def __repr__(self):
+        return f"<ActiveSession {self.user_name} {self.device_name} {self.now_playing}>"
+
+
+# 订阅函数：(表, 新出现的会话, 已结束的会话)
+Subscriber = Callable[['SessionTable', List[ActiveSession], List[ActiveSession]], Awaitable[None]]
+_subscribers: List[Subscriber] = []
+
+
+def subscribe(callback: Subscriber):
+    """注册会话变化的订阅者，每次拉取快照后对每个服务器调用一次"""
+    _subscribers.append(callback)
+
+
+class SessionTable:
+    """
+    单个服务器的活跃会话表
+    快照过期时调用方可通过 ensure_fresh 触发一次拉取，与定时任务共用同一份结果
+    """
+
+    def __init__(self, emby_service):
+        self._service = emby_service
+        self._sessions: Dict[str, ActiveSession] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self.polled_at: Optional[float] = None
+        # 串行化拉取，避免并发的两次比对把同一批新会话通知两次
+        self._lock = asyncio.Lock()
+
+    @property
+    def server_id(self) -> str:
+        return self._service.server_id
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def playing_count(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def user_count(self) -> int:
+        return len(self._by_user)
+
+    def get(self, session_id: str) -> Optional[ActiveSession]:
+        return self._sessions.get(session_id)
+
+    def sessions(self) -> List[ActiveSession]:
+        """所有播放中的会话，按首次出现时间排序"""
+        return sorted(self._sessions.values(), key=lambda s: s.first_seen)
+
+    def of_user(self, user_id: str) -> List[ActiveSession]:
+        """某个用户正在播放的会话，按首次出现时间排序"""
+        sessions = [self._sessions[sid] for sid in self._by_user.get(user_id, ())]
+        return sorted(sessions, key=lambda s: s.first_seen)
+
+    def by_user(self) -> Dict[str, List[ActiveSession]]:
+        return {user_id: self.of_user(user_id) for user_id in self._by_user}
+
+    def age(self) -> Optional[float]:
+        """距上次成功拉取的秒数，从未拉取返回 None"""
+        return None if self.polled_at is None else time.monotonic() - self.polled_at
+
+    async def ensure_fresh(self, max_age: float) -> bool:
+        """快照超过 max_age 秒时拉取一次，返回表中是否有可用数据"""
+        if self._is_fresh(max_age):
+            return True
+        async with self._lock:
+            # 等锁期间其他调用方可能已经拉取过
+            if self._is_fresh(max_age):
+                return True
+            return await self._refresh()
+
+    async def refresh(self) -> bool:
+        """
+        拉取 /Sessions 快照并与上一次比对，通知订阅者
+        拉取失败时保留现有会话表
+
+        Returns:
+            是否拉取成功
+        """
+        async with self._lock:
+            return await self._refresh()
+
+    def _is_fresh(self, max_age: float) -> bool:
+        age = self.age()
+        return age is not None and age <= max_age
+
+    async def _refresh(self) -> bool:
+        try:
+            result = await self._service._request('GET', '/emby/Sessions')
+        except Exception as e:
+            LOGGER.warning(f"【会话表】{self.server_id} 拉取会话异常: {e}")
+            return False
+        if not result.success or not isinstance(result.data, list):
+            LOGGER.warning(f"【会话表】{self.server_id} 拉取会话失败: {result.error}")
+            return False
+
+        now = time.monotonic()
+        sessions: Dict[str, ActiveSession] = {}
+        started = []
+        for raw in result.data:
+            old = self._sessions.get(raw.get('Id'))
+            session = ActiveSession.from_emby(raw, old.first_seen if old else now)
+            if session is None:
+                continue
+            sessions[session.id] = session
+            if old is None:
+                started.append(session)
+        ended = [s for sid, s in self._sessions.items() if sid not in sessions]
+
+        by_user: Dict[str, Set[str]] = {}
+        for session in sessions.values():
+            by_user.setdefault(session.user_id, set()).add(session.id)
+        self._sessions, self._by_user = sessions, by_user
+        self.polled_at = now
+
+        for callback in _subscribers:
+            try:
+                await callback(self, started, ended)
+            except Exception as e:
+                LOGGER.error(f"【会话表】{self.server_id} 订阅者 {getattr(callback, '__name__', callback)} 出错: {e}")
+        return True
@@ -0,0 +1,154 @@
+"""
+账号共享检测
+把播放记录里共用同一 IP、同一 /24 网段或同一 设备名+客户端 的用户连成图，用并查集找出连通的用户簇：
+- 每条记录按距今天数做指数衰减（半衰期 half_life_days），近期的共用比很久以前的一次共用权重高
+- 某个特征上权重不足 min_weight 的用户不参与连接（偶尔一次的巧合）
+- 被超过 max_feature_users 个用户共用的特征视为公共出口 / 通用设备名（反代、CGNAT、"Chrome|Emby Web"），不参与连接
+- 内网、回环地址不参与 IP / 网段连接
+结果按簇大小、活跃度排序
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import ipaddress
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# 特征类型
+IP, SUBNET, DEVICE = 'ip', 'net', 'dev'
+
+
+class UnionFind:
+    """按大小合并 + 路径压缩的并查集"""
+
+    def __init__(self):
+        self._parent: Dict[Hashable, Hashable] = {}
+        self._size: Dict[Hashable, int] = {}
+
+    def find(self, x: Hashable) -> Hashable:
+        parent = self._parent
+        if x not in parent:
+            parent[x] = x
+            self._size[x] = 1
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+        return ra
+
+    def groups(self) -> Dict[Hashable, List[Hashable]]:
+        result: Dict[Hashable, List[Hashable]] = {}
+        for x in self._parent:
+            result.setdefault(self.find(x), []).append(x)
+        return result
+
+
+class SharingCluster:
+    """一个疑似共享的用户簇"""
+    __slots__ = ('users', 'activity', 'evidence', 'last_seen')
+
+    def __init__(self, users: List[Hashable], activity: float, evidence: List[Tuple[str, str, int]],
+                 last_seen: Optional[datetime]):
+        self.users = users
+        self.activity = activity
+        # [(特征类型, 特征值, 共用的用户数)]，按共用人数降序
+        self.evidence = evidence
+        self.last_seen = last_seen
+
+    @property
+    def size(self) -> int:
+        return len(self.users)
+
+    def __repr__(self):
+        return f"<SharingCluster size={self.size} activity={self.activity:.1f}>"
+
+
+def _features(ip: Optional[str], device: Optional[str], client: Optional[str]) -> List[Tuple[str, str]]:
+    features = []
+    if ip:
+        try:
+            addr = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            addr = None
+        if addr is not None and addr.is_global:
+            features.append((IP, str(addr)))
+            prefix = 24 if addr.version == 4 else 64
+            features.append((SUBNET, str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))))
+    if device and client:
+        features.append((DEVICE, f"{device}|{client}"))
+    return features
+
+
+def detect_clusters(rows: Iterable[Sequence], now: datetime = None, half_life_days: float = 7,
+                    min_weight: float = 1.0, max_feature_users: int = 15,
+                    feature_types: Iterable[str] = (IP, SUBNET, DEVICE)) -> List[SharingCluster]:
+    """
+    检测共享用户簇
+
+    Args:
+        rows: [(用户, RemoteAddress, DeviceName, ClientName, 最后活动时间, 次数), ...]，
+              一般是按 用户+IP+设备+客户端 聚合后的结果；用户为任意可哈希的标识
+        now: 计算衰减的基准时间，默认当前时间
+        half_life_days: 衰减半衰期（天）
+        min_weight: 用户在某特征上的最小衰减后权重
+        max_feature_users: 共用人数超过该值的特征忽略
+        feature_types: 参与连接的特征类型
+
+    Returns:
+        两人及以上的簇，按 (人数, 活跃度) 降序
+    """
+    now = now or datetime.now()
+    kinds = set(feature_types)
+    # 特征 -> {用户: 衰减后权重}
+    weights: Dict[Tuple[str, str], Dict[Hashable, float]] = {}
+    activity: Dict[Hashable, float] = {}
+    last_seen: Dict[Hashable, datetime] = {}
+    for user, ip, device, client, last, count in rows:
+        age_days = max((now - last).total_seconds() / 86400, 0) if last else 0
+        weight = int(count or 0) * 0.5 ** (age_days / half_life_days)
+        activity[user] = activity.get(user, 0) + weight
+        if last and (user not in last_seen or last > last_seen[user]):
+            last_seen[user] = last
+        for feature in _features(ip, device, client):
+            if feature[0] in kinds:
+                per_user = weights.setdefault(feature, {})
+                per_user[user] = per_user.get(user, 0) + weight
+
+    uf = UnionFind()
+    linking: List[Tuple[Tuple[str, str], List[Hashable]]] = []
+    for feature, per_user in weights.items():
+        users = [u for u, w in per_user.items() if w >= min_weight]
+        if len(users) < 2 or len(users) > max_feature_users:
+            continue
+        linking.append((feature, users))
+        for other in users[1:]:
+            uf.union(users[0], other)
+
+    evidence: Dict[Hashable, List[Tuple[str, str, int]]] = {}
+    for (kind, value), users in linking:
+        evidence.setdefault(uf.find(users[0]), []).append((kind, value, len(users)))
+
+    clusters = []
+    for root, users in uf.groups().items():
+        if len(users) < 2:
+            continue
+        seen = [last_seen[u] for u in users if u in last_seen]
+        clusters.append(SharingCluster(
+            users=sorted(users, key=lambda u: -activity.get(u, 0)),
+            activity=sum(activity.get(u, 0) for u in users),
+            evidence=sorted(evidence.get(root, []), key=lambda e: -e[2]),
+            last_seen=max(seen) if seen else None,
+        ))
+    clusters.sort(key=lambda c: (c.size, c.activity), reverse=True)
+    return clusters
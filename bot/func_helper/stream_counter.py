@@ -0,0 +1,87 @@
+"""
+跨服务器播放流计数
+按用户（绑定了 TG 的账户为 tg，未绑定的为服务器上的 Emby 账户）统计所有服务器上的活跃播放流，
+每个流以 (server_id, session_id) 为键；开始 / 结束都是 O(1)，超出上限时给出应终止的最新一路
+
+本模块不依赖 bot 包，便于单独测试
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Mapping, Optional, Set, Tuple
+
+# (server_id, session_id)
+StreamKey = Tuple[str, str]
+
+
+class StreamCounter:
+    """
+    - _owner: 流 -> 用户
+    - _streams: 用户 -> 该用户的流，按开始顺序排列（最后一个是最新的）
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._owner: Dict[StreamKey, Hashable] = {}
+        self._streams: Dict[Hashable, "OrderedDict[StreamKey, None]"] = {}
+
+    def __len__(self):
+        return len(self._owner)
+
+    def count(self, user: Hashable) -> int:
+        return len(self._streams.get(user, ()))
+
+    def owner(self, key: StreamKey) -> Optional[Hashable]:
+        return self._owner.get(key)
+
+    def start(self, user: Hashable, key: StreamKey) -> Optional[StreamKey]:
+        """
+        记录一路播放；已记录的流（重复的开始事件）不重复计数
+
+        Returns:
+            用户超出上限时返回本路（最新的一路），否则 None
+        """
+        if key in self._owner:
+            if self._owner[key] == user:
+                return None
+            # 流的归属变了（绑定关系更新），按新用户重新计数
+            self.stop(key)
+        self._owner[key] = user
+        streams = self._streams.setdefault(user, OrderedDict())
+        streams[key] = None
+        return key if len(streams) > self.limit else None
+
+    def stop(self, key: StreamKey) -> Optional[Hashable]:
+        """移除一路播放，返回其所属用户"""
+        user = self._owner.pop(key, None)
+        if user is None:
+            return None
+        streams = self._streams[user]
+        del streams[key]
+        if not streams:
+            del self._streams[user]
+        return user
+
+    def excess(self, user: Hashable) -> List[StreamKey]:
+        """用户超出上限的那几路（最新开始的），未超限返回空列表"""
+        streams = self._streams.get(user)
+        if not streams or len(streams) <= self.limit:
+            return []
+        return list(streams)[self.limit:]
+
+    def reconcile(self, server_id: str, live: Mapping[StreamKey, Hashable]) -> Set[Hashable]:
+        """
+        用某个服务器的会话快照校正计数：移除快照中已不存在的流，补上漏掉开始事件的流
+
+        Args:
+            server_id: 服务器 ID
+            live: 该服务器当前的 流 -> 用户，按开始时间排序
+
+        Returns:
+            校正后超出上限的用户
+        """
+        for key in [k for k in self._owner if k[0] == server_id and k not in live]:
+            self.stop(key)
+        touched = set()
+        for key, user in live.items():
+            self.start(user, key)
+            touched.add(user)
+        return {user for user in touched if self.count(user) > self.limit}
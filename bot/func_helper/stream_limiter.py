@@ -0,0 +1,142 @@
+"""
+跨服务器并发播放限制
+Emby 的 SimultaneousStreamLimit 只限制单个服务器，同一 TG 用户在多个绑定服务器上同时播放时无法拦截；
+这里按 TG 用户合计所有服务器的播放流：
+- playback.start / playback.stop / session.end Webhook 即时增减计数，超出上限时终止最新的一路
+- 订阅会话表的定时快照校正计数（漏掉的事件、重启后的状态），并处理仍超限的用户
+- (server_id, embyid) -> tg 的归属从 sql_server_bindings 加载，定时刷新
+开启后取代 stream_monitor（单服务器监控）：终止会话后按配置通知管理群与用户，stream_monitor 不再订阅快照
+"""
+import asyncio
+import time
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from bot import LOGGER, config, group
+from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.outbox import outbox
+from bot.func_helper.session_table import subscribe
+from bot.func_helper.stream_counter import StreamCounter, StreamKey
+from bot.sql_helper.sql_server_bindings import get_server_bindings
+
+# 绑定关系刷新间隔（秒）
+_OWNERS_TTL = 600
+
+
+class StreamLimiter:
+    """
+    跨服务器播放流计数与超限处置
+    Webhook 路径只做 O(1) 的字典操作，终止会话放到后台任务执行
+    """
+
+    def __init__(self, limit: int):
+        self.counter = StreamCounter(limit)
+        self._owners: Dict[Tuple[str, str], int] = {}
+        self._owners_at: Optional[float] = None
+        # 正在终止的流，避免事件与快照重复终止同一路
+        self._terminating: Set[StreamKey] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {'terminated': 0, 'failed': 0}
+
+    def identity(self, server_id: str, emby_id: str) -> Hashable:
+        """计数用的用户标识：绑定了 TG 的为 tg，否则为 (server_id, emby_id)"""
+        tg = self._owners.get((server_id, emby_id))
+        return tg if tg is not None else (server_id, emby_id)
+
+    # ==================== 事件 ====================
+
+    def on_webhook(self, server_id: Optional[str], event: str, webhook_data: dict):
+        """处理一条播放 Webhook（在路由中同步调用，只做字典操作）"""
+        session_id = (webhook_data.get("Session") or {}).get("Id")
+        if not server_id or not session_id:
+            return
+        key = (server_id, session_id)
+        if event in ("playback.stop", "session.end"):
+            self.counter.stop(key)
+            return
+        if event != "playback.start":
+            return
+        emby_id = (webhook_data.get("User") or {}).get("Id")
+        if not emby_id:
+            return
+        victim = self.counter.start(self.identity(server_id, emby_id), key)
+        if victim is not None:
+            self._enforce(victim, emby_id)
+
+    async def on_snapshot(self, table, started, ended):
+        """会话表订阅者：用快照校正该服务器的计数，处理仍超限的用户"""
+        await self._refresh_owners()
+        server_id = table.server_id
+        live = {(server_id, s.id): self.identity(server_id, s.user_id) for s in table.sessions()}
+        for user in self.counter.reconcile(server_id, live):
+            for key in self.counter.excess(user):
+                session = table.get(key[1]) if key[0] == server_id else None
+                self._enforce(key, session.user_id if session else None)
+
+    # ==================== 处置 ====================
+
+    def _enforce(self, key: StreamKey, emby_id: Optional[str]):
+        if key in self._terminating:
+            return
+        self._terminating.add(key)
+        task = asyncio.create_task(self._terminate(key, emby_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _terminate(self, key: StreamKey, emby_id: Optional[str]):
+        server_id, session_id = key
+        user = self.counter.owner(key)
+        limit = self.counter.limit
+        try:
+            owner = await emby_manager.terminate_session(
+                session_id, f"超出并发播放限制（所有服务器合计 {limit} 路）", server_id=server_id, emby_id=emby_id)
+            if owner is None:
+                self.stats['failed'] += 1
+                LOGGER.warning(f"【并发限制】终止会话失败 {server_id}/{session_id} 用户 {user}")
+                return
+            self.stats['terminated'] += 1
+            self.counter.stop(key)
+            LOGGER.info(f"【并发限制】用户 {user} 超出 {limit} 路，已终止 {server_id}/{session_id}")
+            if config.stream_limit.notify_admin:
+                server_config = emby_manager.get_config(server_id)
+                server_name = server_config.name if server_config else server_id
+                tg_display = f"`{user}`" if isinstance(user, int) else "未关联"
+                server = emby_manager.get_server(server_id)
+                emby_name = server.directory.name_of(emby_id) if server and emby_id else '未知'
+                outbox.put(group[0], f"⚠️ **并发播放超标**\n"
+                                     f"━━━━━━━━━━━━━━━━\n"
+                                     f"🆔 TG ID: {tg_display}\n"
+                                     f"👤 Emby 用户: `{emby_name}`\n"
+                                     f"📺 所有服务器合计超过 **{limit}** 路\n"
+                                     f"━━━━━━━━━━━━━━━━\n"
+                                     f"🔴 已终止: {server_name} / `{session_id}`")
+            if config.stream_limit.notify_user and isinstance(user, int):
+                outbox.put(user, f"⚠️ **播放提醒**\n\n您的账户在所有服务器上同时播放超过 {limit} 路，"
+                                 f"最新开始的播放已被断开。")
+        except Exception as e:
+            self.stats['failed'] += 1
+            LOGGER.error(f"【并发限制】终止会话异常 {server_id}/{session_id}: {e}")
+        finally:
+            self._terminating.discard(key)
+
+    # ==================== 绑定关系 ====================
+
+    async def _refresh_owners(self):
+        if self._owners_at is not None and time.monotonic() - self._owners_at < _OWNERS_TTL:
+            return
+        owners = {}
+        for server_id in emby_manager.list_server_ids():
+            for binding in await get_server_bindings.aio(server_id):
+                owners[(server_id, binding.embyid)] = binding.tg
+        # 查询失败时返回空列表，不用空结果覆盖已有的绑定关系
+        if owners or not self._owners:
+            self._owners = owners
+        self._owners_at = time.monotonic()
+
+    def stats_text(self) -> str:
+        return f"播放中 {len(self.counter)} 路 | 已终止 {self.stats['terminated']} | 失败 {self.stats['failed']}"
+
+
+stream_limiter = StreamLimiter(config.stream_limit.max_streams)
+
+if config.stream_limit.status:
+    subscribe(stream_limiter.on_snapshot)
@@ -0,0 +1,189 @@
+"""
+Emby 用户目录
+每个服务器一份，按 Id / Name 索引的精简用户记录，
+定时增量刷新 + Webhook 用户事件即时更新，替代逐行调用 /emby/Users/{id}
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from bot import LOGGER
+
+# 未命中数超过该值时整表刷新一次（分页拉取），而不是逐个请求
+_BULK_MISS_THRESHOLD = 20
+# 逐个回退时的最大并发
+_FETCH_CONCURRENCY = 8
+# 确认不存在的用户（404 或整表刷新后仍不存在，多为已删除账户的历史播放记录）在此时间内不再请求（秒）
+_MISSING_TTL = 600
+
+
+class DirectoryUser:
+    """目录中的精简用户记录"""
+    __slots__ = ('id', 'name', 'is_disabled', 'is_admin', 'last_activity')
+
+    def __init__(self, id: str, name: str, is_disabled: bool = False, is_admin: bool = False,
+                 last_activity: str = None):
+        self.id = id
+        self.name = name
+        self.is_disabled = is_disabled
+        self.is_admin = is_admin
+        self.last_activity = last_activity
+
+    @classmethod
+    def from_emby(cls, user: dict) -> 'DirectoryUser':
+        """从 UserDto 或 iter_users 的精简记录构造"""
+        policy = user.get('Policy') or {}
+        return cls(
+            id=user.get('Id'),
+            name=user.get('Name'),
+            is_disabled=bool(user.get('IsDisabled', policy.get('IsDisabled', False))),
+            is_admin=bool(user.get('IsAdministrator', policy.get('IsAdministrator', False))),
+            last_activity=user.get('LastActivityDate'),
+        )
+
+    def _key(self) -> tuple:
+        return self.name, self.is_disabled, self.is_admin, self.last_activity
+
+    def __repr__(self):
+        return f"<DirectoryUser {self.name}({self.id})>"
+
+
+class UserDirectory:
+    """
+    单个服务器的用户目录
+    未命中的用户回退到 HTTP 查询并写回目录，确认不存在的用户短期内不再查询
+    """
+
+    def __init__(self, emby_service):
+        self._service = emby_service
+        self._by_id: Dict[str, DirectoryUser] = {}
+        self._by_name: Dict[str, DirectoryUser] = {}
+        # emby_id -> 确认不存在的时间（monotonic）
+        self._missing: Dict[str, float] = {}
+        self.refreshed_at: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, emby_id: str) -> Optional[DirectoryUser]:
+        return self._by_id.get(emby_id)
+
+    def get_by_name(self, name: str) -> Optional[DirectoryUser]:
+        return self._by_name.get(name)
+
+    def name_of(self, emby_id: str) -> str:
+        """将 UserId 替换为用户名，找不到时原样返回"""
+        user = self._by_id.get(emby_id)
+        return user.name if user else emby_id
+
+    def upsert(self, user: dict) -> Optional[DirectoryUser]:
+        """写入或更新一个用户（Webhook 事件、HTTP 回退结果）"""
+        record = DirectoryUser.from_emby(user)
+        if not record.id:
+            return None
+        old = self._by_id.get(record.id)
+        if old and old.name != record.name and self._by_name.get(old.name) is old:
+            del self._by_name[old.name]
+        self._by_id[record.id] = record
+        self._by_name[record.name] = record
+        self._missing.pop(record.id, None)
+        return record
+
+    def remove(self, emby_id: str):
+        old = self._by_id.pop(emby_id, None)
+        if old and self._by_name.get(old.name) is old:
+            del self._by_name[old.name]
+
+    async def refresh(self) -> Dict[str, int]:
+        """
+        增量刷新：分页拉取全部用户，只替换有变化的记录，删除已不存在的用户
+        拉取失败时保留现有目录
+
+        Returns:
+            {'added': n, 'updated': n, 'removed': n}
+        """
+        by_id: Dict[str, DirectoryUser] = {}
+        added = updated = 0
+        try:
+            async for user in self._service.iter_users():
+                record = DirectoryUser.from_emby(user)
+                old = self._by_id.get(record.id)
+                if old is None:
+                    added += 1
+                elif old._key() != record._key():
+                    updated += 1
+                else:
+                    record = old
+                by_id[record.id] = record
+        except Exception as e:
+            LOGGER.warning(f"【用户目录】{self._service.server_id} 刷新失败，保留现有目录: {e}")
+            return {'added': 0, 'updated': 0, 'removed': 0}
+
+        removed = len(set(self._by_id) - set(by_id))
+        self._by_id = by_id
+        self._by_name = {u.name: u for u in by_id.values()}
+        self._missing = {k: v for k, v in self._missing.items() if k not in by_id}
+        self.refreshed_at = datetime.now()
+        if added or updated or removed:
+            LOGGER.info(f"【用户目录】{self._service.server_id} 新增 {added}，更新 {updated}，删除 {removed}，"
+                        f"共 {len(by_id)} 个用户")
+        return {'added': added, 'updated': updated, 'removed': removed}
+
+    async def refresh_user(self, emby_id: str) -> Optional[DirectoryUser]:
+        """
+        按 Id 重新拉取一个用户，Emby 返回 404 时从目录移除
+        超时、5xx、熔断等其他失败保留现有记录
+        """
+        result = await self._service._request('GET', f'/emby/Users/{emby_id}')
+        if result.success:
+            return self.upsert(result.data)
+        if result.status == 404:
+            self.remove(emby_id)
+            self._missing[emby_id] = time.monotonic()
+            return None
+        LOGGER.warning(f"【用户目录】{self._service.server_id} 拉取用户 {emby_id} 失败，保留现有记录: {result.error}")
+        return self._by_id.get(emby_id)
+
+    def _is_missing(self, emby_id: str) -> bool:
+        marked = self._missing.get(emby_id)
+        if marked is None:
+            return False
+        if time.monotonic() - marked < _MISSING_TTL:
+            return True
+        del self._missing[emby_id]
+        return False
+
+    async def resolve_many(self, ids: Iterable[str]) -> Dict[str, Optional[DirectoryUser]]:
+        """
+        批量解析用户
+        目录未命中的：数量较多（或目录尚未加载）时整表刷新一次，刷新后仍不存在的即为已删除；
+        数量较少时有限并发地逐个回退到 HTTP；确认不存在的用户短期内直接返回 None
+
+        Args:
+            ids: 用户 ID 列表（可重复）
+
+        Returns:
+            {emby_id: DirectoryUser 或 None}
+        """
+        ids = list(dict.fromkeys(ids))
+        misses = [i for i in ids if i and i not in self._by_id and not self._is_missing(i)]
+        if misses and (self.refreshed_at is None or len(misses) > _BULK_MISS_THRESHOLD):
+            before = self.refreshed_at
+            await self.refresh()
+            # 刷新失败时 refreshed_at 不变，回退到逐个查询
+            if self.refreshed_at is not before:
+                now = time.monotonic()
+                for emby_id in misses:
+                    if emby_id not in self._by_id:
+                        self._missing[emby_id] = now
+                misses = []
+        if misses:
+            semaphore = asyncio.Semaphore(_FETCH_CONCURRENCY)
+
+            async def _fetch(emby_id: str):
+                async with semaphore:
+                    await self.refresh_user(emby_id)
+
+            await asyncio.gather(*(_fetch(i) for i in misses), return_exceptions=True)
+        return {emby_id: self._by_id.get(emby_id) for emby_id in ids}
@@ -222,6 +222,11 @@ def convert_to_beijing_time(original_date):
 
 
 async def get_users():
+    """tg -> first_name；成员索引就绪时直接返回索引，否则拉取群组成员"""
+    from bot.func_helper.group_members import group_members
+    if group_members.ready:
+        return group_members.names()
+
     async def _fetch():
         members_dict = {}
         async for member in bot.get_chat_members(group[0]):
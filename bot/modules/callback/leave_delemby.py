@@ -7,6 +7,13 @@ from bot.func_helper.utils import tem_deluser
 from bot.sql_helper.sql_emby import sql_get_emby, sql_update_emby, Emby
 from bot.func_helper.emby_utils import get_user_emby_service
 from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.group_members import group_members
+
+
+@bot.on_chat_member_updated(filters.chat(group), group=-1)
+async def track_group_members(_, event: ChatMemberUpdated):
+    # 先于退群删号处理，维护群组成员索引
+    group_members.apply(event)
 
 
 @bot.on_chat_member_updated(filters.chat(group))
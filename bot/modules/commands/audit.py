@@ -2,11 +2,10 @@
 # -*- coding: utf-8 -*-
 """
 审计命令模块 - 提供 IP、设备名和客户端名审计功能
-包含 auditip、auditdevice 和 auditclient 三个管理员专用命令
+包含 auditip、auditdevice、auditclient 和 auditshare（账号共享检测）四个管理员专用命令
 """
 
-import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from pyrogram import filters
 from pyrogram.types import Message
 from pyrogram.errors import FloodWait
@@ -14,8 +13,13 @@ from bot import bot, LOGGER
 from bot.func_helper.emby_utils import get_user_emby_service
 from bot.func_helper.emby_manager import emby_manager
 from bot.func_helper.filters import admins_on_filter
+from bot.func_helper import ip_range
+from bot.func_helper.playback_mirror import playback_mirror
+from bot.func_helper.sharing_detector import detect_clusters, IP, SUBNET, DEVICE
 from bot.func_helper.msg_utils import sendMessage, editMessage
 from bot.func_helper.utils import split_long_message
+from bot.sql_helper.sql_playback import sql_playback_sharing_rows
+from bot.sql_helper.sql_server_bindings import get_server_bindings
 import asyncio
 
 # 导入优化模块
@@ -23,17 +27,28 @@ from bot.func_helper.message_formatter import MessageFormatter
 from bot.constants.messages import Messages
 
 
-def assess_ip_risk(user_count: int, activity_counts: list) -> dict:
+def assess_ip_risk(user_count: int, activity_counts: list, network=None, address_count: int = 1) -> dict:
     """
     评估 IP 使用风险
+    查询网段时按网段大小放宽阈值：同一运营商网段下的不同家庭本就会出现多个账户，
+    每多 8 个主机位阈值翻一倍（IPv6 以 /64 为单户计）：地址数按 256 倍增长，但共用同一网段的账户远没有这么多
 
     Args:
         user_count: 使用该 IP 的用户数量
         activity_counts: 每个用户的活动次数列表
+        network: 查询的网段（ip_range.parse_network 的结果），单个地址可不传
+        address_count: 结果中出现的不同 IP 数
 
     Returns:
         包含风险等级、描述和建议的字典
     """
+    # /24 -> 2 倍，/16 -> 4 倍，/8 -> 8 倍
+    scale = 2 ** (ip_range.host_bits(network) // 8) if network is not None else 1
+    if network is not None and not ip_range.is_single(network):
+        subject = f'该网段（`{network}`，{address_count} 个地址）'
+    else:
+        subject = '该 IP'
+
     risk_data = {
         'level': '🟢 低风险',
         'emoji': '🟢',
@@ -42,20 +57,20 @@ def assess_ip_risk(user_count: int, activity_counts: list) -> dict:
     }
 
     # 基于用户数量评估
-    if user_count >= 5:
+    if user_count >= 5 * scale:
         risk_data['level'] = '🔴 高风险'
         risk_data['emoji'] = '🔴'
-        risk_data['description'] = f'该 IP 被 {user_count} 个账户使用，**存在明显的账号共享行为**'
+        risk_data['description'] = f'{subject}被 {user_count} 个账户使用，**存在明显的账号共享行为**'
         risk_data['suggestions'] = [
             '立即调查相关账户',
             '检查账户是否存在异常登录',
             '必要时限制该 IP 访问',
             '警告或封禁相关用户'
         ]
-    elif user_count >= 3:
+    elif user_count >= 3 * scale:
         risk_data['level'] = '🟡 中风险'
         risk_data['emoji'] = '🟡'
-        risk_data['description'] = f'该 IP 被 {user_count} 个账户使用，**可能存在账号共享**'
+        risk_data['description'] = f'{subject}被 {user_count} 个账户使用，**可能存在账号共享**'
         risk_data['suggestions'] = [
             '密切关注相关账户活动',
             '检查是否为家庭网络共享',
@@ -65,7 +80,7 @@ def assess_ip_risk(user_count: int, activity_counts: list) -> dict:
     else:
         risk_data['level'] = '🟢 低风险'
         risk_data['emoji'] = '🟢'
-        risk_data['description'] = '该 IP 使用情况正常，未发现异常'
+        risk_data['description'] = f'{subject}使用情况正常，未发现异常'
         risk_data['suggestions'] = [
             '保持常规监控',
             '无需特殊处理'
@@ -80,18 +95,43 @@ def assess_ip_risk(user_count: int, activity_counts: list) -> dict:
             if risk_data['emoji'] == '🟢':
                 risk_data['level'] = '🟡 中风险'
                 risk_data['emoji'] = '🟡'
-            risk_data['description'] += f'\n该 IP 存在高频活动（最高 {max_activity} 次），需关注'
+            risk_data['description'] += f'\n{subject}存在高频活动（最高 {max_activity} 次），需关注'
             risk_data['suggestions'].append('检查是否存在自动化访问')
 
     return risk_data
 
 
+async def _audit_all_servers(query) -> tuple:
+    """
+    在所有服务器上并发执行同一审计查询，结果标记所属服务器后合并
+
+    Args:
+        query: emby_service -> (是否成功, 结果列表或错误信息) 的协程函数
+
+    Returns:
+        (合并后的结果列表, 出错服务器的错误信息列表)
+    """
+    async def _one(server_id, emby_service):
+        success, server_result = await query(emby_service)
+        if not success:
+            raise RuntimeError(server_result)
+        # 为每个结果添加服务器信息
+        for user in server_result or []:
+            user['_server_id'] = server_id
+        return server_result or []
+
+    fanout = await emby_manager.gather_servers(_one)
+    result = [user for server_result in fanout.values() for user in server_result]
+    errors = [f"{server_id}: {error}" for server_id, error in fanout.errors.items()]
+    return result, errors
+
+
 @bot.on_message(filters.command("auditip") & admins_on_filter)
 async def audit_ip_command(_, message: Message):
     """
-    auditip 命令 - 根据 IP 地址审计用户活动
-    用法: /auditip <IP地址> [天数]
-    示例: /auditip 192.168.1.100 30
+    auditip 命令 - 根据 IP 地址或网段审计用户活动
+    用法: /auditip <IP地址|CIDR网段> [天数]
+    示例: /auditip 192.168.1.100 30、/auditip 1.2.3.0/24、/auditip 2001:db8::/48
     """
     try:
         # 解析命令参数
@@ -99,13 +139,15 @@ async def audit_ip_command(_, message: Message):
         if len(args) < 2:
             help_text = (
                 "**🔍 IP 审计命令使用说明**\n\n"
-                "**用法:** `/auditip <IP地址> [天数]`\n\n"
+                "**用法:** `/auditip <IP地址|CIDR网段> [天数]`\n\n"
                 "**参数说明:**\n"
-                "• `IP地址` - 要审计的 IP 地址（必需）\n"
+                "• `IP地址` - 要审计的 IPv4 / IPv6 地址或 CIDR 网段（必需）\n"
                 "• `天数` - 查询天数范围，默认全部时间（可选）\n\n"
                 "**示例:**\n"
                 "• `/auditip 192.168.1.100` - 查询该 IP 全部时间的用户活动\n"
-                "• `/auditip 192.168.1.100 7` - 查询该 IP 最近7天的用户活动\n\n"
+                "• `/auditip 192.168.1.100 7` - 查询该 IP 最近7天的用户活动\n"
+                "• `/auditip 1.2.3.0/24` - 查询该网段内所有 IP 的用户活动\n"
+                "• `/auditip 2001:db8::/48` - 查询 IPv6 网段（需启用播放记录本地同步）\n\n"
                 "**功能:**\n"
                 "• 查找使用指定 IP 地址的所有用户\n"
                 "• 显示用户设备信息和活动统计\n"
@@ -128,11 +170,13 @@ async def audit_ip_command(_, message: Message):
                 await sendMessage(message, "❌ 天数参数必须是有效的数字")
                 return
 
-        # 验证 IP 地址格式
-        ip_pattern = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-        if not re.match(ip_pattern, ip_address):
-            await sendMessage(message, "❌ 无效的 IP 地址格式，请输入有效的 IPv4 地址")
+        # 验证 IP 地址 / 网段格式
+        network = ip_range.parse_network(ip_address)
+        if network is None:
+            await sendMessage(message, "❌ 无效的 IP 地址格式，请输入有效的 IPv4 / IPv6 地址或 CIDR 网段")
             return
+        is_range = not ip_range.is_single(network)
+        ip_address = str(network) if is_range else str(network.network_address)
 
         # 发送处理中消息
         processing_msg = await message.reply(f"🔍 正在审计 IP 地址 `{ip_address}` {days if days else '所有时间'} 的活动...")
@@ -144,21 +188,8 @@ async def audit_ip_command(_, message: Message):
             await editMessage(processing_msg, error_text)
             return
 
-        result = []
-        errors = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, server_result = await emby_service.get_users_by_ip(ip_address, days)
-                if success and server_result:
-                    # 为每个结果添加服务器信息
-                    for user in server_result:
-                        user['_server_id'] = server_id
-                    result.extend(server_result)
-                elif not success:
-                    errors.append(f"{server_id}: {server_result}")
-            except Exception as e:
-                LOGGER.warning(f"审计服务器 {server_id} 失败: {e}")
-                errors.append(f"{server_id}: {str(e)}")
+        result, errors = await _audit_all_servers(
+            lambda emby_service: emby_service.get_users_by_ip(ip_address, days))
 
         # 如果所有服务器都失败
         if not result and errors:
@@ -185,9 +216,14 @@ async def audit_ip_command(_, message: Message):
 
         # 提取活动次数用于风险评估
         activity_counts = [user['ActivityCount'] for user in result]
+        user_count = len({(user['_server_id'], user['UserId']) for user in result})
+        address_count = len({user['RemoteAddress'] for user in result})
 
         # 进行风险评估
-        risk_assessment = assess_ip_risk(len(result), activity_counts)
+        risk_assessment = assess_ip_risk(user_count, activity_counts, network, address_count)
+
+        # f-string 表达式中不能含反斜杠（Python 3.12 之前），先拼好建议列表
+        suggestions_text = ''.join(f'• {suggestion}\n' for suggestion in risk_assessment['suggestions'])
 
         # 构建优化后的审计报告
         report_text = f"""
@@ -195,14 +231,14 @@ async def audit_ip_command(_, message: Message):
 │  📊 **IP 审计报告**
 ╰─────────────────╯
 
-**🌐 IP 地址**
-   `{ip_address}`
+**🌐 {'IP 网段' if is_range else 'IP 地址'}**
+   `{ip_address}`{f'（共 {network.num_addresses} 个地址，出现 {address_count} 个）' if is_range else ''}
 
 **📅 查询范围**
    {f'最近 {days} 天' if days else '所有时间'}
 
 **👥 发现用户**
-   {len(result)} 个账户
+   {user_count} 个账户
 
 ---
 
@@ -214,7 +250,7 @@ async def audit_ip_command(_, message: Message):
 {risk_assessment['description']}
 
 **处理建议：**
-{''.join([f'• {suggestion}\n' for suggestion in risk_assessment['suggestions']])}
+{suggestions_text}
 
 ---
 
@@ -228,12 +264,13 @@ async def audit_ip_command(_, message: Message):
                 formatted_time = last_activity.strftime('%Y-%m-%d %H:%M:%S')
             except (ValueError, TypeError, KeyError):
                 formatted_time = user_info['LastActivity']
+            ip_line = f"\n   • IP：`{user_info['RemoteAddress']}`" if is_range else ''
 
             report_text += f"""
 **{i}. {user_info['Username']}**
    • 用户ID：`{user_info['UserId']}`
    • 设备名：`{user_info['DeviceName']}`
-   • 客户端：`{user_info['ClientName']}`
+   • 客户端：`{user_info['ClientName']}`{ip_line}
    • 最后活动：`{formatted_time}`
    • 活动次数：`{user_info['ActivityCount']}` 次
 """
@@ -312,21 +349,8 @@ async def audit_device_name_command(_, message: Message):
             await editMessage(processing_msg, error_text)
             return
 
-        result = []
-        errors = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, server_result = await emby_service.get_users_by_device_name(device_keyword, days)
-                if success and server_result:
-                    # 为每个结果添加服务器信息
-                    for user in server_result:
-                        user['_server_id'] = server_id
-                    result.extend(server_result)
-                elif not success:
-                    errors.append(f"{server_id}: {server_result}")
-            except Exception as e:
-                LOGGER.warning(f"审计服务器 {server_id} 失败: {e}")
-                errors.append(f"{server_id}: {str(e)}")
+        result, errors = await _audit_all_servers(
+            lambda emby_service: emby_service.get_users_by_device_name(device_keyword, days))
 
         # 如果所有服务器都失败
         if not result and errors:
@@ -469,21 +493,8 @@ async def audit_client_name_command(_, message: Message):
             await editMessage(processing_msg, error_text)
             return
 
-        result = []
-        errors = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, server_result = await emby_service.get_users_by_client_name(client_keyword, days)
-                if success and server_result:
-                    # 为每个结果添加服务器信息
-                    for user in server_result:
-                        user['_server_id'] = server_id
-                    result.extend(server_result)
-                elif not success:
-                    errors.append(f"{server_id}: {server_result}")
-            except Exception as e:
-                LOGGER.warning(f"审计服务器 {server_id} 失败: {e}")
-                errors.append(f"{server_id}: {str(e)}")
+        result, errors = await _audit_all_servers(
+            lambda emby_service: emby_service.get_users_by_client_name(client_keyword, days))
 
         # 如果所有服务器都失败
         if not result and errors:
@@ -570,4 +581,104 @@ async def audit_client_name_command(_, message: Message):
     except Exception as e:
         error_text = f"❌ **客户端名审计异常**\n\n**错误信息:** {str(e)}"
         await sendMessage(message, error_text)
-        LOGGER.error(f"客户端名审计命令异常: {str(e)}")
\ No newline at end of file
+        LOGGER.error(f"客户端名审计命令异常: {str(e)}")
+
+_FEATURE_TEXT = {IP: 'IP', SUBNET: '网段', DEVICE: '设备'}
+# 共享检测报告最多列出的账号簇数
+_SHARE_REPORT_LIMIT = 30
+
+
+@bot.on_message(filters.command("auditshare") & admins_on_filter)
+async def audit_share_command(_, message: Message):
+    """
+    auditshare 命令 - 一次分析所有服务器的播放记录，找出共用 IP / 网段 / 设备的账号簇
+    用法: /auditshare [天数]
+    示例: /auditshare 30
+    """
+    try:
+        args = message.text.split()
+        days = 30
+        if len(args) >= 2:
+            try:
+                days = int(args[1])
+                if days <= 0 or days > 3650:
+                    await sendMessage(message, "❌ 天数参数必须在 1-3650 之间")
+                    return
+            except ValueError:
+                await sendMessage(message, "❌ 天数参数必须是有效的数字")
+                return
+
+        # 只分析已完成本地镜像的服务器，避免让 Emby 扫描全表
+        server_ids = [sid for sid in emby_manager.list_server_ids() if playback_mirror.is_ready(sid)]
+        if not server_ids:
+            await sendMessage(message, "❌ **共享检测失败**\n\n**错误信息:** 没有已完成播放记录同步的服务器，"
+                                       "请开启 playback_sync 并等待首轮同步完成")
+            return
+
+        processing_msg = await message.reply(f"🔍 正在分析最近 {days} 天 {len(server_ids)} 个服务器的播放记录...")
+        now = datetime.now()
+        rows = await sql_playback_sharing_rows.aio(server_ids, now - timedelta(days=days))
+
+        # 绑定了 TG 的账户按 tg 合并（同一人在多个服务器的账户不算共享），未绑定的按服务器账户
+        owners, labels = {}, {}
+        for server_id in server_ids:
+            for binding in await get_server_bindings.aio(server_id):
+                owners[(server_id, binding.embyid)] = binding.tg
+        nodes = []
+        for server_id, user_id, ip, device, client, last, count in rows:
+            if user_id in playback_mirror.hidden_users(server_id):
+                continue
+            node = owners.get((server_id, user_id), (server_id, user_id))
+            nodes.append((node, ip, device, client, last, count))
+            if node not in labels:
+                server = emby_manager.get_server(server_id)
+                labels[node] = server.directory.name_of(user_id) if server else user_id
+        clusters = detect_clusters(nodes, now=now)
+
+        if not clusters:
+            await editMessage(processing_msg, f"📊 **共享检测结果**\n\n最近 {days} 天（{len(rows)} 组记录）未发现共用 IP、网段或设备的账号簇")
+            return
+
+        report_text = f"""
+╭─────────────────╮
+│  🕸 **账号共享检测报告**
+╰─────────────────╯
+
+**📅 分析范围：** 最近 {days} 天，{len(server_ids)} 个服务器，{len(rows)} 组记录
+**👥 发现账号簇：** {len(clusters)} 个（按人数、近期活跃度排序）
+
+---
+"""
+        for i, cluster in enumerate(clusters[:_SHARE_REPORT_LIMIT], 1):
+            emoji = '🔴' if cluster.size >= 5 else '🟡' if cluster.size >= 3 else '🟢'
+            last = cluster.last_seen.strftime('%Y-%m-%d %H:%M') if cluster.last_seen else '未知'
+            report_text += f"\n**{emoji} {i}. {cluster.size} 个账户** | 活跃度 `{cluster.activity:.0f}` | 最近 `{last}`\n"
+            for node in cluster.users:
+                if isinstance(node, int):
+                    report_text += f"   • [{labels.get(node, node)}](tg://user?id={node}) `{node}`\n"
+                else:
+                    report_text += f"   • {labels.get(node, node[1])} `{node[0]}/{node[1]}`（未绑定）\n"
+            evidence = ', '.join(f"{_FEATURE_TEXT[kind]} `{value}`×{n}" for kind, value, n in cluster.evidence[:5])
+            report_text += f"   🔗 {evidence}\n"
+        if len(clusters) > _SHARE_REPORT_LIMIT:
+            report_text += f"\n……其余 {len(clusters) - _SHARE_REPORT_LIMIT} 个账号簇未列出\n"
+
+        report_text += f"""
+---
+
+**📊 审计信息**
+• 审计人：{message.from_user.first_name}
+• 完成时间：`{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}`
+"""
+        for report_text_part in split_long_message(report_text, 2000):
+            try:
+                await bot.send_message(message.chat.id, report_text_part)
+            except FloodWait as f:
+                LOGGER.warning(str(f))
+                await asyncio.sleep(f.value * 1.2)
+        LOGGER.info(f"管理员 {message.from_user.id} 执行了账号共享检测: {days} 天，{len(clusters)} 个账号簇")
+
+    except Exception as e:
+        error_text = f"❌ **共享检测异常**\n\n**错误信息:** {str(e)}"
+        await sendMessage(message, error_text)
+        LOGGER.error(f"共享检测命令异常: {str(e)}")
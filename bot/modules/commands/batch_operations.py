@@ -3,15 +3,14 @@
 """
 import asyncio
 import time
-from datetime import timedelta
 
 from pyrogram import filters
-from pyrogram.errors import FloodWait
 from sqlalchemy import or_
 from bot import bot, prefixes, bot_photo, LOGGER, credits
 from bot.func_helper.msg_utils import sendMessage, deleteMessage, ask_return
 from bot.func_helper.filters import admins_on_filter
-from bot.sql_helper.sql_emby import get_all_emby, Emby, sql_update_embys, sql_clear_emby_iv
+from bot.func_helper.outbox import outbox
+from bot.sql_helper.sql_emby import get_all_emby, Emby, sql_clear_emby_iv, increment_iv, shift_expiry
 
 
 @bot.on_message(filters.command('renew_all', prefixes) & admins_on_filter)
@@ -25,35 +24,29 @@ async def renew_all(_, msg):
                                  "🔔 **使用格式：**/renew_all [+/-天数]\n\n  给所有未封禁emby [+/-天数]", timer=60)
 
     send = await bot.send_photo(msg.chat.id, photo=bot_photo, caption="⚡【派送任务】\n  **正在开启派送中...请稍后**")
-    rst = get_all_emby(Emby.lv == 'b')
-    if rst is None:
+    start = time.perf_counter()
+    ls = await shift_expiry.aio(Emby.lv == 'b', a)
+    if ls is None:
+        return await msg.reply("数据库操作出错，请检查重试")
+    if not ls:
         LOGGER.info(
             f"【派送任务】 -{msg.from_user.first_name}({msg.from_user.id}) 没有检测到任何emby账户，结束")
         return await send.edit("⚡【派送任务】\n\n结束，没有一个有号的")
 
-    b = 0
-    ls = []
-    start = time.perf_counter()
-    for i in rst:
-        if i.ex is None:
-            continue
-        b += 1
-        ex_new = i.ex + timedelta(days=a)
-        ls.append([i.tg, ex_new])
-    if sql_update_embys(some_list=ls, method='ex'):
-        end = time.perf_counter()
-        times = end - start
-        await send.edit(
-            f"⚡【派送任务】\n  批量派出 {a} 天 * {b} ，耗时：{times:.3f}s\n 时间已到账，正在向每个拥有emby的用户私发消息，短时间内请不要重复使用")
-        LOGGER.info(
-            f"【派送任务】 - {msg.from_user.first_name}({msg.from_user.id}) 派出 {a} 天 * {b} 更改用时{times:.3f} s")
-        for l in ls:
-            await bot.send_message(l[0], f"🎯 管理员 {msg.from_user.first_name} 调节了您的账户 到期时间：{a}天"
-                                         f'\n📅 实时到期：{l[1].strftime("%Y-%m-%d %H:%M:%S")}')
-        LOGGER.info(
-            f"【派送任务】 - {msg.from_user.first_name}({msg.from_user.id}) 派出 {a} 天 * {b}，消息私发完成")
-    else:
-        await msg.reply("数据库操作出错，请检查重试")
+    b = len(ls)
+    end = time.perf_counter()
+    times = end - start
+    await send.edit(
+        f"⚡【派送任务】\n  批量派出 {a} 天 * {b} ，耗时：{times:.3f}s\n 时间已到账，正在向每个拥有emby的用户私发消息，短时间内请不要重复使用")
+    LOGGER.info(
+        f"【派送任务】 - {msg.from_user.first_name}({msg.from_user.id}) 派出 {a} 天 * {b} 更改用时{times:.3f} s")
+    results = await asyncio.gather(*(
+        outbox.send_message(l[0], f"🎯 管理员 {msg.from_user.first_name} 调节了您的账户 到期时间：{a}天"
+                                  f'\n📅 实时到期：{l[1].strftime("%Y-%m-%d %H:%M:%S")}')
+        for l in ls), return_exceptions=True)
+    failed = sum(isinstance(r, Exception) for r in results)
+    LOGGER.info(
+        f"【派送任务】 - {msg.from_user.first_name}({msg.from_user.id}) 派出 {a} 天 * {b}，消息私发完成，失败 {failed}")
 
 
 # coinsall 全部人加硬币
@@ -73,50 +66,40 @@ async def coins_all(_, msg):
                                  f"🔔 **使用格式：**/coins_all [+/-数量] [等级] [发送消息]\n\n给指定等级的用户 [+/- {credits}]\n示例： `/coins_all 100 b` 给所有b级用户加100{credits}\n示例： `/coins_all 100 b true` 给所有b级用户加100{credits}并私发消息\n等级说明:\na- 白名单账户\nb- 正常账户\nc- 已封禁账户\n发送消息参数：true 表示发送私信，默认不发送\n", timer=60)
     send = await bot.send_photo(msg.chat.id, photo=bot_photo,
                                 caption=f"⚡【{credits}任务】\n  **正在开启派送{credits}中...请稍后**")
-    rst = get_all_emby(Emby.lv == lv)
-    if rst is None:
+    start = time.perf_counter()
+    ls = await increment_iv.aio(Emby.lv == lv, coin)
+    if ls is None:
+        return await msg.reply("数据库操作出错，请检查重试")
+    if not ls:
         LOGGER.info(
             f"【{credits}任务】 -{msg.from_user.first_name}({msg.from_user.id}) 没有检测到任何emby账户，结束")
         return await send.edit("⚡【派送任务】\n\n结束，没有一个有号的")
 
-    b = 0
-    ls = []
-    start = time.perf_counter()
-    for i in rst:
-        b += 1
-        iv_new = i.iv + coin
-        ls.append([i.tg, iv_new])
-    if sql_update_embys(some_list=ls, method='iv'):
-        end = time.perf_counter()
-        times = end - start
-        sign_name = f'{msg.sender_chat.title}' if msg.sender_chat else f'{msg.from_user.first_name}'
-        if send_msg:
-            await send.edit(
-                f"⚡【{credits}任务】\n\n  批量派出 {coin} {credits} * {b} ，耗时：{times:.3f}s\n 已到账，正在向每个拥有emby的用户私发消息，短时间内请不要重复使用")
-        else:
-            await send.edit(
-                f"⚡【{credits}任务】\n\n  批量派出 {coin} {credits} * {b} ，耗时：{times:.3f}s\n 已到账")
-        LOGGER.info(
-            f"【派送{credits}任务】 - {sign_name}({msg.from_user.id}) 派出 {coin} * {b} 更改用时{times:.3f} s")
-        
-        # 根据参数决定是否发送私信
-        if send_msg:
-            for l in ls:
-                try:
-                    await bot.send_message(l[0], f"🎯 管理员 {sign_name} 调节了您的账户{credits} {coin}"
-                                             f'\n📅 实时数量：{l[1]}')
-                except FloodWait as f:
-                    LOGGER.warning(str(f))
-                    await asyncio.sleep(f.value * 1.2)
-                    await bot.send_message(l[0], f"🎯 管理员 {sign_name} 调节了您的账户{credits} {coin}"
-                                             f'\n📅 实时数量：{l[1]}')
-                except Exception as e:
-                    LOGGER.error(f"派送{credits}任务失败：{l[0]} {e}")
-                    continue
-            LOGGER.info(
-                f"【派送{credits}任务】 - {sign_name}({msg.from_user.id}) 派出 {coin} {credits} * {b}，消息私发完成")
+    b = len(ls)
+    end = time.perf_counter()
+    times = end - start
+    sign_name = f'{msg.sender_chat.title}' if msg.sender_chat else f'{msg.from_user.first_name}'
+    if send_msg:
+        await send.edit(
+            f"⚡【{credits}任务】\n\n  批量派出 {coin} {credits} * {b} ，耗时：{times:.3f}s\n 已到账，正在向每个拥有emby的用户私发消息，短时间内请不要重复使用")
     else:
-        await msg.reply("数据库操作出错，请检查重试")
+        await send.edit(
+            f"⚡【{credits}任务】\n\n  批量派出 {coin} {credits} * {b} ，耗时：{times:.3f}s\n 已到账")
+    LOGGER.info(
+        f"【派送{credits}任务】 - {sign_name}({msg.from_user.id}) 派出 {coin} * {b} 更改用时{times:.3f} s")
+    
+    # 根据参数决定是否发送私信
+    if send_msg:
+        results = await asyncio.gather(*(
+            outbox.send_message(l[0], f"🎯 管理员 {sign_name} 调节了您的账户{credits} {coin}"
+                                      f'\n📅 实时数量：{l[1]}')
+            for l in ls), return_exceptions=True)
+        for l, r in zip(ls, results):
+            if isinstance(r, Exception):
+                LOGGER.error(f"派送{credits}任务失败：{l[0]} {r}")
+        LOGGER.info(
+            f"【派送{credits}任务】 - {sign_name}({msg.from_user.id}) 派出 {coin} {credits} * {b}，消息私发完成")
+
 
 # coinsclear 清除用户币币
 @bot.on_message(filters.command('coins_clear', prefixes) & admins_on_filter)
@@ -140,8 +123,8 @@ async def coinsclear(_, msg):
     if level_param == 'all':
         send = await bot.send_photo(msg.chat.id, photo=bot_photo,
                                 caption=f"⚡【{credits}任务】\n  **正在清除所有用户币币...请稍后**")
-        rst = sql_clear_emby_iv()
-        if rst:
+        rst = await sql_clear_emby_iv.aio()
+        if rst is not None:
             await send.edit(f"⚡【{credits}任务】\n\n  清除所有用户币币完成")
             LOGGER.info(f"【清除{credits}任务】 - {sign_name}({msg.from_user.id}) 清除所有用户币币完成")
         else:
@@ -153,19 +136,11 @@ async def coinsclear(_, msg):
         send = await bot.send_photo(msg.chat.id, photo=bot_photo,
                                 caption=f"⚡【{credits}任务】\n  **正在清除{lv}级用户币币...请稍后**")
         
-        # 获取指定等级的所有用户
-        rst = get_all_emby(Emby.lv == lv)
-        if rst is None or len(rst) == 0:
+        count = await sql_clear_emby_iv.aio(Emby.lv == lv)
+        if count == 0:
             LOGGER.info(f"【清除{credits}任务】 - {sign_name}({msg.from_user.id}) 没有检测到{lv}级用户")
             return await send.edit(f"⚡【{credits}任务】\n\n  没有检测到{lv}级用户")
-        
-        # 批量将币币设置为0
-        ls = []
-        for i in rst:
-            ls.append([i.tg, 0])
-        
-        if sql_update_embys(some_list=ls, method='iv'):
-            count = len(ls)
+        if count is not None:
             await send.edit(f"⚡【{credits}任务】\n\n  清除{lv}级用户币币完成\n  共清除 {count} 个用户")
             LOGGER.info(f"【清除{credits}任务】 - {sign_name}({msg.from_user.id}) 清除{lv}级用户币币完成，共 {count} 个用户")
         else:
@@ -198,18 +173,13 @@ async def call_all(_, msg):
     elif call.text == '1':
         chat_members = get_all_emby(Emby.embyid.isnot(None))
     reply = await msg.reply('开始执行发送......')
-    a = 0
     start = time.perf_counter()
-    for member in chat_members:
-        try:
-            a += 1
-            await m.copy(member.tg)
-        except FloodWait as f:
-            LOGGER.warning(str(f))
-            await asyncio.sleep(f.value * 1.2)
-            return await m.copy(member.tg)
-        except Exception as e:
-            LOGGER.warning(str(e))
+    results = await asyncio.gather(*(outbox.copy(m, member.tg) for member in chat_members),
+                                   return_exceptions=True)
+    a = len(results)
+    for r in results:
+        if isinstance(r, Exception):
+            LOGGER.warning(str(r))
     end = time.perf_counter()
     times = end - start
     await reply.edit(f'消息发送完毕\n\n共计：{a} 次，用时 {times:.3f} s')
@@ -6,6 +6,7 @@ from bot import bot, owner, prefixes, extra_emby_libs, LOGGER, Now
 from bot.func_helper.msg_utils import sendMessage, deleteMessage
 from bot.sql_helper.sql_emby import get_all_emby, Emby
 from bot.func_helper.emby_utils import get_user_emby_service
+from bot.func_helper.emby import BulkJob
 from bot.func_helper.emby_manager import emby_manager
 
 # embylibs_block
@@ -19,30 +20,28 @@ async def embylibs_blockall(_, msg):
             f"【关闭媒体库任务】 -{msg.from_user.first_name}({msg.from_user.id}) 没有检测到任何emby账户，结束")
         return await reply.edit("⚡【关闭媒体库任务】\n\n结束，没有一个有号的")
     allcount = 0
-    successcount = 0
     start = time.perf_counter()
     text = ''
+    jobs = []
     for i in rst:
         if i.embyid:
             allcount += 1
-            try:
-                # 获取用户对应的服务实例（多服务器适配）
-                emby_service, server_config, user = get_user_emby_service(i.tg)
-                if not emby_service:
-                    LOGGER.warning(f"无法定位服务器: {i.name}")
-                    text += f'🌧️ 关闭失败 [{i.name}](tg://user?id={i.tg}) - 无法定位服务器\n'
-                    continue
+            # 获取用户对应的服务实例（多服务器适配）
+            emby_service, server_config, user = get_user_emby_service(i.tg)
+            if not emby_service:
+                LOGGER.warning(f"无法定位服务器: {i.name}")
+                text += f'🌧️ 关闭失败 [{i.name}](tg://user?id={i.tg}) - 无法定位服务器\n'
+                continue
+            jobs.append(BulkJob(i.embyid, 'disable_all_folders_for_user', server_id=emby_service.server_id, tag=i))
 
-                # 使用封装的禁用所有媒体库方法
-                re = await emby_service.disable_all_folders_for_user(i.embyid)
-                if re is True:
-                    successcount += 1
-                    text += f'已关闭了 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
-                else:
-                    text += f'🌧️ 关闭失败 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
-            except Exception as e:
-                LOGGER.error(f"关闭媒体库权限失败: {i.name} - {str(e)}")
-                text += f'🌧️ 关闭失败 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
+    # 按服务器并发关闭媒体库权限
+    result = await emby_manager.bulk_apply(jobs)
+    successcount = len(result.succeeded)
+    for job in result.succeeded:
+        text += f'已关闭了 [{job.tag.name}](tg://user?id={job.tag.tg}) 的媒体库权限\n'
+    for job, error in result.failed:
+        LOGGER.error(f"关闭媒体库权限失败: {job.tag.name} - {error}")
+        text += f'🌧️ 关闭失败 [{job.tag.name}](tg://user?id={job.tag.tg}) 的媒体库权限\n'
     # 防止触发 MESSAGE_TOO_LONG 异常
     n = 1000
     chunks = [text[i:i + n] for i in range(0, len(text), n)]
@@ -69,30 +68,28 @@ async def embylibs_unblockall(_, msg):
             f"【开启媒体库任务】 -{msg.from_user.first_name}({msg.from_user.id}) 没有检测到任何emby账户，结束")
         return await reply.edit("⚡【开启媒体库任务】\n\n结束，没有一个有号的")
     allcount = 0
-    successcount = 0
     start = time.perf_counter()
     text = ''
+    jobs = []
     for i in rst:
         if i.embyid:
             allcount += 1
-            try:
-                # 获取用户对应的服务实例（多服务器适配）
-                emby_service, server_config, user = get_user_emby_service(i.tg)
-                if not emby_service:
-                    LOGGER.warning(f"无法定位服务器: {i.name}")
-                    text += f'🌧️ 开启失败 [{i.name}](tg://user?id={i.tg}) - 无法定位服务器\n'
-                    continue
+            # 获取用户对应的服务实例（多服务器适配）
+            emby_service, server_config, user = get_user_emby_service(i.tg)
+            if not emby_service:
+                LOGGER.warning(f"无法定位服务器: {i.name}")
+                text += f'🌧️ 开启失败 [{i.name}](tg://user?id={i.tg}) - 无法定位服务器\n'
+                continue
+            jobs.append(BulkJob(i.embyid, 'enable_all_folders_for_user', server_id=emby_service.server_id, tag=i))
 
-                # 使用封装的启用所有媒体库方法
-                re = await emby_service.enable_all_folders_for_user(i.embyid)
-                if re is True:
-                    successcount += 1
-                    text += f'已开启了 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
-                else:
-                    text += f'🌧️ 开启失败 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
-            except Exception as e:
-                LOGGER.error(f"开启媒体库权限失败: {i.name} - {str(e)}")
-                text += f'🌧️ 开启失败 [{i.name}](tg://user?id={i.tg}) 的媒体库权限\n'
+    # 按服务器并发开启媒体库权限
+    result = await emby_manager.bulk_apply(jobs)
+    successcount = len(result.succeeded)
+    for job in result.succeeded:
+        text += f'已开启了 [{job.tag.name}](tg://user?id={job.tag.tg}) 的媒体库权限\n'
+    for job, error in result.failed:
+        LOGGER.error(f"开启媒体库权限失败: {job.tag.name} - {error}")
+        text += f'🌧️ 开启失败 [{job.tag.name}](tg://user?id={job.tag.tg}) 的媒体库权限\n'
     # 防止触发 MESSAGE_TOO_LONG 异常
     n = 1000
     chunks = [text[i:i + n] for i in range(0, len(text), n)]
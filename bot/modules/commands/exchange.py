@@ -9,7 +9,7 @@ from bot.func_helper.emby_manager import emby_manager
 from bot.func_helper.fix_bottons import register_code_ikb
 from bot.func_helper.msg_utils import sendMessage, sendPhoto
 from bot.sql_helper.sql_code import Code
-from bot.sql_helper.sql_emby import sql_get_emby, Emby
+from bot.sql_helper.sql_emby import sql_get_emby_by_tg, Emby, emby_cache
 from bot.sql_helper import Session
 
 # 导入优化模块
@@ -28,7 +28,7 @@ async def rgs_code(_, msg, register_code):
     # 移除此检查：续期码应该始终可用，注册码的限制在后面处理
     # 开放注册时不影响续期码的使用，只影响注册码
 
-    data = sql_get_emby(tg=msg.from_user.id)
+    data = sql_get_emby_by_tg(msg.from_user.id)
     if not data:
         # 优化：使用标准错误消息
         return await sendMessage(msg, Messages.ERROR_NOT_IN_DATABASE)
@@ -156,6 +156,7 @@ async def rgs_code(_, msg, register_code):
                 await sendMessage(msg, success_msg)
 
             session.commit()
+            emby_cache.invalidate(msg.from_user.id)
             new_code = register_code[:-7] + "░" * 7
             await sendMessage(msg,
                               f'· 🎟️ 续期码使用 - [{msg.from_user.first_name}](tg://user?id={msg.chat.id}) [{msg.from_user.id}] 使用了 {new_code}\n· 📅 实时到期 - {ex_new}',
@@ -184,6 +185,7 @@ async def rgs_code(_, msg, register_code):
             x = data.us + us1
             session.query(Emby).filter(Emby.tg == msg.from_user.id).update({Emby.us: x})
             session.commit()
+            emby_cache.invalidate(msg.from_user.id)
             await sendPhoto(msg, photo=bot_photo,
                             caption=f'🎊 少年郎，恭喜你，已经收到了 [{first.first_name}](tg://user?id={tg1}) 发送的邀请注册资格\n\n请选择你的选项~',
                             buttons=register_code_ikb)
@@ -74,6 +74,9 @@ async def server_check_command(_, message: Message):
                 icon = "❌"
                 error = status.get('error', '未知')
                 text += f"{icon} `{server_id}` - {error}\n"
+            guard = status.get('guard')
+            if guard and guard['breaker'] != 'closed':
+                text += f"   ⚡ 熔断状态: {guard['breaker']}，失败 {guard['failures']} 次\n"
 
         await status_msg.edit_text(text)
 
@@ -23,8 +23,10 @@ from pyrogram import filters
 from pyrogram.errors import FloodWait
 from bot import bot, prefixes, bot_photo, LOGGER, owner, group
 from bot.func_helper.emby_utils import get_user_emby_service, get_user_emby_services
+from bot.func_helper.emby import BulkJob, BulkResult
 from bot.func_helper.emby_manager import emby_manager
 from bot.func_helper.filters import admins_on_filter
+from bot.func_helper.group_members import group_members
 from bot.func_helper.utils import tem_deluser, split_long_message
 from bot.sql_helper.sql_emby import get_all_emby, Emby, sql_get_emby, sql_update_embys, sql_delete_emby, sql_update_emby
 from bot.func_helper.msg_utils import deleteMessage, sendMessage, sendPhoto, editMessage
@@ -36,6 +38,9 @@ from bot.sql_helper.sql_server_bindings import delete_user_bindings
 from bot.func_helper.message_formatter import ProgressTracker, MessageFormatter
 from bot.constants.messages import Messages
 
+# 批量禁用/解禁时每攒够多少个用户提交一次
+_BULK_BATCH = 500
+
 
 @bot.on_message(filters.command('purge_left', prefixes) & admins_on_filter)
 async def sync_emby_group(_, msg):
@@ -63,7 +68,10 @@ async def sync_emby_group(_, msg):
         # 步骤 1: 获取群组成员
         tracker.next_step()
         await editMessage(send, tracker.format_progress("正在获取群组成员..."))
-        members = [member.user.id async for member in bot.get_chat_members(group[0])]
+        # 先与 Telegram 对账一次，确保删除判断基于最新的成员列表
+        if (await group_members.reconcile([group[0]]))['failed']:
+            return await editMessage(send, "⚡群组同步任务\n\n获取群组成员失败，已取消，请检查 bot 权限后重试。")
+        members = group_members.members(group[0])
 
         # 步骤 2: 获取数据库用户
         tracker.next_step()
@@ -567,73 +575,41 @@ async def unban_all_users(_, msg):
         if not all_servers:
             return await send.edit("⚡解除禁用任务\n\n结束！没有可用的服务器。")
 
-        allusers = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, users = await emby_service.users()
-                if success and users:
-                    for u in users:
-                        u['_server_id'] = server_id
-                        u['_emby_service'] = emby_service
-                    allusers.extend(users)
-            except Exception as e:
-                LOGGER.warning(f"获取服务器 {server_id} 用户列表失败: {e}")
-
-        if not allusers:
-            return await send.edit("⚡解除禁用任务\n\n结束！所有服务器都无法获取用户列表。")
-
         allusers_in_db = get_all_emby(Emby.name.isnot(None) if hasattr(Emby.name, "isnot") else Emby.name != None)
+        db_users = {}
+        for user in allusers_in_db or []:
+            db_users.setdefault(user.name, user)
 
-        unban_user_in_bot_count = unban_user_in_emby_count = index = 0
+        unban_user_in_bot_count = index = 0
         text = ''
         start = time.perf_counter()
-        for emby_user in allusers:
 
-            try:
-                # 跳过管理员账户
-                if emby_user.get('Policy') and bool(emby_user['Policy'].get('IsAdministrator', False)):
-                    continue
-
-                emby_name = emby_user.get('Name')
-                emby_id = emby_user.get('Id')
-                emby_service = emby_user.get('_emby_service')
-
-                if not emby_name or not emby_id or not emby_service:
-                    continue
-
-                # 根据用户名在数据库中查找用户
-                db_user = next((user for user in allusers_in_db if user.name == emby_name), None)
-
-                # 调用emby API解除禁用
-                if await emby_service.emby_change_policy(emby_id=emby_id, disable=False):
-                    unban_user_in_emby_count += 1
-                    if not db_user:
-                        # 数据库中未找到该用户，跳过
-                        continue
-                    
-                    # 只处理 lv='c' 的用户（被禁用的用户）
-                    if db_user.lv != 'c':
-                        continue
-                    # 更新数据库状态为正常（lv='b'）
-                    index += 1
-                    if sql_update_emby(Emby.tg == db_user.tg, lv='b'):
-                        unban_user_in_bot_count += 1
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 解禁成功\n'
-                        LOGGER.info(reply_text)
-                    else:
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 解禁成功，但数据库更新失败\n'
-                        LOGGER.warning(reply_text)
-                else:
-                    reply_text = f'[{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 解禁失败\n'
-                    LOGGER.error(reply_text)
-                text += reply_text
-                continue
-            except Exception as e:
-                reply_text = f'处理用户 {emby_user.get("Name", "未知")} 时发生异常: {str(e)}\n'
-                LOGGER.error(reply_text)
-                text += reply_text
+        # 分页遍历各服务器用户，按服务器并发调用emby API解除禁用
+        user_count, result = await _bulk_all_users(all_servers, 'emby_change_policy', disable=False)
+        if not user_count:
+            return await send.edit("⚡解除禁用任务\n\n结束！所有服务器都无法获取用户列表。")
+        unban_user_in_emby_count = len(result.succeeded)
+        for job in result.succeeded:
+            emby_name = job.tag
+            db_user = db_users.get(emby_name)
+            # 数据库中未找到该用户，或者不是 lv='c' 的用户（被禁用的用户），跳过
+            if not db_user or db_user.lv != 'c':
                 continue
-        
+            # 更新数据库状态为正常（lv='b'）
+            index += 1
+            if sql_update_emby(Emby.tg == db_user.tg, lv='b'):
+                unban_user_in_bot_count += 1
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 解禁成功\n'
+                LOGGER.info(reply_text)
+            else:
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 解禁成功，但数据库更新失败\n'
+                LOGGER.warning(reply_text)
+            text += reply_text
+        for job, error in result.failed:
+            reply_text = f'`{job.tag}` 解禁失败：{error}\n'
+            LOGGER.error(reply_text)
+            text += reply_text
+
         # 防止触发 MESSAGE_TOO_LONG 异常
         chunks = split_long_message(text)
         for c in chunks:
@@ -643,10 +619,10 @@ async def unban_all_users(_, msg):
         times = end - start
         if unban_user_in_bot_count != 0 or unban_user_in_emby_count != 0:
             await sendMessage(msg,
-                            text=f"**⚡解除所有用户禁用状态任务 结束！**\n共检索出 {len(allusers)} 个 Emby 账户\n成功解禁 {unban_user_in_emby_count} 个Emby账户\n成功设置等级 {unban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
+                            text=f"**⚡解除所有用户禁用状态任务 结束！**\n共检索出 {user_count} 个 Emby 账户\n成功解禁 {unban_user_in_emby_count} 个Emby账户\n成功设置等级 {unban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
         else:
             await sendMessage(msg, text="**⚡解除所有用户禁用状态任务 结束！没有用户被解禁。**")
-        LOGGER.info(f"【解除所有用户禁用状态任务结束】 - {sign_name} 共检索出 {len(allusers)} 个 Emby 账户\n成功解禁 {unban_user_in_emby_count} 个Emby账户\n成功设置等级 {unban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
+        LOGGER.info(f"【解除所有用户禁用状态任务结束】 - {sign_name} 共检索出 {user_count} 个 Emby 账户\n成功解禁 {unban_user_in_emby_count} 个Emby账户\n成功设置等级 {unban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
 
 
 @bot.on_message(filters.command('ban_all', prefixes) & filters.user(owner))
@@ -674,72 +650,41 @@ async def ban_all_users(_, msg):
         if not all_servers:
             return await send.edit("⚡禁用所有用户任务\n\n结束！没有可用的服务器。")
 
-        allusers = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, users = await emby_service.users()
-                if success and users:
-                    for u in users:
-                        u['_server_id'] = server_id
-                        u['_emby_service'] = emby_service
-                    allusers.extend(users)
-            except Exception as e:
-                LOGGER.warning(f"获取服务器 {server_id} 用户列表失败: {e}")
-
-        if not allusers:
-            return await send.edit("⚡禁用所有用户任务\n\n结束！所有服务器都无法获取用户列表。")
-
         allusers_in_db = get_all_emby(Emby.name.isnot(None) if hasattr(Emby.name, "isnot") else Emby.name != None)
-        ban_user_in_bot_count = ban_user_in_emby_count = index = 0
+        db_users = {}
+        for user in allusers_in_db or []:
+            db_users.setdefault(user.name, user)
+
+        ban_user_in_bot_count = index = 0
         text = ''
         start = time.perf_counter()
-        for emby_user in allusers:
 
-            try:
-                # 跳过管理员账户
-                if emby_user.get('Policy') and bool(emby_user['Policy'].get('IsAdministrator', False)):
-                    continue
-
-                emby_name = emby_user.get('Name')
-                emby_id = emby_user.get('Id')
-                emby_service = emby_user.get('_emby_service')
-
-                if not emby_name or not emby_id or not emby_service:
-                    continue
-
-                # 根据用户名在数据库中查找用户
-                db_user = next((user for user in allusers_in_db if user.name == emby_name), None)
-
-
-                # 调用emby API禁用用户
-                if await emby_service.emby_change_policy(emby_id=emby_id, disable=True):
-                    ban_user_in_emby_count += 1
-                    if not db_user:
-                        # 数据库中未找到该用户，跳过
-                        continue
-                    
-                    # 只处理 lv='b' 的用户（正常用户）
-                    if db_user.lv != 'b':
-                        continue
-                    index += 1
-                    # 更新数据库状态为禁用（lv='c'）
-                    if sql_update_emby(Emby.tg == db_user.tg, lv='c'):
-                        ban_user_in_bot_count += 1
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 禁用成功\n'
-                        LOGGER.info(reply_text)
-                    else:
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 禁用成功，但数据库更新失败\n'
-                        LOGGER.warning(reply_text)
-                else:
-                    reply_text = f'[{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 禁用失败\n'
-                    LOGGER.error(reply_text)
-                text += reply_text
-            except Exception as e:
-                reply_text = f'处理用户 {emby_user.get("Name", "未知")} 时发生异常: {str(e)}\n'
-                LOGGER.error(reply_text)
-                text += reply_text
+        # 分页遍历各服务器用户，按服务器并发调用emby API禁用用户
+        user_count, result = await _bulk_all_users(all_servers, 'emby_change_policy', disable=True)
+        if not user_count:
+            return await send.edit("⚡禁用所有用户任务\n\n结束！所有服务器都无法获取用户列表。")
+        ban_user_in_emby_count = len(result.succeeded)
+        for job in result.succeeded:
+            emby_name = job.tag
+            db_user = db_users.get(emby_name)
+            # 数据库中未找到该用户，或者不是 lv='b' 的用户（正常用户），跳过
+            if not db_user or db_user.lv != 'b':
                 continue
-        
+            index += 1
+            # 更新数据库状态为禁用（lv='c'）
+            if sql_update_emby(Emby.tg == db_user.tg, lv='c'):
+                ban_user_in_bot_count += 1
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 禁用成功\n'
+                LOGGER.info(reply_text)
+            else:
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 禁用成功，但数据库更新失败\n'
+                LOGGER.warning(reply_text)
+            text += reply_text
+        for job, error in result.failed:
+            reply_text = f'`{job.tag}` 禁用失败：{error}\n'
+            LOGGER.error(reply_text)
+            text += reply_text
+
         # 防止触发 MESSAGE_TOO_LONG 异常
         chunks = split_long_message(text)
         for c in chunks:
@@ -748,10 +693,10 @@ async def ban_all_users(_, msg):
         times = end - start
         if ban_user_in_bot_count != 0 or ban_user_in_emby_count != 0:
             await sendMessage(msg,
-                            text=f"**⚡禁用所有用户任务 结束！**\n共检索出 {len(allusers)} 个 Emby 账户\n成功禁用 {ban_user_in_emby_count} 个Emby账户\n成功设置等级 {ban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
+                            text=f"**⚡禁用所有用户任务 结束！**\n共检索出 {user_count} 个 Emby 账户\n成功禁用 {ban_user_in_emby_count} 个Emby账户\n成功设置等级 {ban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
         else:
             await sendMessage(msg, text="**⚡禁用所有用户任务 结束！没有用户被禁用。**")
-        LOGGER.info(f"【禁用所有用户任务结束】 - {sign_name} 共检索出 {len(allusers)} 个 Emby 账户\n成功禁用 {ban_user_in_emby_count} 个Emby账户\n成功设置等级 {ban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
+        LOGGER.info(f"【禁用所有用户任务结束】 - {sign_name} 共检索出 {user_count} 个 Emby 账户\n成功禁用 {ban_user_in_emby_count} 个Emby账户\n成功设置等级 {ban_user_in_bot_count}个用户\n耗时：{times:.3f}s")
 
 
 @bot.on_message(filters.command('nuke', prefixes) & filters.user(owner))
@@ -778,68 +723,44 @@ async def delete_all_users(_, msg):
         if not all_servers:
             return await send.edit("⚡跑路命令任务\n\n结束！没有可用的服务器。")
 
-        allusers = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, users = await emby_service.users()
-                if success and users:
-                    for u in users:
-                        u['_server_id'] = server_id
-                        u['_emby_service'] = emby_service
-                    allusers.extend(users)
-            except Exception as e:
-                LOGGER.warning(f"获取服务器 {server_id} 用户列表失败: {e}")
-
-        if not allusers:
-            return await send.edit("⚡跑路命令任务\n\n结束！所有服务器都无法获取用户列表。")
-
         allusers_in_db = get_all_emby(Emby.name.isnot(None) if hasattr(Emby.name, "isnot") else Emby.name != None)
+        db_users = {}
+        for user in allusers_in_db or []:
+            db_users.setdefault(user.name, user)
 
-        delete_user_in_emby_count = delete_user_in_bot_count = index = 0
+        delete_user_in_bot_count = index = 0
         text = ''
         start = time.perf_counter()
-        for emby_user in allusers:
 
-            try:
-                # 跳过管理员账户
-                if emby_user.get('Policy') and bool(emby_user['Policy'].get('IsAdministrator', False)):
-                    continue
-
-                emby_name = emby_user.get('Name')
-                emby_id = emby_user.get('Id')
-                emby_service = emby_user.get('_emby_service')
-
-                if not emby_name or not emby_id or not emby_service:
-                    continue
-
-                if await emby_service.emby_del(emby_id=emby_id):    
-                    delete_user_in_emby_count += 1
-                    index += 1
-                    db_user = next((user for user in allusers_in_db if user.name == emby_name), None)
-                    if not db_user:
-                        continue
-                    # 优先使用tg（主键）删除，如果embyid存在也一起使用
-                    if db_user.embyid:
-                        delete_result = sql_delete_emby(tg=db_user.tg, embyid=db_user.embyid)
-                    else:
-                        delete_result = sql_delete_emby(tg=db_user.tg)
-                    if delete_result:
-                        delete_user_in_bot_count += 1
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 已删除\n'
-                        LOGGER.info(reply_text)
-                    else:
-                        reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 删除失败\n'
-                        LOGGER.error(reply_text)
-                else:
-                    reply_text = f'[{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 删除失败\n'
-                    LOGGER.error(reply_text)
-                text += reply_text
-            except Exception as e:
-                reply_text = f'处理用户 {emby_user.get("Name", "未知")} 时发生异常: {str(e)}\n'
-                LOGGER.error(reply_text)
-                text += reply_text
+        # 分页遍历各服务器用户，收集完后按服务器并发调用emby API删除用户
+        user_count, result = await _bulk_all_users(all_servers, 'emby_del', flush=False)
+        if not user_count:
+            return await send.edit("⚡跑路命令任务\n\n结束！所有服务器都无法获取用户列表。")
+        delete_user_in_emby_count = len(result.succeeded)
+        for job in result.succeeded:
+            emby_name = job.tag
+            index += 1
+            db_user = db_users.get(emby_name)
+            if not db_user:
                 continue
-        
+            # 优先使用tg（主键）删除，如果embyid存在也一起使用
+            if db_user.embyid:
+                delete_result = sql_delete_emby(tg=db_user.tg, embyid=db_user.embyid)
+            else:
+                delete_result = sql_delete_emby(tg=db_user.tg)
+            if delete_result:
+                delete_user_in_bot_count += 1
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 已删除\n'
+                LOGGER.info(reply_text)
+            else:
+                reply_text = f'{index}. [{emby_name}](tg://user?id={db_user.tg}) - #id{db_user.tg} 删除失败\n'
+                LOGGER.error(reply_text)
+            text += reply_text
+        for job, error in result.failed:
+            reply_text = f'`{job.tag}` 删除失败：{error}\n'
+            LOGGER.error(reply_text)
+            text += reply_text
+
         # 防止触发 MESSAGE_TOO_LONG 异常
         chunks = split_long_message(text)
         for c in chunks:
@@ -849,7 +770,45 @@ async def delete_all_users(_, msg):
         times = end - start
         if delete_user_in_emby_count != 0 or delete_user_in_bot_count != 0:
             await sendMessage(msg,
-                            text=f"**⚡跑路命令任务 结束！**\n共检索出 {len(allusers)} 个 Emby 账户\n成功删除 {delete_user_in_emby_count} 个账户\n耗时：{times:.3f}s")
+                            text=f"**⚡跑路命令任务 结束！**\n共检索出 {user_count} 个 Emby 账户\n成功删除 {delete_user_in_emby_count} 个账户\n耗时：{times:.3f}s")
         else:
             await sendMessage(msg, text="**⚡跑路命令任务 结束！没有用户被删除。**")
-        LOGGER.info(f"【跑路命令任务结束】 - {sign_name} 共检索出 {len(allusers)} 个 Emby 账户\n成功删除 {delete_user_in_emby_count} 个账户\n耗时：{times:.3f}s")
+        LOGGER.info(f"【跑路命令任务结束】 - {sign_name} 共检索出 {user_count} 个 Emby 账户\n成功删除 {delete_user_in_emby_count} 个账户\n耗时：{times:.3f}s")
+
+
+async def _bulk_all_users(all_servers, method: str, flush: bool = True, **kwargs):
+    """
+    分页遍历所有服务器的非管理员用户，对每个用户执行同一批量操作，各服务器并发进行
+    flush=True 时每攒够一批就提交；删除用户会使分页错位，需 flush=False 先收集完再提交
+    :return: (检索到的用户数, BulkResult)
+    """
+    async def _apply(server_id, emby_service):
+        user_count = 0
+        result = BulkResult()
+        jobs = []
+        try:
+            async for emby_user in emby_service.iter_users():
+                user_count += 1
+                # 跳过管理员账户
+                if emby_user['IsAdministrator'] or not emby_user['Name'] or not emby_user['Id']:
+                    continue
+                jobs.append(BulkJob(emby_user['Id'], method, server_id=server_id, tag=emby_user['Name'], **kwargs))
+                if flush and len(jobs) >= _BULK_BATCH:
+                    result.merge(await emby_service.bulk_apply(jobs))
+                    jobs = []
+        except Exception as e:
+            LOGGER.warning(f"获取服务器 {server_id} 用户列表失败: {e}")
+        if jobs:
+            result.merge(await emby_service.bulk_apply(jobs))
+        return user_count, result
+
+    user_count = 0
+    result = BulkResult()
+    # 批量操作耗时与用户数相关，不设超时
+    fanout = await emby_manager.gather_servers(_apply, timeout=0, server_ids=list(all_servers))
+    for server_id, error in fanout.errors.items():
+        LOGGER.warning(f"服务器 {server_id} 批量操作失败: {error}")
+    for server_count, server_result in fanout.values():
+        user_count += server_count
+        result.merge(server_result)
+    return user_count, result
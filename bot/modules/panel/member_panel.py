@@ -24,7 +24,7 @@ from bot.func_helper.msg_utils import callAnswer, editMessage, callListen, sendM
 from bot.modules.commands import p_start
 from bot.modules.commands.exchange import rgs_code
 from bot.sql_helper.sql_code import sql_count_c_code
-from bot.sql_helper.sql_emby import sql_get_emby, sql_update_emby, Emby, sql_delete_emby
+from bot.sql_helper.sql_emby import sql_get_emby, sql_get_emby_by_tg, sql_update_emby, Emby, sql_delete_emby
 from bot.sql_helper.sql_emby2 import sql_get_emby2, sql_delete_emby2
 from bot.sql_helper.sql_server_bindings import (
     add_binding, get_binding, get_primary_binding, get_user_bindings,
@@ -243,7 +243,7 @@ async def create(_, call):
     :param call:
     :return:
     """
-    e = sql_get_emby(tg=call.from_user.id)
+    e = sql_get_emby_by_tg(call.from_user.id)
     if not e:
         return await callAnswer(call, '⚠️ 数据库没有你，请重新 /start录入', True)
 
@@ -325,7 +325,7 @@ async def change_tg(_, call):
         return
     except (IndexError, ValueError):
         pass
-    d = sql_get_emby(tg=call.from_user.id)
+    d = sql_get_emby_by_tg(call.from_user.id)
     if not d:
         return await callAnswer(call, '⚠️ 数据库没有你，请重新 /start录入', True)
     if d.embyid:
@@ -458,7 +458,7 @@ async def change_tg(_, call):
 
 @bot.on_callback_query(filters.regex('bindtg') & user_in_group_on_filter)
 async def bind_tg(_, call):
-    d = sql_get_emby(tg=call.from_user.id)
+    d = sql_get_emby_by_tg(call.from_user.id)
     if d.embyid is not None:
         return await callAnswer(call, '⚖️ 您已经拥有账户，请不要钻空子', True)
     await callAnswer(call, '⚖️ 将账户绑定TG')
@@ -538,7 +538,7 @@ async def bind_tg(_, call):
 # kill yourself
 @bot.on_callback_query(filters.regex('delme'))
 async def del_me(_, call):
-    e = sql_get_emby(tg=call.from_user.id)
+    e = sql_get_emby_by_tg(call.from_user.id)
     if e is None:
         return await callAnswer(call, '⚠️ 数据库没有你，请重新 /start录入', True)
     else:
@@ -611,7 +611,7 @@ async def del_emby(_, call):
 # 重置密码为空密码
 @bot.on_callback_query(filters.regex('reset'))
 async def reset(_, call):
-    e = sql_get_emby(tg=call.from_user.id)
+    e = sql_get_emby_by_tg(call.from_user.id)
     if e is None:
         return await callAnswer(call, '⚠️ 数据库没有你，请重新 /start录入', True)
     if e.embyid is None:
@@ -699,7 +699,7 @@ async def reset(_, call):
 # 显示/隐藏某些库
 @bot.on_callback_query(filters.regex('embyblock'))
 async def embyblocks(_, call):
-    data = sql_get_emby(tg=call.from_user.id)
+    data = sql_get_emby_by_tg(call.from_user.id)
     if not data:
         return await callAnswer(call, '⚠️ 数据库没有你，请重新 /start录入', True)
     if data.embyid is None:
@@ -836,7 +836,7 @@ async def do_store(_, call):
 
 @bot.on_callback_query(filters.regex('store-reborn'))
 async def do_store_reborn(_, call):
-    e = sql_get_emby(tg=call.from_user.id)
+    e = sql_get_emby_by_tg(call.from_user.id)
     if not e:
         return
     if not e.embyid or not e.name:
@@ -876,7 +876,7 @@ async def do_store_reborn(_, call):
 @bot.on_callback_query(filters.regex('store-whitelist'))
 async def do_store_whitelist(_, call):
     if _open.whitelist:
-        e = sql_get_emby(tg=call.from_user.id)
+        e = sql_get_emby_by_tg(call.from_user.id)
         if e is None:
             return
         if not e.embyid or not e.name:
@@ -898,7 +898,7 @@ async def do_store_whitelist(_, call):
 @bot.on_callback_query(filters.regex('store-invite'))
 async def do_store_invite(_, call):
     if _open.invite:
-        e = sql_get_emby(tg=call.from_user.id)
+        e = sql_get_emby_by_tg(call.from_user.id)
         if not e:
             return
         # 用户等级为 a（白名单） b(普通用户) c(已禁用) d（未注册用户）
@@ -974,7 +974,7 @@ async def my_favorite(_, call):
     else:
         page = int(call.data.split(':')[1])
         await callAnswer(call, f'🔍 打开第{page}页')
-    get_emby = sql_get_emby(tg=call.from_user.id)
+    get_emby = sql_get_emby_by_tg(call.from_user.id)
     if get_emby is None:
         return await callAnswer(call, '您还没有Emby账户', True)
 
@@ -1012,7 +1012,7 @@ async def my_favorite(_, call):
     await editMessage(call, text, buttons=keyboard)
 @bot.on_callback_query(filters.regex('my_devices'))
 async def my_devices(_, call):
-    get_emby = sql_get_emby(tg=call.from_user.id)
+    get_emby = sql_get_emby_by_tg(call.from_user.id)
     if get_emby is None:
         return await callAnswer(call, '您还没有Emby账户', True)
 
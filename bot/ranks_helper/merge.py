@@ -0,0 +1,86 @@
+"""
+多服务器榜单合并
+各服务器返回的是本服务器内已聚合的部分结果，按条目合并后累加播放次数与时长，再用堆选出真正的前 k 名
+- 播放报告行：[UserId, ItemId, ItemType, name, play_count, total_duarion]
+- 观影时长行：[name, watch_time]
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import heapq
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+# 合并键函数：播放报告行 -> 键
+ReportKey = Callable[[Sequence], Hashable]
+
+
+def _num(value) -> int:
+    """Emby 自定义查询返回的数字是字符串，缺失时按 0 处理"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def title_key(row: Sequence) -> Hashable:
+    """默认合并键：(类型, 名称)，名称忽略首尾空白与大小写"""
+    return row[2], str(row[3] or '').strip().casefold()
+
+
+def merge_reports(reports: Iterable[Optional[Sequence[Sequence]]], k: int = 10,
+                  key: ReportKey = title_key) -> List[list]:
+    """
+    合并各服务器的播放报告
+
+    Args:
+        reports: 每个服务器的报告行列表（None 表示该服务器无数据）
+        k: 返回前 k 名，按总时长降序
+        key: 合并键，有 ProviderIds 等跨服务器稳定标识时可替换
+
+    Returns:
+        与输入同格式的行，次数与时长为合并后的整数；ItemId 取时长最大的那个服务器的条目，便于取封面
+    """
+    merged: Dict[Hashable, list] = {}
+    best: Dict[Hashable, int] = {}
+    for rows in reports:
+        for row in rows or ():
+            user_id, item_id, item_type, name, count, duration = tuple(row)[:6]
+            count, duration = _num(count), _num(duration)
+            row_key = key(row)
+            entry = merged.get(row_key)
+            if entry is None:
+                merged[row_key] = [user_id, item_id, item_type, name, count, duration]
+                best[row_key] = duration
+                continue
+            entry[4] += count
+            entry[5] += duration
+            if duration > best[row_key]:
+                best[row_key] = duration
+                entry[0], entry[1], entry[3] = user_id, item_id, name
+    return heapq.nlargest(k, merged.values(), key=lambda entry: entry[5])
+
+
+def merge_watch_time(lists: Iterable[Optional[Sequence[Sequence]]], k: int = None) -> List[list]:
+    """
+    合并各服务器的用户观影时长（同名账户视为同一用户）
+
+    Args:
+        lists: 每个服务器的 [name, watch_time] 列表
+        k: 返回前 k 名，None 返回全部
+
+    Returns:
+        [[name, watch_time], ...]，按时长降序
+    """
+    totals: Dict[str, int] = {}
+    # 无法解析出名称的用户（已删除等）无法跨服务器对应，各自单独保留
+    unnamed: List[list] = []
+    for rows in lists:
+        for row in rows or ():
+            name = row[0]
+            if not name:
+                unnamed.append([name, _num(row[1])])
+                continue
+            totals[name] = totals.get(name, 0) + _num(row[1])
+    entries = [[name, watch] for name, watch in totals.items()] + unnamed
+    if k is None:
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+    return heapq.nlargest(k, entries, key=lambda entry: entry[1])
@@ -0,0 +1,322 @@
+"""
+海报渲染（在子进程中执行）
+- 排行榜海报与红包封面的 PIL 绘制全部在进程池中完成，避免阻塞事件循环
+- 字体、遮罩、缩放后的背景在每个工作进程中只加载一次
+- 主进程只负责获取封面字节，把纯数据交给工作进程，拿回编码后的图片字节
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from bot import LOGGER
+
+# 启动时等待全部工作进程会合的最长时间（秒）
+_STARTUP_TIMEOUT = 30
+
+RESOURCE_PATH = os.path.join('bot', 'ranks_helper', 'resource')
+RED_PATH = os.path.join('bot', 'ranks_helper', 'red')
+BG_PATH = os.path.join(RESOURCE_PATH, 'bg')
+RED_BG_PATH = os.path.join(RED_PATH, 'bg')
+BOLD_FONT = os.path.join(RESOURCE_PATH, 'font', 'PingFang Bold.ttf')
+ZIMU_FONT = os.path.join(RESOURCE_PATH, 'font', 'Provicali.otf')
+
+# 榜单条目：(名称, 播放次数, 封面字节或 None, 封面类型 primary/backdrop)
+RankSlot = Tuple[str, str, Optional[bytes], str]
+
+
+# ==================== 工作进程内的资源缓存 ====================
+
+@lru_cache(maxsize=None)
+def _font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=None)
+def _mask(weekly: bool, backdrop: bool) -> Image.Image:
+    name = f"{'week' if weekly else 'day'}_ranks_mask{'_backdrop' if backdrop else ''}.png"
+    mask = Image.open(os.path.join(RESOURCE_PATH, name))
+    mask.load()
+    return mask
+
+
+@lru_cache(maxsize=64)
+def _base(bg_name: str, weekly: bool, backdrop: bool) -> Image.Image:
+    """背景缩放到遮罩尺寸并叠加遮罩，结果只读，使用时 copy"""
+    mask = _mask(weekly, backdrop)
+    bg = Image.open(os.path.join(BG_PATH, bg_name)).resize(mask.size)
+    bg.paste(mask, (0, 0), mask)
+    return bg
+
+
+@lru_cache(maxsize=None)
+def _red_bg(bg_name: str) -> Image.Image:
+    bg = Image.open(os.path.join(RED_BG_PATH, bg_name))
+    bg.load()
+    return bg
+
+
+@lru_cache(maxsize=None)
+def _red_border() -> Image.Image:
+    return Image.open(os.path.join(RED_PATH, 'red_mask.png')).convert('RGBA').convert('L')
+
+
+# 启动时各工作进程会合用的屏障，由 start_render_pool 经 initargs 传入（fork 继承）
+_startup_barrier = None
+
+
+def _init_worker(barrier=None):
+    """工作进程启动时预热字体与遮罩；资源缺失时留到实际渲染再报错"""
+    global _startup_barrier
+    _startup_barrier = barrier
+    try:
+        for size in (12, 14, 18, 50, 60):
+            _font(BOLD_FONT, size)
+        _font(ZIMU_FONT, 60)
+        for weekly in (False, True):
+            for backdrop in (False, True):
+                _mask(weekly, backdrop)
+        _red_border()
+    except Exception:
+        pass
+
+
+# ==================== 排行榜海报 ====================
+
+def _movie_layout(index: int, backdrop: bool, kind: str):
+    """电影条目的 (封面尺寸, 封面位置, 无封面时名称位置, 次数位置, 名称位置)"""
+    if backdrop:
+        if kind == 'backdrop':
+            resize, xy = (242, 160), (103 + 302 * index, 140)
+        else:
+            resize, xy = (110, 160), (169 + 302 * index, 140)
+        fallback = (123 + 302 * index, 140)
+    else:
+        resize, xy = (144, 210), (601, 162 + 230 * index)
+        fallback = (601, 162 + 230 * index)
+    return resize, xy, fallback, (601 + 130, 163 + 230 * index), (601, 163 + 190 + 230 * index)
+
+
+def _tv_layout(index: int, backdrop: bool, kind: str):
+    """剧集条目的 (封面尺寸, 封面位置, 无封面时名称位置, 次数位置, 名称位置)"""
+    if backdrop:
+        if kind == 'backdrop':
+            resize, xy = (242, 160), (408 + 302 * index, 444)
+        else:
+            resize, xy = (110, 160), (474 + 302 * index, 444)
+        fallback = (428 + 302 * index, 444)
+    else:
+        resize, xy = (144, 210), (770, 985 - 232 * index)
+        fallback = (770, 990 - 232 * index)
+    return resize, xy, fallback, (770 + 130, 990 - 232 * index), (770, 990 + 193 - 232 * index)
+
+
+def render_ranks(bg_name: str, weekly: bool, backdrop: bool, embyname: Optional[str],
+                 movies: Sequence[RankSlot], tvshows: Sequence[RankSlot], draw_text: bool = False) -> bytes:
+    """
+    绘制日榜/周榜海报
+
+    Args:
+        bg_name: resource/bg 下的背景文件名
+        weekly: 是否周榜
+        backdrop: 是否使用横版封面
+        embyname: Logo 文字
+        movies / tvshows: 榜单条目 (名称, 播放次数, 封面字节, 封面类型)，各取前 5
+        draw_text: 是否绘制名称与播放次数
+
+    Returns:
+        JPEG 图片字节
+    """
+    bg = _base(bg_name, weekly, backdrop).copy()
+    text = ImageDraw.Draw(bg)
+    font = _font(BOLD_FONT, 18)
+    font_count = _font(BOLD_FONT, 12)
+
+    for layout, slots in ((_movie_layout, movies), (_tv_layout, tvshows)):
+        for index, (name, count, data, kind) in enumerate(slots[:5]):
+            resize, xy, fallback, count_xy, name_xy = layout(index, backdrop, kind)
+            # 名称超出长度缩小省略
+            name = name[:7]
+            drawn = False
+            if data:
+                try:
+                    cover = Image.open(BytesIO(data)).resize(resize)
+                    bg.paste(cover, xy)
+                    drawn = True
+                except Exception as e:
+                    LOGGER.error(f'【ranks_draw】绘制封面图失败 {name} {e}')
+            if not drawn:
+                # 如果没有封面图，使用name来代替
+                draw_text_psd_style(text, fallback, name, font, 126)
+            if draw_text:
+                draw_text_psd_style(text, count_xy, str(count), font_count, 126)
+                draw_text_psd_style(text, name_xy, name, font, 126)
+
+    # 绘制Logo名字
+    if embyname:
+        font_logo = _font(BOLD_FONT, 60)
+        if backdrop:
+            draw_text_psd_style(text, (1900, 830), embyname, font_logo, 126, align='right')
+        else:
+            draw_text_psd_style(text, (90, 1100), embyname, font_logo, 126)
+
+    if bg.mode in ("RGBA", "P"):
+        bg = bg.convert("RGB")
+    out = BytesIO()
+    bg.save(out, format='JPEG')
+    return out.getvalue()
+
+
+# ==================== 红包封面 ====================
+
+def render_red_envelope(bg_name: str, money: int, members: int, user_pic: Optional[bytes],
+                        first_name: str) -> Optional[bytes]:
+    """
+    绘制红包封面
+
+    Returns:
+        PNG 图片字节，头像数据无效时返回 None
+    """
+    cover = _red_bg(bg_name).copy()
+    if user_pic:
+        # 获取 cover 的背景颜色
+        bg_color = cover.getpixel((0, 0))
+        try:
+            _pic = Image.open(BytesIO(user_pic)).convert('RGBA').resize((300, 300))
+        except IOError:
+            LOGGER.warning("user_pic 不是有效的图片数据")
+            return None
+        _pic.putalpha(_red_border())
+        pic = convert_bgcc(_pic, bg_color)
+        cover.paste(pic, ((cover.width - _pic.width) // 2, 180))
+    draw_cover_text(cover, first_name, money, members)
+    out = BytesIO()
+    cover.save(out, format='png')
+    return out.getvalue()
+
+
+def convert_bgcc(_pic, bg_color):
+    # 将图像转换为 numpy 数组
+    pic_array = np.array(_pic)
+    # 创建一个 mask，标记出 _pic 中的透明像素
+    mask = pic_array[..., 3] == 0
+    # 将 _pic 中的透明像素替换为背景颜色
+    pic_array[mask] = bg_color
+    # 将 numpy 数组转换回 PIL 图像
+    return Image.fromarray(pic_array)
+
+
+def draw_cover_text(cover, first_name, money, members):
+    draw = ImageDraw.Draw(cover)
+    draw.text((cover.width // 2, 550), f'{first_name}红包',
+              font=_font(BOLD_FONT, 50), anchor='mm', fill=(249, 219, 160))
+    draw.text((cover.width // 2, cover.height - 100), f'{money} / {members}',
+              font=_font(ZIMU_FONT, 60), anchor='mm', fill=(249, 219, 160))
+    return cover
+
+
+def draw_text_psd_style(draw, xy, text, font, tracking=0, leading=None, align='left', **kwargs):
+    """
+    usage: draw_text_psd_style(draw, (0, 0), "Test",
+                tracking=-0.1, leading=32, fill="Blue", align='left')
+
+    Leading is measured from the baseline of one line of text to the
+    baseline of the line above it. Baseline is the invisible line on which most
+    letters—that is, those without descenders—sit. The default auto-leading
+    option sets the leading at 120% of the type size (for example, 12‑point
+    leading for 10‑point type).
+
+    Tracking is measured in 1/1000 em, a unit of measure that is relative to
+    the current type size. In a 6 point font, 1 em equals 6 points;
+    in a 10 point font, 1 em equals 10 points. Tracking
+    is strictly proportional to the current type size.
+    """
+
+    def stutter_chunk(lst, size, overlap=0, default=None):
+        for i in range(0, len(lst), size - overlap):
+            r = list(lst[i:i + size])
+            while len(r) < size:
+                r.append(default)
+            yield r
+
+    x, y = xy
+    font_size = font.size
+    lines = text.splitlines()
+    if leading is None:
+        leading = font.size * 1.2
+
+    for line in lines:
+        # 计算整行文本宽度
+        total_width = font.getlength(line) + (tracking / 1000) * font_size * (len(line) - 1)
+
+        # 如果是右对齐，调整起始 x 坐标
+        current_x = x
+        if align == 'right':
+            current_x = x - total_width
+
+        for a, b in stutter_chunk(line, 2, 1, ' '):
+            w = font.getlength(a + b) - font.getlength(b)
+            draw.text((current_x, y), a, font=font, **kwargs)
+            current_x += w + (tracking / 1000) * font_size
+        y += leading
+
+
+# ==================== 进程池 ====================
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _rendezvous() -> int:
+    """启动预热任务：占住当前进程直到全部工作进程都已启动"""
+    if _startup_barrier is not None:
+        try:
+            _startup_barrier.wait(timeout=_STARTUP_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+    return os.getpid()
+
+
+def start_render_pool(workers: int):
+    """
+    创建渲染进程池并立即 fork 出全部工作进程（在 main.py 启动阶段调用）
+    fork 必须发生在调度器、数据库线程池、pyrogram / Web 服务的线程启动之前，
+    否则子进程可能继承被其他线程持有的锁（日志、malloc）而死锁
+
+    Python 3.10 的进程池在没有空闲进程时每次提交只 fork 一个，这里提交 workers 个在屏障上会合的任务：
+    已启动的进程都阻塞在屏障上、不算空闲，每次提交都会 fork 新进程，直到 workers 个全部启动；
+    进程数达到上限后不再 fork（3.11 起首次提交即一次性创建全部进程，结果相同）
+    """
+    global _pool
+    if _pool is not None:
+        return
+    workers = max(1, workers)
+    ctx = multiprocessing.get_context('fork')
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                initializer=_init_worker, initargs=(ctx.Barrier(workers),))
+    pids = {future.result() for future in [_pool.submit(_rendezvous) for _ in range(workers)]}
+    if len(pids) < workers:
+        LOGGER.warning(f"【ranks_draw】渲染进程启动 {len(pids)}/{workers} 个，其余进程可能在运行中 fork")
+
+
+async def run_render(func, *args):
+    """
+    在渲染进程池中执行 func(*args)
+    进程池未启动或已损坏时改在线程中渲染（不在运行中的多线程进程里重新 fork）
+    """
+    global _pool
+    if _pool is not None:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_pool, func, *args)
+        except BrokenProcessPool:
+            LOGGER.warning("【ranks_draw】渲染进程池已损坏，之后改在线程中渲染")
+            _pool = None
+    return await asyncio.to_thread(func, *args)
@@ -6,3 +6,10 @@ from .check_restart import check_restart
 from .ranks_task import week_ranks, day_ranks
 from .sync_favorites import sync_favorites
 from .sync_mp_download import sync_download_tasks
+from .sync_playback import sync_playback_activity
+from .sync_user_directory import refresh_user_directories
+from .sync_group_members import reconcile_group_members
+from .poll_sessions import poll_sessions
+from .stream_monitor import check_concurrent_streams
+# 跨服务器并发限制订阅会话快照，导入即注册（与 stream_monitor 一样）
+from bot.func_helper.stream_limiter import stream_limiter
@@ -1,233 +1,170 @@
 """
 定时检测账户有无过期（多服务器版本）
+流水线：
+1. 一次查询选出所有到期的 b / c 级用户并分类（续期 / 禁用 / 解封 / 删除）
+2. 所有 Emby 操作合并成一次 bulk_apply，按服务器并发、服务器内限流
+3. 数据库状态变更在一个事务中批量写入
+4. 通知交给出站队列（群发通道）限速发送
 """
 from datetime import timedelta, datetime
 
-from pyrogram.errors import FloodWait
 from sqlalchemy import and_
-from asyncio import sleep
-from bot import bot, group, LOGGER, _open, config
-from bot.func_helper.emby_utils import get_user_emby_service, get_user_emby_services
+from bot import group, LOGGER, _open, config
+from bot.func_helper.emby import BulkJob
 from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.outbox import outbox
 from bot.func_helper.utils import tem_deluser
-from bot.sql_helper.sql_emby import Emby, get_all_emby, sql_update_emby
-from bot.sql_helper.sql_emby2 import get_all_emby2, Emby2, sql_update_emby2
-from bot.sql_helper.sql_server_bindings import delete_user_bindings
+from bot.sql_helper.sql_emby import Emby, get_all_emby, sql_batch_update_emby
+from bot.sql_helper.sql_emby2 import get_all_emby2, Emby2, sql_update_emby2s
+from bot.sql_helper.sql_server_bindings import get_bindings_for_users
 
 
 async def check_expired():
     # 询问 到期时间的用户，判断有无积分，有则续期，无就禁用
-    rst = get_all_emby(and_(Emby.ex < datetime.now(), Emby.lv == 'b'))
+    now = datetime.now()
+    rst = await get_all_emby.aio(and_(Emby.ex < now, Emby.lv.in_(['b', 'c'])))
     if rst is None:
-        return LOGGER.info('【到期检测】- 等级 b 无到期用户，跳过')
-    ext = (datetime.now() + timedelta(days=30))
+        LOGGER.info('【到期检测】- 无到期用户，跳过')
+    else:
+        await _check_emby(rst, now)
+    await _check_emby2(now)
+
+
+def _renew_cost(r):
+    """自动续期需要扣除的字段，积分与币都不足时返回 None"""
+    if r.us >= 30:
+        return {'us': r.us - 30}
+    if _open.exchange and r.iv >= _open.exchange_cost:
+        return {'iv': r.iv - _open.exchange_cost}
+    return None
+
+
+async def _check_emby(rst, now: datetime):
+    ext = now + timedelta(days=30)
+    renew, disable, unfreeze, delete = [], [], [], []
     for r in rst:
-        if r.us >= 30:
-            b = r.us - 30
-            if sql_update_emby(Emby.tg == r.tg, ex=ext, us=b):
-                text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n' \
-                       f'在当前时间自动续期30天\n' \
-                       f'📅实时到期：{ext.strftime("%Y-%m-%d %H:%M:%S")}'
-                LOGGER.info(text)
+        cost = _renew_cost(r)
+        if r.lv == 'b':
+            if cost:
+                renew.append((r, cost))
             else:
-                text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n' \
-                       f'自动续期失败，请联系闺蜜（管理）'
-                LOGGER.error(text)
-            try:
-                await bot.send_message(r.tg, text)
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                await bot.send_message(r.tg, text)
-            except Exception as e:
-                LOGGER.error(e)
-
-        elif _open.exchange and r.iv >= _open.exchange_cost:
-            b = r.iv - _open.exchange_cost
-            if sql_update_emby(Emby.tg == r.tg, ex=ext, iv=b):
-                text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n' \
-                       f'在当前时间自动续期30天\n' \
-                       f'📅实时到期: {ext.strftime("%Y-%m-%d %H:%M:%S")}'
-                LOGGER.info(text)
-            else:
-                text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n续期失败，请联系闺蜜（管理）'
-                LOGGER.error(text)
-            try:
-                await bot.send_message(r.tg, text)
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                await bot.send_message(r.tg, text)
-            except Exception as e:
-                LOGGER.error(e)
+                disable.append(r)
+        elif cost:
+            unfreeze.append((r, cost))
+        elif now >= r.ex + timedelta(days=config.freeze_days):
+            delete.append(r)
+
+    # ---- Emby 操作：禁用 / 解封 / 删除合并为一次批量任务 ----
+    bindings = await get_bindings_for_users.aio([u.tg for u in disable + delete] + [c.tg for c, _ in unfreeze])
+    jobs = _binding_jobs(disable, bindings, 'disable', 'emby_change_policy', disable=True)
+    jobs += _binding_jobs([c for c, _ in unfreeze], bindings, 'unfreeze', 'emby_change_policy', disable=False)
+    jobs += _binding_jobs(delete, bindings, 'delete', 'emby_del')
+    result = await emby_manager.bulk_apply(jobs)
+    for job, error in result.failed:
+        LOGGER.warning(f"【到期检测】{job.tag[0]} 失败: server={job.server_id} embyid={job.emby_id} err={error}")
+    bound = {job.tag for job in jobs}
+    done = {job.tag for job in result.succeeded}
+
+    # ---- 数据库：一个事务写入全部状态变更 ----
+    mappings = [{'tg': r.tg, 'ex': ext, **cost} for r, cost in renew]
+    mappings += [{'tg': r.tg, 'lv': 'c'} for r in disable if ('disable', r.tg) in done]
+    mappings += [{'tg': c.tg, 'lv': 'b', 'ex': ext, **cost} for c, cost in unfreeze if ('unfreeze', c.tg) in done]
+    deleted = [c for c in delete if ('delete', c.tg) in done]
+    mappings += [{'tg': c.tg, 'embyid': None, 'name': None, 'pwd': None, 'pwd2': None, 'lv': 'd', 'cr': None,
+                  'ex': None} for c in deleted]
+    db_ok = await sql_batch_update_emby.aio(mappings, unbind=[c.tg for c in deleted]) if mappings else True
+    for _ in deleted:
+        tem_deluser()
 
+    # ---- 通知 ----
+    for r, _ in renew:
+        if db_ok:
+            text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n' \
+                   f'在当前时间自动续期30天\n' \
+                   f'📅实时到期：{ext.strftime("%Y-%m-%d %H:%M:%S")}'
+            LOGGER.info(text)
         else:
-            # 对所有绑定服务器禁用
-            services = get_user_emby_services(r.tg)
-            if not services:
-                text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) 无法连接到服务器'
-                LOGGER.error(text)
-            else:
-                success = False
-                for svc, server_cfg, bind_eid in services:
-                    try:
-                        if await svc.emby_change_policy(emby_id=bind_eid, disable=True):
-                            success = True
-                        else:
-                            LOGGER.warning(f"到期禁用失败: server={server_cfg.id} embyid={bind_eid}")
-                    except Exception as e:
-                        LOGGER.warning(f"到期禁用异常: server={server_cfg.id} embyid={bind_eid} err={e}")
-                if success:
-                    dead_day = r.ex + timedelta(days=config.freeze_days)
-                    if sql_update_emby(Emby.tg == r.tg, lv='c'):
-                        text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg})\n将为您封存至 {dead_day.strftime("%Y-%m-%d")}，请及时续期'
-                        LOGGER.info(text)
-                    else:
-                        text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) 已禁用，数据库写入失败'
-                        LOGGER.warning(text)
-                else:
-                    text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) embyapi操作失败'
-                    LOGGER.error(text)
-            try:
-                send = await bot.send_message(r.tg, text)
-                await send.forward(group[0])
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                send = await bot.send_message(r.tg, text)
-                await send.forward(group[0])
-            except Exception as e:
-                LOGGER.error(e)
-
-    rsc = get_all_emby(and_(Emby.ex < datetime.now(), Emby.lv == 'c'))
-    if rsc is None:
-        return LOGGER.info('【到期检测】- 等级 c 无到期用户，跳过')
-    for c in rsc:
-        if c.us >= 30:
-            c_us = c.us - 30
-            # 获取用户对应的服务实例
-            emby_service, server_config, user = get_user_emby_service(c.tg)
-            if not emby_service:
-                text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 无法连接到服务器'
-                LOGGER.error(text)
-            elif await emby_service.emby_change_policy(emby_id=c.embyid, disable=False):
-                if sql_update_emby(Emby.tg == c.tg, lv='b', ex=ext, us=c_us):
-                    text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg})\n' \
-                           f'在当前时间自动续期30天\n📅实时到期: {ext.strftime("%Y-%m-%d %H:%M:%S")}'
-                    LOGGER.info(text)
-                else:
-                    text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 数据库写入失败，请联系管理'
-                    LOGGER.warning(text)
-            else:
-                text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) embyapi操作失败'
-                LOGGER.error(text)
-            try:
-                await bot.send_message(c.tg, text)
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                await bot.send_message(c.tg, text)
-            except Exception as e:
-                LOGGER.error(e)
-
-        elif _open.exchange and c.iv >= _open.exchange_cost:
-            c_iv = c.iv - _open.exchange_cost
-            # 对所有绑定服务器解封
-            services = get_user_emby_services(c.tg)
-            if not services:
-                text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 无法连接到服务器'
-                LOGGER.error(text)
-            else:
-                success = False
-                for svc, server_cfg, bind_eid in services:
-                    try:
-                        if await svc.emby_change_policy(emby_id=bind_eid, disable=False):
-                            success = True
-                        else:
-                            LOGGER.warning(f"解封失败: server={server_cfg.id} embyid={bind_eid}")
-                    except Exception as e:
-                        LOGGER.warning(f"解封异常: server={server_cfg.id} embyid={bind_eid} err={e}")
-                if success:
-                    if sql_update_emby(Emby.tg == c.tg, lv='b', ex=ext, iv=c_iv):
-                        text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg})\n在当前时间自动续期30天\n📅实时到期：{ext.strftime("%Y-%m-%d %H:%M:%S")}'
-                        LOGGER.info(text)
-                    else:
-                        text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 已禁用，数据库写入失败，请联系管理'
-                        LOGGER.warning(text)
-                else:
-                    text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) embyapi操作失败，请联系管理'
-                    LOGGER.error(text)
-            try:
-                await bot.send_message(c.tg, text)
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                await bot.send_message(c.tg, text)
-            except Exception as e:
-                LOGGER.error(e)
+            text = f'【到期检测】\n#id{r.tg} 续期账户 [{r.name}](tg://user?id={r.tg})\n' \
+                   f'自动续期失败，请联系闺蜜（管理）'
+            LOGGER.error(text)
+        outbox.put(r.tg, text)
 
+    for r in disable:
+        if ('disable', r.tg) not in bound:
+            text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) 无法连接到服务器'
+            LOGGER.error(text)
+        elif ('disable', r.tg) not in done:
+            text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) embyapi操作失败'
+            LOGGER.error(text)
+        elif db_ok:
+            dead_day = r.ex + timedelta(days=config.freeze_days)
+            text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg})\n将为您封存至 {dead_day.strftime("%Y-%m-%d")}，请及时续期'
+            LOGGER.info(text)
         else:
-            delete_day = c.ex + timedelta(days=config.freeze_days)
-            if datetime.now() < delete_day:
-                continue
-            # 对所有绑定服务器执行删除
-            services = get_user_emby_services(c.tg)
-            if not services:
-                text = f'【到期检测】\n#id{c.tg} 删除账户 [{c.name}](tg://user?id={c.tg}) 无法连接到服务器'
-                LOGGER.error(text)
-            else:
-                success = False
-                for svc, server_cfg, bind_eid in services:
-                    try:
-                        if await svc.emby_del(emby_id=bind_eid):
-                            success = True
-                        else:
-                            LOGGER.warning(f"删除失败: server={server_cfg.id} embyid={bind_eid}")
-                    except Exception as e:
-                        LOGGER.warning(f"删除异常: server={server_cfg.id} embyid={bind_eid} err={e}")
-                if success:
-                    sql_update_emby(Emby.tg == c.tg, embyid=None, name=None, pwd=None, pwd2=None, lv='d', cr=None, ex=None)
-                    delete_user_bindings(c.tg)  # 同时删除绑定记录
-                    tem_deluser()
-                    text = f'【到期检测】\n#id{c.tg} 删除账户 [{c.name}](tg://user?id={c.tg})\n已到期 {config.freeze_days} 天，执行清除任务。期待下次与你相遇'
-                    LOGGER.info(text)
-                else:
-                    text = f'【到期检测】\n#id{c.tg} #删除账户 [{c.name}](tg://user?id={c.tg})\n到期删除失败，请检查以免无法进行后续使用'
-                    LOGGER.warning(text)
-            try:
-                send = await bot.send_message(c.tg, text)
-                await send.forward(group[0])
-            except FloodWait as f:
-                LOGGER.warning(str(f))
-                await sleep(f.value * 1.2)
-                send = await bot.send_message(c.tg, text)
-                await send.forward(group[0])
-            except Exception as e:
-                LOGGER.error(e)
-
-    rseired = get_all_emby2(and_(Emby2.expired == 0, Emby2.ex < datetime.now()))
+            text = f'【到期检测】\n#id{r.tg} 到期禁用 [{r.name}](tg://user?id={r.tg}) 已禁用，数据库写入失败'
+            LOGGER.warning(text)
+        outbox.put(r.tg, text, forward_to=group[0])
+
+    for c, _ in unfreeze:
+        if ('unfreeze', c.tg) not in bound:
+            text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 无法连接到服务器'
+            LOGGER.error(text)
+        elif ('unfreeze', c.tg) not in done:
+            text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) embyapi操作失败，请联系管理'
+            LOGGER.error(text)
+        elif db_ok:
+            text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg})\n' \
+                   f'在当前时间自动续期30天\n📅实时到期: {ext.strftime("%Y-%m-%d %H:%M:%S")}'
+            LOGGER.info(text)
+        else:
+            text = f'【到期检测】\n#id{c.tg} 解封账户 [{c.name}](tg://user?id={c.tg}) 数据库写入失败，请联系管理'
+            LOGGER.warning(text)
+        outbox.put(c.tg, text)
+
+    for c in delete:
+        if ('delete', c.tg) not in bound:
+            text = f'【到期检测】\n#id{c.tg} 删除账户 [{c.name}](tg://user?id={c.tg}) 无法连接到服务器'
+            LOGGER.error(text)
+        elif ('delete', c.tg) in done:
+            text = f'【到期检测】\n#id{c.tg} 删除账户 [{c.name}](tg://user?id={c.tg})\n已到期 {config.freeze_days} 天，执行清除任务。期待下次与你相遇'
+            LOGGER.info(text)
+        else:
+            text = f'【到期检测】\n#id{c.tg} #删除账户 [{c.name}](tg://user?id={c.tg})\n到期删除失败，请检查以免无法进行后续使用'
+            LOGGER.warning(text)
+        outbox.put(c.tg, text, forward_to=group[0])
+
+
+async def _check_emby2(now: datetime):
+    rseired = await get_all_emby2.aio(and_(Emby2.expired == 0, Emby2.ex < now))
     if rseired is None:
         return LOGGER.info(f'【封禁检测】- emby2 无数据，跳过')
-    for e in rseired:
-        # 获取 emby2 用户对应的服务器实例
-        server_id = e.server_id if hasattr(e, 'server_id') else 'main'
-        emby_service = emby_manager.get_server(server_id)
-        if not emby_service:
-            text = f'【封禁检测】- 到期封印非TG账户：`{e.name}` 无法连接到服务器 {server_id}'
-            LOGGER.error(text)
-        elif await emby_service.emby_change_policy(emby_id=e.embyid, disable=True):
-            if sql_update_emby2(Emby2.embyid == e.embyid, expired=1):
-                text = f"【封禁检测】- 到期封印非TG账户 [{e.name}](google.com?q={e.embyid}) Done！"
-                LOGGER.info(text)
-            else:
-                text = f'【封禁检测】- 到期封印非TG账户：`{e.name}` 数据库更改失败'
+    jobs = [BulkJob(e.embyid, 'emby_change_policy', server_id=e.server_id if hasattr(e, 'server_id') else 'main',
+                    tag=e, disable=True) for e in rseired]
+    result = await emby_manager.bulk_apply(jobs)
+    db_ok = await sql_update_emby2s.aio([job.tag.embyid for job in result.succeeded], expired=1)
+    for job in result.succeeded:
+        e = job.tag
+        if db_ok:
+            text = f"【封禁检测】- 到期封印非TG账户 [{e.name}](google.com?q={e.embyid}) Done！"
+            LOGGER.info(text)
         else:
-            text = f'【封禁检测】- 到期封印非TG账户：`{e.name}` embyapi操作失败，请手动处理'
-        try:
-            await bot.send_message(group[0], text)
-        except FloodWait as f:
-            LOGGER.warning(str(f))
-            await sleep(f.value * 1.2)
-            await bot.send_message(group[0], text)
-        except Exception as exc:
-            LOGGER.error(exc)
+            text = f'【封禁检测】- 到期封印非TG账户：`{e.name}` 数据库更改失败'
+        outbox.put(group[0], text)
+    for job, error in result.failed:
+        text = f'【封禁检测】- 到期封印非TG账户：`{job.tag.name}` embyapi操作失败，请手动处理（{error}）'
+        LOGGER.error(text)
+        outbox.put(group[0], text)
+
+
+def _binding_jobs(users, bindings, action: str, method: str, **kwargs):
+    """
+    为一批用户的所有绑定服务器生成批量任务，tag 为 (action, tg)
+    未加载的服务器不生成任务，与 get_user_emby_services 一致
+    """
+    jobs = []
+    for u in users:
+        for binding in bindings.get(u.tg, []):
+            if emby_manager.get_server(binding.server_id):
+                jobs.append(BulkJob(binding.embyid, method, server_id=binding.server_id, tag=(action, u.tg),
+                                    **kwargs))
+    return jobs
@@ -8,6 +8,14 @@ from typing import Dict, List
 
 from bot import bot, owner, group, config, LOGGER
 from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.outbox import outbox
+from bot.func_helper.stream_limiter import stream_limiter
+from bot.sql_helper.sql_emby import emby_cache
+from bot.web.api.webhook.client_filter import client_filter_stats_text
+from bot.web.api.webhook.ingest import webhook_queue
+
+
+_BREAKER_TEXT = {'closed': '正常', 'open': '已熔断', 'half_open': '探测中'}
 
 
 async def health_check_task():
@@ -42,7 +50,7 @@ async def check_all_servers() -> Dict[str, dict]:
     检查所有服务器状态
 
     Returns:
-        字典，格式: {server_id: {'healthy': bool, 'latency': float, 'error': str}}
+        字典，格式: {server_id: {'healthy': bool, 'latency': float, 'error': str, 'guard': dict}}
     """
     results = {}
     servers = config.get_enabled_servers()
@@ -92,6 +100,9 @@ async def check_all_servers() -> Dict[str, dict]:
             }
             LOGGER.error(f"【健康检查】{server_config.name} ❌ 异常: {e}")
 
+        # 附带准入控制状态（熔断器、限速、请求合并计数）
+        results[server_id]['guard'] = emby_service.guard_status()
+
     return results
 
 
@@ -155,8 +166,26 @@ async def get_server_status_text() -> str:
         text += f"   • ID: `{server_id}`\n"
         text += f"   • 状态: {status_text}\n"
         text += f"   • Emby用户: {user_count}\n"
+        server = emby_manager.get_server(server_id)
+        if server and server.sessions.age() is not None:
+            text += f"   • 正在播放: {server.sessions.playing_count} 路 / {server.sessions.user_count} 人" \
+                    f"（{server.sessions.age():.0f}s 前）\n"
+        guard = status.get('guard')
+        if guard:
+            text += f"   • 熔断: {_BREAKER_TEXT.get(guard['breaker'], guard['breaker'])}"
+            if guard['breaker'] == 'open':
+                text += f"（{guard['retry_after']:.0f}s 后探测）"
+            text += f" | 限速: {guard['rate']:.1f} req/s | 合并请求: {guard['coalesced']}\n"
         text += f"   • 线路: {server_config.line}\n\n"
 
+    text += f"📮 消息队列: {outbox.metrics_text()}\n"
+    if config.api.status:
+        text += f"📥 Webhook队列: {webhook_queue.metrics_text()}\n"
+        text += f"🛡 客户端拦截: {client_filter_stats_text()}\n"
+    if config.stream_limit.status:
+        text += f"🎞 并发限制: {stream_limiter.stats_text()}\n"
+    stats = emby_cache.stats
+    text += f"🗃 账户缓存: 命中 {stats['hit']} | 未命中 {stats['miss']} | 失效 {stats['invalidated']}\n"
     text += f"⏰ 检查时间: {datetime.now().strftime('%H:%M:%S')}"
 
     return text
@@ -0,0 +1,15 @@
+from bot import LOGGER, config
+from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.scheduler import scheduler
+
+
+async def poll_sessions():
+    """并发拉取各服务器的 /Sessions 快照，更新会话表并通知订阅者"""
+    result = await emby_manager.gather_servers(lambda server_id, server: server.sessions.refresh())
+    for server_id, error in result.errors.items():
+        LOGGER.error(f"【会话表】{server_id} 拉取出错: {error}")
+
+
+# 会话快照开启，或并发监控 / 并发限制需要快照时，添加定时任务
+if config.session_poll.status or config.stream_monitor.enabled or config.stream_limit.status:
+    scheduler.add_job(poll_sessions, 'interval', seconds=config.session_poll.interval_seconds, id='poll_sessions')
@@ -1,6 +1,8 @@
 """
 定时推送日榜和周榜
 """
+import asyncio
+
 from pyrogram import enums
 from datetime import date
 
@@ -8,6 +10,7 @@ from bot.func_helper.utils import convert_s
 from bot.func_helper.emby_utils import get_user_emby_service
 from bot.func_helper.emby_manager import emby_manager
 from bot.ranks_helper import ranks_draw
+from bot.ranks_helper.merge import merge_reports
 from bot import bot, group, ranks, LOGGER, schedall, save_config
 from bot.func_helper.utils import split_long_message
 
@@ -59,30 +62,48 @@ async def send_multi_message(chat_id, photo_path, caption, parse_mode, pin_first
     
     return sent_messages
 
+# 榜单展示条数；每个服务器多取一些候选，避免在各服务器都排在前列之外、合计却进入前列的条目被漏掉
+RANK_SIZE = 10
+SERVER_REPORT_LIMIT = 50
+
+
+async def fetch_reports(days: int, label: str):
+    """
+    多服务器适配：并发从所有服务器获取电影与剧集播放数据，按名称合并后取总时长前 RANK_SIZE 名
+    单个服务器变慢或失败不影响其他服务器
+    :return: (movies, tvs)
+    """
+    limit = SERVER_REPORT_LIMIT if emby_manager.get_server_count() > 1 else RANK_SIZE
+
+    async def _fetch(server_id, emby_service):
+        reports = await asyncio.gather(emby_service.get_emby_report(types='Movie', days=days, limit=limit),
+                                       emby_service.get_emby_report(types='Episode', days=days, limit=limit),
+                                       return_exceptions=True)
+        data = []
+        for kind, report in zip(('电影', '剧集'), reports):
+            if isinstance(report, Exception):
+                LOGGER.warning(f"从服务器 {server_id} 获取{kind}{label}失败: {report}")
+                data.append([])
+            else:
+                success, items = report
+                data.append(items if success and items else [])
+        return data
+
+    result = await emby_manager.gather_servers(_fetch)
+    for server_id, error in result.errors.items():
+        LOGGER.warning(f"从服务器 {server_id} 获取{label}失败: {error}")
+    reports = result.values()
+    movies = merge_reports((server_movies for server_movies, _ in reports), k=RANK_SIZE)
+    tvs = merge_reports((server_tvs for _, server_tvs in reports), k=RANK_SIZE)
+    return movies, tvs
+
 
 async def day_ranks(pin_mode=True):
     draw = ranks_draw.RanksDraw(ranks.logo, backdrop=ranks.backdrop)
     LOGGER.info("【ranks_task】定时任务 正在推送日榜")
 
-    # 多服务器适配：聚合所有服务器的播放数据
-    all_servers = emby_manager.get_all_servers()
-    movies = []
-    tvs = []
-
-    for server_id, emby_service in all_servers.items():
-        try:
-            success, server_movies = await emby_service.get_emby_report(types='Movie', days=1)
-            if success and server_movies:
-                movies.extend(server_movies)
-        except Exception as e:
-            LOGGER.warning(f"从服务器 {server_id} 获取电影日榜失败: {e}")
-
-        try:
-            success, server_tvs = await emby_service.get_emby_report(types='Episode', days=1)
-            if success and server_tvs:
-                tvs.extend(server_tvs)
-        except Exception as e:
-            LOGGER.warning(f"从服务器 {server_id} 获取剧集日榜失败: {e}")
+    # 多服务器适配：并发聚合所有服务器的播放数据
+    movies, tvs = await fetch_reports(days=1, label='日榜')
 
     if not movies and not tvs:
         LOGGER.error('【ranks_task】推送日榜失败，所有服务器均无数据!')
@@ -134,25 +155,8 @@ async def week_ranks(pin_mode=True):
     draw = ranks_draw.RanksDraw(ranks.logo, weekly=True, backdrop=ranks.backdrop)
     LOGGER.info("【ranks_task】定时任务 正在推送周榜")
 
-    # 多服务器适配：聚合所有服务器的播放数据
-    all_servers = emby_manager.get_all_servers()
-    movies = []
-    tvs = []
-
-    for server_id, emby_service in all_servers.items():
-        try:
-            success, server_movies = await emby_service.get_emby_report(types='Movie', days=7)
-            if success and server_movies:
-                movies.extend(server_movies)
-        except Exception as e:
-            LOGGER.warning(f"从服务器 {server_id} 获取电影周榜失败: {e}")
-
-        try:
-            success, server_tvs = await emby_service.get_emby_report(types='Episode', days=7)
-            if success and server_tvs:
-                tvs.extend(server_tvs)
-        except Exception as e:
-            LOGGER.warning(f"从服务器 {server_id} 获取剧集周榜失败: {e}")
+    # 多服务器适配：并发聚合所有服务器的播放数据
+    movies, tvs = await fetch_reports(days=7, label='周榜')
 
     if not movies and not tvs:
         LOGGER.error('【ranks_task】推送周榜失败，所有服务器均无数据!')
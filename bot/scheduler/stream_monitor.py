@@ -0,0 +1,101 @@
+"""
+并发播放监控 - 检测同一用户同时播放超过阈值的情况
+订阅会话表的快照变化，只检查本轮有新会话出现的用户，不单独请求 /Sessions
+同一用户的同一组超标会话只通知一次，会话组合变化（又开了一路）时再次通知
+与 stream_limit（跨服务器合计限制）不同时生效：两者都开启时只由 stream_limiter 处置与通知，本模块不订阅
+"""
+from typing import Dict, FrozenSet, List, Tuple
+
+from bot import group, LOGGER, config
+from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.outbox import outbox
+from bot.func_helper.session_table import ActiveSession, SessionTable, subscribe
+from bot.sql_helper.sql_emby import sql_get_emby_by_embyid
+
+# (server_id, user_id) -> 已通知过的超标会话组合
+_notified: Dict[Tuple[str, str], FrozenSet[str]] = {}
+
+
+async def check_concurrent_streams(table: SessionTable, started: List[ActiveSession], ended: List[ActiveSession]):
+    """会话表订阅者：检查本轮有新会话的用户是否超出并发上限"""
+    max_streams = config.stream_monitor.max_streams
+    server_id = table.server_id
+
+    # 已回落到上限以内的用户，清除通知记录
+    for key in [k for k in _notified if k[0] == server_id and len(table.of_user(k[1])) <= max_streams]:
+        del _notified[key]
+
+    for user_id in {s.user_id for s in started}:
+        streams = table.of_user(user_id)
+        if len(streams) <= max_streams:
+            continue
+        ids = frozenset(s.id for s in streams)
+        if _notified.get((server_id, user_id)) == ids:
+            continue
+        _notified[(server_id, user_id)] = ids
+        await handle_violation(server_id, user_id, streams, max_streams)
+
+
+async def handle_violation(server_id: str, user_id: str, streams: List[ActiveSession], max_streams: int):
+    """
+    处理超标用户：通知管理群，按配置终止最新开始的多余会话、私信用户
+
+    Args:
+        server_id: 服务器 ID
+        user_id: Emby 用户 ID
+        streams: 该用户的所有播放会话，按开始时间排序
+        max_streams: 最大允许流数
+    """
+    stream_count = len(streams)
+    emby_name = streams[0].user_name
+    server_config = emby_manager.get_config(server_id)
+    server_name = server_config.name if server_config else server_id
+
+    user = await sql_get_emby_by_embyid.aio(user_id)
+    tg_id = user.tg if user else None
+    tg_display = f"`{tg_id}`" if tg_id else "未关联"
+
+    devices_text = "\n".join(f"  {i}. {s.device_name} ({s.client_name})\n     └─ {s.now_playing}"
+                             for i, s in enumerate(streams, 1))
+    admin_text = (
+        f"⚠️ **并发播放超标**\n"
+        f"━━━━━━━━━━━━━━━━\n"
+        f"👤 用户: `{emby_name}`\n"
+        f"🆔 TG ID: {tg_display}\n"
+        f"🖥️ 服务器: {server_name}\n"
+        f"📺 当前播放: **{stream_count}** 路（上限 {max_streams}）\n"
+        f"━━━━━━━━━━━━━━━━\n"
+        f"📱 设备详情:\n{devices_text}"
+    )
+
+    # 保留最早的 max_streams 个会话，终止其余的
+    terminated = []
+    if config.stream_monitor.auto_terminate:
+        for session in streams[max_streams:]:
+            if await emby_manager.terminate_session(session.id, "超出并发播放限制", server_id=server_id,
+                                                    emby_id=user_id):
+                terminated.append(session.device_name)
+        if terminated:
+            admin_text += f"\n\n🔴 已自动终止: {', '.join(terminated)}"
+
+    LOGGER.warning(f"【并发监控】超标用户: {emby_name} (TG:{tg_id}) - {stream_count}路 @ {server_name}")
+    outbox.put(group[0], admin_text)
+
+    if config.stream_monitor.notify_user and tg_id:
+        user_text = (
+            f"⚠️ **播放提醒**\n\n"
+            f"检测到您的账户 `{emby_name}` 同时播放 **{stream_count}** 路视频，"
+            f"超出了允许的 {max_streams} 路限制。\n\n"
+            f"请关闭多余的播放设备，否则可能影响您的账户使用。"
+        )
+        if terminated:
+            user_text += f"\n\n已自动断开: {', '.join(terminated)}"
+        outbox.put(tg_id, user_text)
+
+
+if config.stream_monitor.enabled and config.stream_limit.status:
+    LOGGER.warning("【并发监控】stream_limit 已开启，并发处置与通知由跨服务器并发限制负责，stream_monitor 不生效")
+elif config.stream_monitor.enabled:
+    subscribe(check_concurrent_streams)
+    LOGGER.info(f"【并发监控】已启用，上限 {config.stream_monitor.max_streams} 路，"
+                f"随会话快照每 {config.session_poll.interval_seconds} 秒检查一次")
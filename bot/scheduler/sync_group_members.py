@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from bot import LOGGER, config
+from bot.func_helper.group_members import group_members
+from bot.func_helper.scheduler import scheduler
+
+
+async def reconcile_group_members():
+    """全量拉取授权群组成员，校正事件遗漏导致的索引偏差"""
+    try:
+        await group_members.reconcile()
+    except Exception as e:
+        LOGGER.error(f"【群组成员】对账出错: {str(e)}")
+
+
+# 启动后尽快完成首次拉取，之后按间隔对账；关闭时过滤器始终回退 API 查询
+if config.group_members.status:
+    scheduler.add_job(reconcile_group_members, 'interval', minutes=config.group_members.interval_minutes,
+                      next_run_time=datetime.now() + timedelta(seconds=10), id='reconcile_group_members')
@@ -0,0 +1,21 @@
+from bot import LOGGER, config
+from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.playback_mirror import playback_mirror
+from bot.func_helper.scheduler import scheduler
+
+
+async def sync_playback_activity():
+    """增量同步各服务器的 PlaybackActivity 到本地镜像表"""
+    for server_id, server in emby_manager.get_all_servers().items():
+        try:
+            pulled = await playback_mirror.sync_server(server_id, server)
+            if pulled > 0:
+                LOGGER.info(f"【播放记录同步】{server_id} 新增/更新 {pulled} 条记录")
+        except Exception as e:
+            LOGGER.error(f"【播放记录同步】{server_id} 同步出错: {str(e)}")
+
+
+# 如果播放记录同步开启，添加定时任务
+if config.playback_sync.status:
+    scheduler.add_job(sync_playback_activity, 'interval',
+                      minutes=config.playback_sync.interval_minutes, id='sync_playback_activity')
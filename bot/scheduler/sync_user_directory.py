@@ -0,0 +1,18 @@
+from bot import LOGGER, config
+from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.scheduler import scheduler
+
+
+async def refresh_user_directories():
+    """增量刷新各服务器的用户目录"""
+    for server_id, server in emby_manager.get_all_servers().items():
+        try:
+            await server.directory.refresh()
+        except Exception as e:
+            LOGGER.error(f"【用户目录】{server_id} 刷新出错: {str(e)}")
+
+
+# 如果用户目录刷新开启，添加定时任务
+if config.user_directory.status:
+    scheduler.add_job(refresh_user_directories, 'interval',
+                      minutes=config.user_directory.interval_minutes, id='refresh_user_directories')
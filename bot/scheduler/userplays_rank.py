@@ -7,8 +7,10 @@ from bot.func_helper.emby_utils import get_user_emby_service
 from bot.func_helper.emby_manager import emby_manager
 from bot.func_helper.utils import convert_to_beijing_time, convert_s, get_users, tem_deluser, _async_ttl_cache
 from bot.sql_helper import Session
-from bot.sql_helper.sql_emby import sql_get_emby, sql_update_embys, Emby, sql_update_emby
+from bot.sql_helper.sql_emby import sql_get_emby, increment_ivs, Emby, sql_update_emby
 from bot.func_helper.fix_bottons import plays_list_button
+from bot.func_helper.outbox import outbox, Lane
+from bot.ranks_helper.merge import merge_watch_time
 
 
 class Uplaysinfo:
@@ -17,17 +19,13 @@ class Uplaysinfo:
     @classmethod
     async def users_playback_list(cls, days):
         async def _fetch():
-            # 多服务器适配：聚合所有服务器的播放列表
-            all_servers = emby_manager.get_all_servers()
-            play_list = []
-
-            for server_id, emby_service in all_servers.items():
-                try:
-                    server_play_list = await emby_service.emby_cust_commit(emby_id=None, days=days, method='sp')
-                    if server_play_list:
-                        play_list.extend(server_play_list)
-                except Exception as e:
-                    LOGGER.warning(f"从服务器 {server_id} 获取播放列表失败: {e}")
+            # 多服务器适配：并发聚合所有服务器的播放列表
+            result = await emby_manager.gather_servers(
+                lambda server_id, emby_service: emby_service.emby_cust_commit(emby_id=None, days=days, method='sp'))
+            for server_id, error in result.errors.items():
+                LOGGER.warning(f"从服务器 {server_id} 获取播放列表失败: {error}")
+            # 同名账户在各服务器的时长合并为一条，按总时长排序
+            play_list = merge_watch_time(result.values())
 
             if not play_list:
                 return None, 1, 1
@@ -94,20 +92,24 @@ class Uplaysinfo:
     async def user_plays_rank(days=7, uplays=True):
         a, n, ls = await Uplaysinfo.users_playback_list(days)
         if not a:
-            return await bot.send_photo(chat_id=group[0], photo=bot_photo,
-                                        caption=f'🍥 获取过去{days}天UserPlays失败了嘤嘤嘤 ~ 手动重试 ')
+            return await outbox.send_photo(group[0], bot_photo,
+                                           caption=f'🍥 获取过去{days}天UserPlays失败了嘤嘤嘤 ~ 手动重试 ')
         play_button = await plays_list_button(n, 1, days)
-        send = await bot.send_photo(chat_id=group[0], photo=bot_photo, caption=a[0], reply_markup=play_button)
+        send = await outbox.send_photo(group[0], bot_photo, caption=a[0], reply_markup=play_button)
         if uplays and _open.uplays:
-            if sql_update_embys(some_list=ls, method='iv'):
+            # 奖励按增量在数据库中累加，不使用缓存榜单里的旧余额覆盖
+            deltas = {}
+            for i in ls:
+                deltas[i[0]] = deltas.get(i[0], 0) + i[3]
+            if await increment_ivs.aio(deltas) is not None:
                 text = f'**自动将观看时长转换为{credits}**\n\n'
                 for i in ls:
                     text += f'[{i[2]}](tg://user?id={i[0]}) 获得了 {i[3]} {credits}奖励\n'
                 n = 4096
                 chunks = [text[i:i + n] for i in range(0, len(text), n)]
                 for c in chunks:
-                    await bot.send_message(chat_id=group[0],
-                                           text=c + f'\n⏱️ 当前时间 - {datetime.now().strftime("%Y-%m-%d")}')
+                    await outbox.send_message(group[0], c + f'\n⏱️ 当前时间 - {datetime.now().strftime("%Y-%m-%d")}',
+                                              lane=Lane.NORMAL)
                 LOGGER.info(f'【userplayrank】： ->成功 数据库执行批量操作{ls}')
             else:
                 await send.reply(f'**🎂！！！为用户增加{credits}出错啦** @工程师看看吧~ ')
@@ -117,84 +119,73 @@ class Uplaysinfo:
     async def check_low_activity():
         now = datetime.now(timezone(timedelta(hours=8)))
 
-        # 多服务器适配：聚合所有服务器的用户列表
-        all_servers = emby_manager.get_all_servers()
-        users = []
-        for server_id, emby_service in all_servers.items():
-            try:
-                success, server_users = await emby_service.users()
-                if success and server_users:
-                    # 为每个用户添加服务器信息
-                    for u in server_users:
-                        u['_server_id'] = server_id
-                        u['_emby_service'] = emby_service
-                    users.extend(server_users)
-            except Exception as e:
-                LOGGER.warning(f"从服务器 {server_id} 获取用户失败: {e}")
-
-        if not users:
-            return await bot.send_message(chat_id=group[0], text='⭕ 所有服务器均无法获取用户列表')
-
         from bot import config
         activity_check_days = config.activity_check_days
         msg = f'正在执行**{activity_check_days}天活跃检测**...\n'
-        for user in users:
-            # 数据库先找
-            e = sql_get_emby(tg=user["Name"])
-            if e is None:
-                continue
-
-            elif e.lv == 'c':
-                try:
-                    ac_date = convert_to_beijing_time(user["LastActivityDate"])
-                except KeyError:
-                    ac_date = "None"
-                finally:
-                    if ac_date == "None" or ac_date + timedelta(days=15) < now:
-                        # 从用户dict中获取对应的服务实例
-                        emby_service = user.get('_emby_service')
-                        if not emby_service:
-                            LOGGER.warning(f"无法定位服务器: {e.name}")
-                            continue
-
-                        if await emby_service.emby_del(emby_id=e.embyid):
-                            sql_update_emby(Emby.embyid == e.embyid, embyid=None, name=None, pwd=None, pwd2=None, lv='d',
-                                            cr=None, ex=None)
-                            tem_deluser()
-                            msg += f'**🔋活跃检测** - [{e.name}](tg://user?id={e.tg})\n#id{e.tg} 禁用后未解禁，已执行删除。\n\n'
-                            LOGGER.info(f"【活跃检测】- 删除账户 {user['Name']} #id{e.tg}")
+        user_count = 0
+
+        # 多服务器适配：各服务器并发分页遍历用户，不在内存中聚合完整用户列表
+        async def _check_server(server_id, emby_service):
+            user_count = 0
+            text = ''
+            # 遍历中删除用户会使分页错位，待删除的账户在本服务器遍历结束后再处理
+            pending_delete = []
+            try:
+                async for user in emby_service.iter_users():
+                    user_count += 1
+                    # 数据库先找
+                    e = sql_get_emby(tg=user["Name"])
+                    if e is None:
+                        continue
+
+                    elif e.lv == 'c':
+                        ac_date = convert_to_beijing_time(user["LastActivityDate"]) if user["LastActivityDate"] else "None"
+                        if ac_date == "None" or ac_date + timedelta(days=15) < now:
+                            pending_delete.append(e)
+                    elif e.lv == 'b':
+                        if user["LastActivityDate"]:
+                            ac_date = convert_to_beijing_time(user["LastActivityDate"])
+                            # print(e.name, ac_date, now)
+                            if ac_date + timedelta(days=activity_check_days) >= now:
+                                continue
+                            reason = f'{activity_check_days}天未活跃'
                         else:
-                            msg += f'**🔋活跃检测** - [{e.name}](tg://user?id={e.tg})\n#id{e.tg} 禁用后未解禁，执行删除失败。\n\n'
-                            LOGGER.info(f"【活跃检测】- 删除账户失败 {user['Name']} #id{e.tg}")
-            elif e.lv == 'b':
-                # 从用户dict中获取对应的服务实例
-                emby_service = user.get('_emby_service')
-                if not emby_service:
-                    LOGGER.warning(f"无法定位服务器: {e.name}")
-                    continue
-
-                try:
-                    ac_date = convert_to_beijing_time(user["LastActivityDate"])
-
-                    # print(e.name, ac_date, now)
-                    if ac_date + timedelta(days=activity_check_days) < now:
+                            reason = '注册后未活跃'
                         if await emby_service.emby_change_policy(emby_id=user["Id"], disable=True):
                             sql_update_emby(Emby.embyid == user["Id"], lv='c')
-                            msg += f"**🔋活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n#id{e.tg} {activity_check_days}天未活跃，禁用\n\n"
-                            LOGGER.info(f"【活跃检测】- 禁用账户 {user['Name']} #id{e.tg}：{activity_check_days}天未活跃")
+                            text += f"**🔋活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n#id{e.tg} {reason}，禁用\n\n"
+                            LOGGER.info(f"【活跃检测】- 禁用账户 {user['Name']} #id{e.tg}：{reason}")
                         else:
-                            msg += f"**🎂活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n{activity_check_days}天未活跃，禁用失败啦！检查emby连通性\n\n"
+                            text += f"**🎂活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n#id{e.tg} {reason}，禁用失败啦！检查emby连通性\n\n"
                             LOGGER.info(f"【活跃检测】- 禁用账户 {user['Name']} #id{e.tg}：禁用失败啦！检查emby连通性")
-                except KeyError:
-                    if await emby_service.emby_change_policy(emby_id=user["Id"], disable=True):
-                        sql_update_emby(Emby.embyid == user["Id"], lv='c')
-                        msg += f"**🔋活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n#id{e.tg} 注册后未活跃，禁用\n\n"
-                        LOGGER.info(f"【活跃检测】- 禁用账户 {user['Name']} #id{e.tg}：注册后未活跃禁用")
-                    else:
-                        msg += f"**🎂活跃检测** - [{user['Name']}](tg://user?id={e.tg})\n#id{e.tg} 注册后未活跃，禁用失败啦！检查emby连通性\n\n"
-                        LOGGER.info(f"【活跃检测】- 禁用账户 {user['Name']} #id{e.tg}：禁用失败啦！检查emby连通性")
+            except Exception as ex:
+                LOGGER.warning(f"从服务器 {server_id} 获取用户失败: {ex}")
+
+            for e in pending_delete:
+                if await emby_service.emby_del(emby_id=e.embyid):
+                    sql_update_emby(Emby.embyid == e.embyid, embyid=None, name=None, pwd=None, pwd2=None, lv='d',
+                                    cr=None, ex=None)
+                    tem_deluser()
+                    text += f'**🔋活跃检测** - [{e.name}](tg://user?id={e.tg})\n#id{e.tg} 禁用后未解禁，已执行删除。\n\n'
+                    LOGGER.info(f"【活跃检测】- 删除账户 {e.name} #id{e.tg}")
+                else:
+                    text += f'**🔋活跃检测** - [{e.name}](tg://user?id={e.tg})\n#id{e.tg} 禁用后未解禁，执行删除失败。\n\n'
+                    LOGGER.info(f"【活跃检测】- 删除账户失败 {e.name} #id{e.tg}")
+            return user_count, text
+
+        # 批量禁用 / 删除耗时与用户数相关，不设超时
+        result = await emby_manager.gather_servers(_check_server, timeout=0)
+        for server_id, error in result.errors.items():
+            LOGGER.warning(f"服务器 {server_id} 活跃检测失败: {error}")
+        for server_count, server_text in result.values():
+            user_count += server_count
+            msg += server_text
+
+        if not user_count:
+            return await bot.send_message(chat_id=group[0], text='⭕ 所有服务器均无法获取用户列表')
         msg += '**活跃检测结束**\n'
         n = 1000
         chunks = [msg[i:i + n] for i in range(0, len(msg), n)]
         for c in chunks:
-            await bot.send_message(chat_id=group[0], text=c + f'**{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}**')
+            await outbox.send_message(group[0], c + f'**{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}**',
+                                      lane=Lane.NORMAL)
@@ -102,6 +102,7 @@ class Open(BaseModel):
 class Ranks(BaseModel):
     logo: str = "EmbyBot"
     backdrop: bool = False
+    render_workers: int = 2  # 海报渲染进程数
 
 
 class Schedall(BaseModel):
@@ -163,6 +164,86 @@ class API(BaseModel):
 
     # 不再需要 __init__ 方法，使用 Field(default_factory) 设置默认值
 
+class PlaybackSync(BaseModel):
+    status: bool = True  # 是否将 PlaybackActivity 增量同步到本地表，排行/审计改读本地
+    interval_minutes: int = 5  # 同步间隔
+    batch_size: int = 5000  # 每次向 Emby 拉取的行数
+    lookback_minutes: int = 360  # 每轮从水位往前回看的分钟数（插件在播放结束后才写入记录）
+
+
+class UserDirectorySync(BaseModel):
+    status: bool = True  # 是否定时刷新各服务器的用户目录（按 Id / Name 索引的精简用户缓存）
+    interval_minutes: int = 10  # 刷新间隔，用户增删改的 Webhook 事件会即时更新
+
+
+class GroupMembersSync(BaseModel):
+    status: bool = True  # 是否维护授权群组成员索引（群组过滤器与显示名不再逐条调用 API）
+    interval_minutes: int = 30  # 全量对账间隔，进群/退群事件会即时更新
+
+
+class SessionPoll(BaseModel):
+    status: bool = True  # 是否定时拉取各服务器的 /Sessions 快照（在线人数、并发播放监控共用，每个间隔每个服务器只请求一次）
+    interval_seconds: int = 60  # 拉取间隔
+
+
+class StreamMonitor(BaseModel):
+    enabled: bool = False  # 是否启用单服务器并发播放监控（读取会话快照，不单独请求 API）；stream_limit 开启时不生效
+    max_streams: int = 2  # 单个用户允许同时播放的路数
+    auto_terminate: bool = False  # 超标时是否自动终止最新开始的多余会话
+    notify_user: bool = False  # 是否私信通知超标用户
+
+
+class StreamLimit(BaseModel):
+    status: bool = False  # 是否按 TG 用户限制所有绑定服务器合计的同时播放路数（播放 Webhook 驱动，会话快照定时校正）；开启后取代 stream_monitor
+    max_streams: int = 3  # 同一 TG 用户在所有服务器上合计允许的播放路数，超出时终止最新的一路
+    notify_user: bool = True  # 终止后是否私信通知用户
+    notify_admin: bool = True  # 终止后是否通知管理群
+
+
+class ImageCacheConfig(BaseModel):
+    status: bool = True  # 是否缓存海报/背景图到本地磁盘
+    path: str = "log/image_cache"  # 缓存目录（默认放在已挂载的 log 目录下）
+    max_mb: int = 256  # 缓存容量上限，超出按最近使用时间淘汰
+    revalidate_hours: int = 24  # 超过该时间的缓存用 ETag/Last-Modified 向 Emby 校验
+
+
+class BulkOps(BaseModel):
+    concurrency: int = 8  # 批量封禁/解封/删除时每个服务器的最大并发请求数
+    retries: int = 2  # 单个用户操作失败后的重试次数
+    retry_delay: float = 1.0  # 重试间隔（秒），按重试次数递增
+
+
+class DbPool(BaseModel):
+    workers: int = 16  # 数据库线程池大小，同时作为连接池 pool_size（数据库并发上限）
+
+
+class Outbox(BaseModel):
+    global_rate: float = 25  # 全局发送速率（条/秒），Telegram 上限约 30
+    private_rate: float = 1  # 单个私聊的发送速率（条/秒）
+    group_rate: float = 0.33  # 单个群组的发送速率（条/秒），Telegram 上限约 20 条/分钟
+
+
+class WebhookQueue(BaseModel):
+    max_queue: int = 1000  # 每类事件的队列上限，超出后进度事件丢弃，其他事件写入溢出文件
+    spill_path: str = "log/webhook_spill.jsonl"  # 溢出/退出时未处理事件的持久化文件（放在已挂载的 log 目录下）
+    client_filter_workers: int = 4  # 客户端拦截事件的并发处理数
+    media_workers: int = 2  # 媒体库更新事件的并发处理数
+    favorites_workers: int = 4  # 收藏事件的并发处理数
+    users_workers: int = 2  # 用户增删改事件的并发处理数
+
+
+class EmbyGuard(BaseModel):
+    rate: float = 20  # 每个服务器初始请求速率（次/秒），按延迟与错误率自动调整
+    min_rate: float = 2  # 速率下限
+    max_rate: float = 50  # 速率上限
+    burst: int = 20  # 令牌桶容量
+    latency_target_ms: int = 2000  # 超过该延迟视为服务器变慢，降低速率
+    failure_threshold: int = 5  # 连续失败多少次后熔断
+    cooldown_seconds: int = 30  # 熔断冷却时间，结束后放行一个探测请求
+    max_retries: int = 2  # 单次请求的最大尝试次数
+    fanout_timeout: int = 60  # 跨服务器聚合查询时单个服务器的最长等待时间（秒）
+
+
 class RedEnvelope(BaseModel):
     status: bool = True  # 是否开启红包
     allow_private: bool = True # 是否允许专属红包
@@ -232,6 +313,18 @@ class Config(BaseModel):
     auto_update: AutoUpdate = Field(default_factory=AutoUpdate)
     red_envelope: RedEnvelope = Field(default_factory=RedEnvelope)
     api: API = Field(default_factory=API)
+    playback_sync: PlaybackSync = Field(default_factory=PlaybackSync)
+    bulk_ops: BulkOps = Field(default_factory=BulkOps)
+    db_pool: DbPool = Field(default_factory=DbPool)
+    user_directory: UserDirectorySync = Field(default_factory=UserDirectorySync)
+    group_members: GroupMembersSync = Field(default_factory=GroupMembersSync)
+    session_poll: SessionPoll = Field(default_factory=SessionPoll)
+    stream_monitor: StreamMonitor = Field(default_factory=StreamMonitor)
+    stream_limit: StreamLimit = Field(default_factory=StreamLimit)
+    image_cache: ImageCacheConfig = Field(default_factory=ImageCacheConfig)
+    emby_guard: EmbyGuard = Field(default_factory=EmbyGuard)
+    outbox: Outbox = Field(default_factory=Outbox)
+    webhook_queue: WebhookQueue = Field(default_factory=WebhookQueue)
 
     @model_validator(mode='before')
     @classmethod
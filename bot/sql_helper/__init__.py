@@ -1,15 +1,19 @@
 """
 初始化数据库
 """
-from bot import db_host, db_user, db_pwd, db_name, db_port
+from bot import config, db_host, db_user, db_pwd, db_name, db_port
+from bot.sql_helper import aio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 
+# 线程池与连接池同样大小
+aio.configure(config.db_pool.workers)
+
 # 创建engine对象
 engine = create_engine(f"mysql+pymysql://{db_user}:{db_pwd}@{db_host}:{db_port}/{db_name}?utf8mb4", echo=False,
                        echo_pool=False,
-                       pool_size=16,
+                       pool_size=aio.DB_WORKERS,
                        pool_recycle=60 * 30,
                        )
 
@@ -0,0 +1,63 @@
+"""
+数据库异步访问层
+同步 helper 放到专用线程池中执行，协程中使用 `await helper.aio(...)` 不再阻塞事件循环
+原有同步调用方式保持不变，各模块可以逐步迁移
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+# 线程数即数据库并发上限，与 engine 的 pool_size 保持一致，避免线程等待连接；由 configure 按配置设置
+DB_WORKERS = 16
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def configure(workers: int):
+    """设置线程池大小（初始化 engine 时按 config.db_pool.workers 调用）"""
+    global DB_WORKERS, _executor
+    DB_WORKERS = max(1, int(workers))
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='sql')
+
+
+async def run_sync(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在数据库线程池中执行同步函数
+
+    Args:
+        func: 同步函数（通常是 sql_helper 中的 helper）
+        *args / **kwargs: 传给 func 的参数
+
+    Returns:
+        func 的返回值
+    """
+    if _executor is None:
+        configure(DB_WORKERS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def offload(func: F) -> F:
+    """
+    为同步 helper 挂上可 await 的 `.aio` 版本，函数本身不变
+
+    用法：
+        @offload
+        def sql_get_emby(tg): ...
+
+        emby = sql_get_emby(tg)            # 旧的同步调用
+        emby = await sql_get_emby.aio(tg)  # 协程中使用
+    """
+    @functools.wraps(func)
+    async def aio(*args, **kwargs):
+        return await run_sync(func, *args, **kwargs)
+
+    func.aio = aio
+    return func
@@ -0,0 +1,102 @@
+"""
+数据库行读穿缓存
+- 按主键保存列快照（LRU + TTL），其他唯一列为指向主键的二级索引
+- 命中时用快照新建瞬态对象，调用方修改属性不会污染缓存
+- 写操作提交后按主键失效；版本号防止并发读把失效前的旧数据写回缓存
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+
+class RowCache:
+    """
+    单表的读穿缓存，查询与失效在数据库线程池中并发调用，内部加锁
+    """
+
+    def __init__(self, snapshot: Callable[[Any], dict], restore: Callable[[dict], Any], key_field: str,
+                 index_fields: Sequence[str] = (), maxsize: int = 2048, ttl: float = 300):
+        """
+        Args:
+            snapshot: ORM 对象 -> 列字典
+            restore: 列字典 -> 新的 ORM 对象
+            key_field: 主键列名
+            index_fields: 作为二级索引的唯一列
+            maxsize: 最多缓存的行数
+            ttl: 缓存有效期（秒）
+        """
+        self.snapshot = snapshot
+        self.restore = restore
+        self.key_field = key_field
+        self.index_fields = tuple(index_fields)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows: "OrderedDict[Hashable, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._index: Dict[str, Dict[Any, Hashable]] = {field: {} for field in self.index_fields}
+        self._lock = threading.Lock()
+        self._version = 0
+        self.stats = {'hit': 0, 'miss': 0, 'invalidated': 0}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, field: str, value) -> Tuple[bool, Optional[Any]]:
+        """
+        :param field: 主键列或二级索引列
+        :return: (是否命中, 对象或 None)；主键查询会缓存“不存在”的结果
+        """
+        with self._lock:
+            key = value if field == self.key_field else self._index[field].get(value)
+            entry = self._rows.get(key) if key is not None else None
+            if entry is None or entry[0] < time.monotonic() or (field != self.key_field and entry[1] is None):
+                self.stats['miss'] += 1
+                return False, None
+            self._rows.move_to_end(key)
+            self.stats['hit'] += 1
+            return True, self.restore(entry[1]) if entry[1] else None
+
+    def put(self, version: int, key, row: Optional[Any]):
+        """写入查询结果；查询期间发生过失效则放弃"""
+        if key is None:
+            return
+        snapshot = self.snapshot(row) if row else None
+        with self._lock:
+            if version != self._version:
+                return
+            self._drop(key)
+            self._rows[key] = (time.monotonic() + self.ttl, snapshot)
+            if snapshot:
+                for field in self.index_fields:
+                    if snapshot[field]:
+                        self._index[field][snapshot[field]] = key
+            while len(self._rows) > self.maxsize:
+                self._drop(next(iter(self._rows)))
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                if self._drop(key):
+                    self.stats['invalidated'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self.stats['invalidated'] += len(self._rows)
+            self._rows.clear()
+            for index in self._index.values():
+                index.clear()
+
+    def _drop(self, key) -> bool:
+        entry = self._rows.pop(key, None)
+        if entry is None:
+            return False
+        if entry[1]:
+            for field in self.index_fields:
+                if self._index[field].get(entry[1][field]) == key:
+                    del self._index[field][entry[1][field]]
+        return True
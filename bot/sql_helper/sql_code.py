@@ -1,6 +1,7 @@
 import math
 
 from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
 from sqlalchemy import (
     Column,
     BigInteger,
@@ -34,6 +35,7 @@ class Code(Base):
 Code.__table__.create(bind=engine, checkfirst=True)
 
 
+@offload
 def sql_add_code(code_list: list, tg: int, us: int):
     """批量添加记录，如果code已存在则忽略"""
     with Session() as session:
@@ -48,6 +50,7 @@ def sql_add_code(code_list: list, tg: int, us: int):
             return False
 
 
+@offload
 def sql_update_code(code, used: int, usedtime):
     with Session() as session:
         try:
@@ -62,6 +65,7 @@ def sql_update_code(code, used: int, usedtime):
             return False
 
 
+@offload
 def sql_get_code(code):
     with Session() as session:
         try:
@@ -72,6 +76,7 @@ def sql_get_code(code):
             return None
 
 
+@offload
 def sql_count_code(tg: int = None):
     with Session() as session:
         if tg is None:
@@ -126,6 +131,7 @@ def sql_count_code(tg: int = None):
                 return None
 
 
+@offload
 def sql_count_p_code(tg_id, us):
     with Session() as session:
         try:
@@ -217,6 +223,7 @@ def sql_count_p_code(tg_id, us):
             return None, 1
 
 
+@offload
 def sql_count_c_code(tg_id):
     with Session() as session:
         try:
@@ -256,6 +263,7 @@ def sql_count_c_code(tg_id):
             LOGGER.error(f"分页查询注册码失败 tg={tg_id}: {e}")
             return None, 1
 
+@offload
 def sql_delete_unused_by_days(days: list[int], user_id: int = None) -> int:
     with Session() as session:
         try:
@@ -272,6 +280,7 @@ def sql_delete_unused_by_days(days: list[int], user_id: int = None) -> int:
             return 0
 
 
+@offload
 def sql_delete_all_unused(user_id: int = None) -> int:
     with Session() as session:
         try:
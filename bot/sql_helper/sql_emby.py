@@ -6,11 +6,13 @@ from datetime import datetime
 
 from sqlalchemy import Column, BigInteger, String, DateTime, Integer, case, Index
 from sqlalchemy import func
-from sqlalchemy import or_
+from sqlalchemy import and_, or_, text
 from sqlalchemy.exc import IntegrityError
 
 from bot import LOGGER
 from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
+from bot.sql_helper.row_cache import RowCache
 
 
 class Emby(Base):
@@ -38,8 +40,20 @@ class Emby(Base):
 Emby.__table__.create(bind=engine, checkfirst=True)
 
 
+# ==================== 读穿缓存 ====================
+
+# name / embyid 为指向 tg 的二级索引；命中时返回新的瞬态 Emby 对象
+emby_cache = RowCache(
+    snapshot=lambda emby: {c.key: getattr(emby, c.key) for c in Emby.__table__.columns},
+    restore=lambda row: Emby(**row),
+    key_field='tg',
+    index_fields=('name', 'embyid'),
+)
+
+
 # ==================== 基础 CRUD 操作 ====================
 
+@offload
 def sql_add_emby(tg: int):
     """
     添加一条 emby 记录，如果 tg 已存在则忽略
@@ -49,6 +63,7 @@ def sql_add_emby(tg: int):
             emby = Emby(tg=tg)
             session.add(emby)
             session.commit()
+            emby_cache.invalidate(tg)
             LOGGER.debug(f"添加 emby 记录成功 tg={tg}")
             return True
         except IntegrityError:
@@ -61,21 +76,56 @@ def sql_add_emby(tg: int):
             return False
 
 
+@offload
 def sql_get_emby(tg):
     """
     查询一条 emby 记录，可以根据 tg, embyid 或者 name 来查询
+    已知查询字段时请直接使用 sql_get_emby_by_tg / sql_get_emby_by_name / sql_get_emby_by_embyid
     """
+    if tg is None:
+        return None
+    if isinstance(tg, int) or (isinstance(tg, str) and tg.lstrip('-').isdigit()):
+        emby = sql_get_emby_by_tg(int(tg))
+        if emby is not None:
+            return emby
+    return sql_get_emby_by_name(str(tg)) or sql_get_emby_by_embyid(str(tg))
+
+
+def _get_emby_by(field: str, value):
+    found, emby = emby_cache.get(field, value)
+    if found:
+        return emby
+    version = emby_cache.version
     with Session() as session:
         try:
-            emby = session.query(Emby).filter(
-                or_(Emby.tg == tg, Emby.name == tg, Emby.embyid == tg)
-            ).first()
-            return emby
+            emby = session.query(Emby).filter(getattr(Emby, field) == value).first()
         except Exception as e:
-            LOGGER.error(f"查询 emby 记录失败 tg={tg} err={e}")
+            LOGGER.error(f"查询 emby 记录失败 {field}={value} err={e}")
             return None
+    if emby is not None or field == 'tg':
+        emby_cache.put(version, emby.tg if emby else value, emby)
+    return emby
+
+
+@offload
+def sql_get_emby_by_tg(tg: int):
+    """按 tg 查询一条 emby 记录（主键，带缓存）"""
+    return _get_emby_by('tg', tg)
+
+
+@offload
+def sql_get_emby_by_name(name: str):
+    """按 Emby 用户名查询一条 emby 记录（name 索引，带缓存）"""
+    return _get_emby_by('name', name)
 
 
+@offload
+def sql_get_emby_by_embyid(embyid: str):
+    """按 embyid 查询一条 emby 记录（embyid 索引，带缓存）"""
+    return _get_emby_by('embyid', embyid)
+
+
+@offload
 def sql_update_emby(condition, **kwargs):
     """
     更新一条 emby 记录，根据 condition 来匹配，然后更新其他的字段
@@ -88,7 +138,9 @@ def sql_update_emby(condition, **kwargs):
             for k, v in kwargs.items():
                 if hasattr(Emby, k):
                     setattr(emby, k, v)
+            tg = emby.tg
             session.commit()
+            emby_cache.invalidate(tg)
             return True
         except Exception as e:
             LOGGER.error(f"更新 emby 记录失败: {e}")
@@ -96,6 +148,7 @@ def sql_update_emby(condition, **kwargs):
             return False
 
 
+@offload
 def sql_delete_emby(tg=None, embyid=None, name=None):
     """
     根据 tg, embyid 或 name 删除一条 emby 记录
@@ -119,8 +172,10 @@ def sql_delete_emby(tg=None, embyid=None, name=None):
             emby = session.query(Emby).filter(condition).with_for_update().first()
             if emby:
                 LOGGER.info(f"删除数据库记录 {emby.name} - {emby.embyid} - {emby.tg}")
+                deleted_tg = emby.tg
                 session.delete(emby)
                 session.commit()
+                emby_cache.invalidate(deleted_tg)
                 return True
             else:
                 LOGGER.info(f"数据库记录不存在: tg={tg}, embyid={embyid}, name={name}")
@@ -131,6 +186,7 @@ def sql_delete_emby(tg=None, embyid=None, name=None):
             return False
 
 
+@offload
 def sql_delete_emby_by_tg(tg):
     """
     根据 tg 删除一条 emby 记录
@@ -141,6 +197,7 @@ def sql_delete_emby_by_tg(tg):
             if emby:
                 session.delete(emby)
                 session.commit()
+                emby_cache.invalidate(tg)
                 LOGGER.info(f"删除数据库记录成功 {tg}")
                 return True
             else:
@@ -154,6 +211,7 @@ def sql_delete_emby_by_tg(tg):
 
 # ==================== 批量操作 ====================
 
+@offload
 def sql_update_embys(some_list: list, method=None):
     """
     根据 list 中的 tg 值批量更新，此方法不可更新主键
@@ -164,6 +222,7 @@ def sql_update_embys(some_list: list, method=None):
                 mappings = [{"tg": c[0], "iv": c[1]} for c in some_list]
                 session.bulk_update_mappings(Emby, mappings)
                 session.commit()
+                emby_cache.invalidate(*(m["tg"] for m in mappings))
                 return True
             except Exception as e:
                 LOGGER.error(f"批量更新 iv 失败: {e}")
@@ -174,6 +233,7 @@ def sql_update_embys(some_list: list, method=None):
                 mappings = [{"tg": c[0], "ex": c[1]} for c in some_list]
                 session.bulk_update_mappings(Emby, mappings)
                 session.commit()
+                emby_cache.invalidate(*(m["tg"] for m in mappings))
                 return True
             except Exception as e:
                 LOGGER.error(f"批量更新 ex 失败: {e}")
@@ -184,6 +244,7 @@ def sql_update_embys(some_list: list, method=None):
                 mappings = [{"tg": c[0], "name": c[1], "embyid": c[2]} for c in some_list]
                 session.bulk_update_mappings(Emby, mappings)
                 session.commit()
+                emby_cache.invalidate(*(m["tg"] for m in mappings))
                 return True
             except Exception as e:
                 LOGGER.error(f"批量更新 bind 失败: {e}")
@@ -191,23 +252,112 @@ def sql_update_embys(some_list: list, method=None):
                 return False
 
 
-def sql_clear_emby_iv():
+@offload
+def sql_batch_update_emby(mappings: list, unbind: list = None):
     """
-    清除所有 emby 的 iv
+    在同一个事务中批量更新 emby 记录，并删除 unbind 中用户的全部服务器绑定
+    :param mappings: [{"tg": ..., 字段: 值}, ...]，每项必须包含 tg
+    :param unbind: 需要同时删除绑定记录的 tg 列表
     """
+    from bot.sql_helper.sql_server_bindings import EmbyServerBinding
     with Session() as session:
         try:
-            session.query(Emby).update({Emby.iv: 0})
+            if mappings:
+                session.bulk_update_mappings(Emby, mappings)
+            if unbind:
+                session.query(EmbyServerBinding).filter(
+                    EmbyServerBinding.tg.in_(unbind)
+                ).delete(synchronize_session=False)
             session.commit()
+            emby_cache.invalidate(*(m['tg'] for m in mappings))
             return True
         except Exception as e:
-            LOGGER.error(f"清除所有 emby 的 iv 时发生异常 {e}")
+            LOGGER.error(f"批量更新 emby 记录失败: {e}")
             session.rollback()
             return False
 
 
+@offload
+def sql_clear_emby_iv(condition=None):
+    """
+    清除 emby 的 iv，condition 为 None 时清除所有
+    :return: 匹配的记录数，失败返回 None
+    """
+    with Session() as session:
+        try:
+            query = session.query(Emby)
+            if condition is not None:
+                query = query.filter(condition)
+            count = query.update({Emby.iv: 0}, synchronize_session=False)
+            session.commit()
+            emby_cache.clear()
+            return count
+        except Exception as e:
+            LOGGER.error(f"清除 emby 的 iv 时发生异常 {e}")
+            session.rollback()
+            return None
+
+
+# ==================== 集合运算更新 ====================
+# 由数据库在一条 UPDATE 中完成 iv + n / ex + n 天，不把整表读进内存再写回，
+# 也不会覆盖期间其他请求（兑换码、排行榜奖励等）对同一行的修改
+
+def _apply_arithmetic(condition, column, value):
+    """
+    锁定匹配行，执行一条集合 UPDATE，返回 [(tg, 新值), ...]；失败返回 None
+    先 SELECT ... FOR UPDATE 固定受影响的 tg，保证返回的列表与实际更新的行一致
+    """
+    with Session() as session:
+        try:
+            tgs = [r.tg for r in session.query(Emby.tg).filter(condition).with_for_update().all()]
+            rows = []
+            if tgs:
+                session.query(Emby).filter(Emby.tg.in_(tgs)).update({column: value}, synchronize_session=False)
+                rows = [(r[0], r[1]) for r in session.query(Emby.tg, column).filter(Emby.tg.in_(tgs)).all()]
+            session.commit()
+            emby_cache.invalidate(*tgs)
+            return rows
+        except Exception as e:
+            LOGGER.error(f"批量更新 {column.key} 失败: {e}")
+            session.rollback()
+            return None
+
+
+@offload
+def increment_iv(condition, delta: int):
+    """
+    给所有符合条件的用户 iv 加上 delta（可为负数）
+    :return: [(tg, 新 iv), ...]，失败返回 None
+    """
+    return _apply_arithmetic(condition, Emby.iv, func.coalesce(Emby.iv, 0) + delta)
+
+
+@offload
+def increment_ivs(deltas: dict):
+    """
+    按用户分别增加 iv，deltas 为 {tg: 增量}，一条 UPDATE ... CASE 完成
+    :return: [(tg, 新 iv), ...]，失败返回 None
+    """
+    if not deltas:
+        return []
+    return _apply_arithmetic(Emby.tg.in_(list(deltas)), Emby.iv,
+                             func.coalesce(Emby.iv, 0) + case(deltas, value=Emby.tg, else_=0))
+
+
+@offload
+def shift_expiry(condition, days: float):
+    """
+    把所有符合条件且有到期时间的用户到期时间平移 days 天（可为负数、小数）
+    :return: [(tg, 新到期时间), ...]，失败返回 None
+    """
+    seconds = int(days * 86400)
+    return _apply_arithmetic(and_(condition, Emby.ex.isnot(None)), Emby.ex,
+                             func.timestampadd(text('SECOND'), seconds, Emby.ex))
+
+
 # ==================== 查询操作 ====================
 
+@offload
 def get_all_emby(condition):
     """
     查询所有符合条件的 emby 记录
@@ -221,6 +371,7 @@ def get_all_emby(condition):
             return None
 
 
+@offload
 def sql_count_emby():
     """
     统计 emby 记录数量
@@ -239,6 +390,7 @@ def sql_count_emby():
             return None, None, None
 
 
+@offload
 def get_expired_users():
     """
     获取所有已过期的用户列表
@@ -256,6 +408,7 @@ def get_expired_users():
             return []
 
 
+@offload
 def get_users_by_level(lv: str):
     """
     获取指定等级的所有用户
@@ -268,6 +421,7 @@ def get_users_by_level(lv: str):
             return []
 
 
+@offload
 def get_registered_users():
     """
     获取所有已注册用户（有 embyid 的）
@@ -1,4 +1,5 @@
 from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
 from sqlalchemy import Column, String, DateTime, Integer, Index
 from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError
@@ -41,6 +42,7 @@ class Emby2(Base):
 Emby2.__table__.create(bind=engine, checkfirst=True)
 
 
+@offload
 def sql_add_emby2(embyid, name, cr, ex, server_id='main', pwd='5210', pwd2='1234', lv='b', expired=0):
     """
     添加一条 emby2 记录（多服务器版本）
@@ -86,6 +88,7 @@ def sql_add_emby2(embyid, name, cr, ex, server_id='main', pwd='5210', pwd2='1234
             return False
 
 
+@offload
 def sql_get_emby2(name, server_id=None):
     """
     查询一条 emby2 记录（多服务器版本）
@@ -111,6 +114,7 @@ def sql_get_emby2(name, server_id=None):
             return None
 
 
+@offload
 def get_all_emby2(condition):
     """
     查询所有emby记录
@@ -124,6 +128,7 @@ def get_all_emby2(condition):
             return None
 
 
+@offload
 def sql_update_emby2(condition, **kwargs):
     """
     更新一条emby记录，根据condition来匹配，然后更新其他的字段
@@ -145,6 +150,26 @@ def sql_update_emby2(condition, **kwargs):
             return False
 
 
+@offload
+def sql_update_emby2s(embyids: list, **kwargs):
+    """
+    按 embyid 列表批量更新 emby2 记录，一条 UPDATE 完成
+    """
+    if not embyids:
+        return True
+    with Session() as session:
+        try:
+            session.query(Emby2).filter(Emby2.embyid.in_(embyids)).update(
+                {getattr(Emby2, k): v for k, v in kwargs.items()}, synchronize_session=False)
+            session.commit()
+            return True
+        except Exception as e:
+            LOGGER.error(f"批量更新 emby2 记录失败: {e}")
+            session.rollback()
+            return False
+
+
+@offload
 def sql_delete_emby2(embyid):
     """
     根据tg删除一条emby记录
@@ -169,6 +194,7 @@ def sql_delete_emby2(embyid):
             # 记录错误信息
             print(e)
             return False
+@offload
 def sql_delete_emby2_by_name(name):
     """
     根据name删除一条emby记录
@@ -190,6 +216,7 @@ def sql_delete_emby2_by_name(name):
 
 # ==================== 多服务器支持函数 ====================
 
+@offload
 def get_all_emby2_by_server(server_id: str):
     """
     获取指定服务器的所有 emby2 用户
@@ -209,6 +236,7 @@ def get_all_emby2_by_server(server_id: str):
             return []
 
 
+@offload
 def count_emby2_by_server(server_id: str) -> int:
     """
     统计指定服务器的 emby2 用户数
@@ -228,6 +256,7 @@ def count_emby2_by_server(server_id: str) -> int:
             return 0
 
 
+@offload
 def get_expired_emby2_users(server_id: str = None):
     """
     获取已过期的 emby2 用户列表
@@ -1,6 +1,7 @@
 from datetime import datetime
 from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint, Index
 from bot.sql_helper import Base, engine, Session
+from bot.sql_helper.aio import offload
 from bot import LOGGER
 
 class EmbyFavorites(Base):
@@ -35,6 +36,7 @@ class EmbyFavorites(Base):
 
 EmbyFavorites.__table__.create(bind=engine, checkfirst=True)
 
+@offload
 def sql_add_favorites(embyid: str, embyname: str, item_id: str, item_name: str, server_id: str = 'main', is_favorite: bool = True) -> bool:
     """
     添加或删除收藏记录（多服务器版本）
@@ -121,6 +123,7 @@ def sql_add_favorites(embyid: str, embyname: str, item_id: str, item_name: str,
         LOGGER.error(f"操作收藏记录失败: {str(e)}")
         return False
     
+@offload
 def sql_clear_favorites(emby_name: str, server_id: str = None) -> bool:
     """
     清除 Emby 用户的收藏记录（多服务器版本）
@@ -145,6 +148,7 @@ def sql_clear_favorites(emby_name: str, server_id: str = None) -> bool:
         return False
 
 
+@offload
 def sql_get_favorites(embyid: str, server_id: str = None, page: int = 1, page_size: int = 20) -> list:
     """
     获取 Emby 用户的收藏记录（多服务器版本）
@@ -168,6 +172,7 @@ def sql_get_favorites(embyid: str, server_id: str = None, page: int = 1, page_si
         LOGGER.error(f"获取收藏记录失败: {str(e)}")
         return []
     
+@offload
 def sql_update_favorites(condition, **kwargs):
     """
     更新收藏记录，根据condition来匹配，批量更新所有符合条件的记录
@@ -0,0 +1,357 @@
+"""
+Emby 播放记录本地镜像表操作
+按 server_id 增量同步 Playback Reporting 插件的 PlaybackActivity 表，
+日榜/周榜、观影榜和审计查询直接读本地索引，不再让 Emby 扫描全表
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, BigInteger, String, DateTime, Integer, Index, UniqueConstraint
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert, VARBINARY
+
+from bot import LOGGER
+from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class EmbyPlaybackActivity(Base):
+    """
+    播放记录镜像表
+    字段与 Playback Reporting 插件的 PlaybackActivity 对应，额外记录所属服务器
+    """
+    __tablename__ = 'emby_playback_activity'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    server_id = Column(String(50), nullable=False, comment='服务器 ID')
+    date_created = Column(DateTime, nullable=False, comment='播放时间（Emby 服务器本地时间）')
+    user_id = Column(String(64), nullable=False, comment='Emby 用户 ID')
+    item_id = Column(String(64), nullable=False, comment='项目 ID')
+    item_type = Column(String(32), nullable=True, comment='项目类型 Movie/Episode/...')
+    item_name = Column(String(512), nullable=True, comment='项目名称')
+    client_name = Column(String(255), nullable=True, comment='客户端名')
+    device_name = Column(String(255), nullable=True, comment='设备名')
+    remote_address = Column(String(64), nullable=True, comment='来源 IP')
+    ip_bin = Column(VARBINARY(16), nullable=True, comment='来源 IP 的 16 字节整数（IPv4 映射为 ::ffff:a.b.c.d），用于网段查询')
+    play_duration = Column(Integer, default=0, comment='播放时长（秒）')
+    pause_duration = Column(Integer, default=0, comment='暂停时长（秒）')
+
+    __table_args__ = (
+        UniqueConstraint('server_id', 'date_created', 'user_id', 'item_id', 'device_name',
+                         name='uix_playback_server_row'),
+        Index('idx_playback_server_date', 'server_id', 'date_created'),
+        Index('idx_playback_server_type_date', 'server_id', 'item_type', 'date_created'),
+        Index('idx_playback_server_user_date', 'server_id', 'user_id', 'date_created'),
+        Index('idx_playback_server_ip', 'server_id', 'remote_address'),
+        Index('idx_playback_server_ipbin', 'server_id', 'ip_bin'),
+    )
+
+
+class EmbyPlaybackSyncState(Base):
+    """
+    播放记录同步水位表
+    每个服务器记录已同步到的最大 DateCreated
+    """
+    __tablename__ = 'emby_playback_sync_state'
+
+    server_id = Column(String(50), primary_key=True, comment='服务器 ID')
+    last_date = Column(DateTime, nullable=True, comment='已同步的最大 DateCreated')
+    synced_at = Column(DateTime, nullable=True, comment='最近一次同步时间')
+
+
+# 创建表（如果不存在）
+EmbyPlaybackActivity.__table__.create(bind=engine, checkfirst=True)
+EmbyPlaybackSyncState.__table__.create(bind=engine, checkfirst=True)
+
+
+def parse_emby_date(value) -> Optional[datetime]:
+    """
+    解析 PlaybackActivity.DateCreated（形如 2024-01-01 12:00:00.0000000）
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None, microsecond=0)
+    try:
+        return datetime.strptime(str(value).replace('T', ' ')[:19], DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+# ==================== 同步操作 ====================
+
+@offload
+def sql_get_playback_watermark(server_id: str) -> Optional[datetime]:
+    """
+    获取服务器的同步水位
+    """
+    with Session() as session:
+        try:
+            state = session.get(EmbyPlaybackSyncState, server_id)
+            return state.last_date if state else None
+        except Exception as e:
+            LOGGER.error(f"查询播放记录水位失败 server={server_id}: {e}")
+            return None
+
+
+@offload
+def sql_add_playback_rows(server_id: str, rows: Iterable[dict]) -> Optional[datetime]:
+    """
+    批量写入播放记录并推进水位
+    回看窗口内重复拉取的行按唯一键合并，只刷新播放/暂停时长和 IP 区间列
+
+    Args:
+        server_id: 服务器 ID
+        rows: 已转换为列名的记录字典
+
+    Returns:
+        本批最大的 DateCreated，失败返回 None
+    """
+    rows = [dict(r, server_id=server_id) for r in rows if r.get('date_created') and r.get('user_id')]
+    if not rows:
+        return sql_get_playback_watermark(server_id)
+    with Session() as session:
+        try:
+            stmt = mysql_insert(EmbyPlaybackActivity)
+            stmt = stmt.on_duplicate_key_update(
+                play_duration=stmt.inserted.play_duration,
+                pause_duration=stmt.inserted.pause_duration,
+                ip_bin=stmt.inserted.ip_bin,
+            )
+            session.execute(stmt, rows)
+
+            last_date = max(r['date_created'] for r in rows)
+            state = session.get(EmbyPlaybackSyncState, server_id)
+            if state is None:
+                state = EmbyPlaybackSyncState(server_id=server_id)
+                session.add(state)
+            if state.last_date is None or last_date > state.last_date:
+                state.last_date = last_date
+            state.synced_at = datetime.now()
+            session.commit()
+            return last_date
+        except Exception as e:
+            session.rollback()
+            LOGGER.error(f"写入播放记录失败 server={server_id}: {e}")
+            return None
+
+
+@offload
+def sql_touch_playback_state(server_id: str) -> bool:
+    """
+    无新数据时也记录一次同步时间
+    """
+    with Session() as session:
+        try:
+            state = session.get(EmbyPlaybackSyncState, server_id)
+            if state is None:
+                state = EmbyPlaybackSyncState(server_id=server_id)
+                session.add(state)
+            state.synced_at = datetime.now()
+            session.commit()
+            return True
+        except Exception as e:
+            session.rollback()
+            LOGGER.error(f"更新播放记录同步状态失败 server={server_id}: {e}")
+            return False
+
+
+# ==================== 查询操作 ====================
+
+def _time_filters(query, start: datetime = None, end: datetime = None):
+    if start is not None:
+        query = query.filter(EmbyPlaybackActivity.date_created >= start)
+    if end is not None:
+        query = query.filter(EmbyPlaybackActivity.date_created <= end)
+    return query
+
+
+def _fmt(value) -> str:
+    return value.strftime(DATE_FORMAT) if isinstance(value, datetime) else str(value or '')
+
+
+@offload
+def sql_playback_report(server_id: str, item_type: str, start: datetime, end: datetime,
+                        emby_id: str = None, limit: int = 10, exclude_users: Iterable[str] = None) -> List[list]:
+    """
+    播放排行（对应 get_emby_report），按名称聚合
+    剧集取 ItemName 中 ' - ' 之前的部分作为剧名
+
+    Returns:
+        [[UserId, ItemId, ItemType, name, play_count, total_duration], ...]
+    """
+    t = EmbyPlaybackActivity
+    if item_type == 'Episode':
+        name = func.substring_index(t.item_name, ' - ', 1)
+    else:
+        name = t.item_name
+    duration = func.sum(t.play_duration - t.pause_duration)
+    with Session() as session:
+        try:
+            query = session.query(
+                func.max(t.user_id), func.max(t.item_id), func.max(t.item_type),
+                name.label('name'), func.count(t.id), duration.label('total_duration')
+            ).filter(t.server_id == server_id, t.item_type == item_type)
+            query = _time_filters(query, start, end)
+            if exclude_users:
+                query = query.filter(t.user_id.notin_(list(exclude_users)))
+            if emby_id:
+                query = query.filter(t.user_id == emby_id)
+            rows = query.group_by(name).order_by(duration.desc()).limit(int(limit)).all()
+            return [[r[0], r[1], r[2], r[3], int(r[4]), int(r[5] or 0)] for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地播放排行失败 server={server_id}: {e}")
+            return []
+
+
+@offload
+def sql_playback_watch_time(server_id: str, start: datetime, end: datetime) -> List[list]:
+    """
+    用户观影时长排行（对应 emby_cust_commit method='sp'）
+
+    Returns:
+        [[UserId, WatchTime(秒)], ...] 按时长降序
+    """
+    t = EmbyPlaybackActivity
+    duration = func.sum(t.play_duration - t.pause_duration)
+    with Session() as session:
+        try:
+            query = session.query(t.user_id, duration).filter(t.server_id == server_id)
+            query = _time_filters(query, start, end)
+            rows = query.group_by(t.user_id).order_by(duration.desc()).all()
+            return [[r[0], int(r[1] or 0)] for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地观影时长失败 server={server_id}: {e}")
+            return []
+
+
+@offload
+def sql_playback_user_summary(server_id: str, emby_id: str, start: datetime, end: datetime) -> List[list]:
+    """
+    单用户最近活动与观影分钟数（对应 emby_cust_commit 默认分支）
+
+    Returns:
+        [[LastLogin, WatchTime(分钟)]] 或 []
+    """
+    t = EmbyPlaybackActivity
+    with Session() as session:
+        try:
+            query = session.query(
+                func.max(t.date_created), func.sum(t.play_duration - t.pause_duration)
+            ).filter(t.server_id == server_id, t.user_id == emby_id)
+            row = _time_filters(query, start, end).first()
+            if not row or row[0] is None:
+                return []
+            return [[_fmt(row[0]), int(row[1] or 0) // 60]]
+        except Exception as e:
+            LOGGER.error(f"查询本地用户观影统计失败 server={server_id} user={emby_id}: {e}")
+            return []
+
+
+@offload
+def sql_playback_user_ips(server_id: str, emby_id: str) -> List[list]:
+    """
+    用户播放过的设备与 IP（对应 get_emby_userip）
+
+    Returns:
+        [[DeviceName, ClientName, RemoteAddress], ...]
+    """
+    t = EmbyPlaybackActivity
+    with Session() as session:
+        try:
+            rows = session.query(t.device_name, t.client_name, t.remote_address).filter(
+                t.server_id == server_id, t.user_id == emby_id
+            ).distinct().all()
+            return [list(r) for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地用户设备失败 server={server_id} user={emby_id}: {e}")
+            return []
+
+
+@offload
+def sql_playback_activity_by(server_id: str, ip: str = None, device: str = None, client: str = None,
+                             start: datetime = None, end: datetime = None,
+                             ip_range: Tuple[bytes, bytes] = None) -> List[list]:
+    """
+    按 IP（精确）、IP 区间、设备名或客户端名（包含）查询活动，按用户+设备+客户端+IP 聚合
+    （对应 get_users_by_ip / get_users_by_device_name / get_users_by_client_name）
+    ip_range 为 ip_range.network_bounds 给出的 16 字节闭区间，走 (server_id, ip_bin) 索引的区间扫描
+
+    Returns:
+        [[UserId, DeviceName, ClientName, RemoteAddress, LastActivity, ActivityCount], ...]
+    """
+    t = EmbyPlaybackActivity
+    last = func.max(t.date_created)
+    with Session() as session:
+        try:
+            query = session.query(
+                t.user_id, t.device_name, t.client_name, t.remote_address, last, func.count(t.id)
+            ).filter(t.server_id == server_id)
+            if ip is not None:
+                query = query.filter(t.remote_address == ip)
+            if ip_range is not None:
+                query = query.filter(t.ip_bin.between(*ip_range))
+            if device is not None:
+                query = query.filter(t.device_name.contains(device, autoescape=True))
+            if client is not None:
+                query = query.filter(t.client_name.contains(client, autoescape=True))
+            query = _time_filters(query, start, end)
+            rows = query.group_by(
+                t.user_id, t.device_name, t.client_name, t.remote_address
+            ).order_by(last.desc()).all()
+            return [[r[0], r[1], r[2], r[3], _fmt(r[4]), int(r[5])] for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地播放活动失败 server={server_id}: {e}")
+            return []
+
+
+@offload
+def sql_playback_user_devices(server_id: str, offset: int = 0, limit: int = 20) -> List[list]:
+    """
+    每个用户的设备数与 IP 数（对应 get_emby_user_devices），多取一条用于判断下一页
+
+    Returns:
+        [[UserId, device_count, ip_count], ...]
+    """
+    t = EmbyPlaybackActivity
+    device_count = func.count(func.distinct(func.concat(
+        func.coalesce(t.device_name, ''), func.coalesce(t.client_name, ''))))
+    with Session() as session:
+        try:
+            rows = session.query(
+                t.user_id, device_count, func.count(func.distinct(t.remote_address))
+            ).filter(t.server_id == server_id).group_by(t.user_id).order_by(
+                device_count.desc()
+            ).limit(int(limit) + 1).offset(int(offset)).all()
+            return [[r[0], int(r[1]), int(r[2])] for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地设备统计失败 server={server_id}: {e}")
+            return []
+
+
+
+@offload
+def sql_playback_sharing_rows(server_ids: Iterable[str], start: datetime = None) -> List[list]:
+    """
+    按 服务器+用户+IP+设备+客户端 聚合的播放记录，供账号共享检测一次性分析所有服务器
+
+    Returns:
+        [[server_id, UserId, RemoteAddress, DeviceName, ClientName, LastActivity(datetime), ActivityCount], ...]
+    """
+    t = EmbyPlaybackActivity
+    with Session() as session:
+        try:
+            query = session.query(
+                t.server_id, t.user_id, t.remote_address, t.device_name, t.client_name,
+                func.max(t.date_created), func.count(t.id)
+            ).filter(t.server_id.in_(list(server_ids)))
+            query = _time_filters(query, start)
+            rows = query.group_by(
+                t.server_id, t.user_id, t.remote_address, t.device_name, t.client_name
+            ).all()
+            return [[r[0], r[1], r[2], r[3], r[4], r[5], int(r[6])] for r in rows]
+        except Exception as e:
+            LOGGER.error(f"查询本地共享检测数据失败: {e}")
+            return []
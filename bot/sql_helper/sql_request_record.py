@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, DateTime, BigInteger, Text, Float
 import datetime
 from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
 from cacheout import Cache
 
 cache = Cache()
@@ -25,6 +26,7 @@ class RequestRecord(Base):
 RequestRecord.__table__.create(bind=engine, checkfirst=True)
 
 
+@offload
 def sql_add_request_record(tg: int, download_id: str, request_name: str, detail: str, cost: str):
     with Session() as session:
         try:
@@ -38,6 +40,7 @@ def sql_add_request_record(tg: int, download_id: str, request_name: str, detail:
             return False
 
 
+@offload
 def sql_get_request_record_by_tg(tg: int, page: int = 1, limit: int = 5):
     with Session() as session:
         request_record = session.query(RequestRecord).filter(
@@ -55,17 +58,20 @@ def sql_get_request_record_by_tg(tg: int, page: int = 1, limit: int = 5):
             has_prev = False
         return request_record, has_prev, has_next
 
+@offload
 def sql_get_request_record_by_download_id(download_id: str):
     with Session() as session:
         request_record = session.query(RequestRecord).filter(RequestRecord.download_id == download_id).first()
         return request_record
 
+@offload
 def sql_get_request_record_by_transfer_state(transfer_state: str = None):
     with Session() as session:
         request_record = session.query(RequestRecord).filter(RequestRecord.transfer_state == transfer_state).all()
         return request_record
 
 
+@offload
 def sql_update_request_status(download_id: str, download_state: str, transfer_state: str = None, progress: float = None, left_time: str = None):
     """更新下载状态"""
     with Session() as session:
@@ -88,6 +94,7 @@ def sql_update_request_status(download_id: str, download_state: str, transfer_st
             return False
 
 
+@offload
 def sql_get_movie_requests(status: str = None, page: int = 1, limit: int = 10):
     """
     获取求片记录（download_id 以 'tmdb_' 开头的记录）
@@ -122,6 +129,7 @@ def sql_get_movie_requests(status: str = None, page: int = 1, limit: int = 10):
         return records, has_prev, has_next
 
 
+@offload
 def sql_get_all_movie_requests_for_export():
     """
     获取所有求片记录用于导出
@@ -135,6 +143,7 @@ def sql_get_all_movie_requests_for_export():
         return records
 
 
+@offload
 def sql_get_movie_request_stats():
     """
     获取求片统计信息
@@ -3,12 +3,13 @@
 管理用户在多个 Emby 服务器上的账号绑定关系
 """
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from sqlalchemy import Column, BigInteger, String, DateTime, Boolean, Index
 
 from bot import LOGGER
 from bot.sql_helper import Base, Session, engine
+from bot.sql_helper.aio import offload
 
 
 class EmbyServerBinding(Base):
@@ -38,6 +39,7 @@ EmbyServerBinding.__table__.create(bind=engine, checkfirst=True)
 
 # ==================== 基础 CRUD 操作 ====================
 
+@offload
 def add_binding(tg: int, server_id: str, embyid: str, is_primary: bool = False) -> bool:
     """
     添加用户-服务器绑定
@@ -71,6 +73,7 @@ def add_binding(tg: int, server_id: str, embyid: str, is_primary: bool = False)
             return False
 
 
+@offload
 def get_binding(tg: int, server_id: str) -> Optional[EmbyServerBinding]:
     """
     获取指定用户在指定服务器的绑定
@@ -93,6 +96,7 @@ def get_binding(tg: int, server_id: str) -> Optional[EmbyServerBinding]:
             return None
 
 
+@offload
 def get_user_bindings(tg: int, enabled_only: bool = True) -> List[EmbyServerBinding]:
     """
     获取用户的所有服务器绑定
@@ -115,6 +119,35 @@ def get_user_bindings(tg: int, enabled_only: bool = True) -> List[EmbyServerBind
             return []
 
 
+@offload
+def get_bindings_for_users(tgs: List[int], enabled_only: bool = True) -> Dict[int, List[EmbyServerBinding]]:
+    """
+    一次查询获取多个用户的绑定
+
+    Args:
+        tgs: Telegram 用户 ID 列表
+        enabled_only: 是否只返回启用的绑定
+
+    Returns:
+        {tg: [绑定记录, ...]}，没有绑定的用户不在结果中
+    """
+    if not tgs:
+        return {}
+    with Session() as session:
+        try:
+            query = session.query(EmbyServerBinding).filter(EmbyServerBinding.tg.in_(tgs))
+            if enabled_only:
+                query = query.filter(EmbyServerBinding.enabled == True)
+            result: Dict[int, List[EmbyServerBinding]] = {}
+            for binding in query.all():
+                result.setdefault(binding.tg, []).append(binding)
+            return result
+        except Exception as e:
+            LOGGER.error(f"批量查询用户绑定失败: {e}")
+            return {}
+
+
+@offload
 def get_primary_binding(tg: int) -> Optional[EmbyServerBinding]:
     """
     获取用户的主服务器绑定
@@ -136,6 +169,7 @@ def get_primary_binding(tg: int) -> Optional[EmbyServerBinding]:
             return None
 
 
+@offload
 def get_server_bindings(server_id: str, enabled_only: bool = True) -> List[EmbyServerBinding]:
     """
     获取指定服务器的所有用户绑定
@@ -160,6 +194,7 @@ def get_server_bindings(server_id: str, enabled_only: bool = True) -> List[EmbyS
             return []
 
 
+@offload
 def update_binding(tg: int, server_id: str, **kwargs) -> bool:
     """
     更新绑定信息
@@ -193,6 +228,7 @@ def update_binding(tg: int, server_id: str, **kwargs) -> bool:
             return False
 
 
+@offload
 def delete_binding(tg: int, server_id: str) -> bool:
     """
     删除绑定
@@ -220,6 +256,7 @@ def delete_binding(tg: int, server_id: str) -> bool:
             return False
 
 
+@offload
 def delete_user_bindings(tg: int) -> int:
     """
     删除用户的所有绑定
@@ -246,6 +283,7 @@ def delete_user_bindings(tg: int) -> int:
 
 # ==================== 业务操作 ====================
 
+@offload
 def set_primary_binding(tg: int, server_id: str) -> bool:
     """
     设置主服务器（会取消其他绑定的主服务器标记）
@@ -281,6 +319,7 @@ def set_primary_binding(tg: int, server_id: str) -> bool:
             return False
 
 
+@offload
 def get_embyid_by_server(tg: int, server_id: str) -> Optional[str]:
     """
     获取用户在指定服务器的 embyid
@@ -296,6 +335,7 @@ def get_embyid_by_server(tg: int, server_id: str) -> Optional[str]:
     return binding.embyid if binding else None
 
 
+@offload
 def get_user_server_ids(tg: int, enabled_only: bool = True) -> List[str]:
     """
     获取用户绑定的所有服务器 ID
@@ -311,6 +351,7 @@ def get_user_server_ids(tg: int, enabled_only: bool = True) -> List[str]:
     return [b.server_id for b in bindings]
 
 
+@offload
 def count_server_users(server_id: str, enabled_only: bool = True) -> int:
     """
     统计服务器的用户数
@@ -335,6 +376,7 @@ def count_server_users(server_id: str, enabled_only: bool = True) -> int:
             return 0
 
 
+@offload
 def has_binding(tg: int, server_id: str) -> bool:
     """
     检查用户是否已绑定指定服务器
@@ -349,6 +391,7 @@ def has_binding(tg: int, server_id: str) -> bool:
     return get_binding(tg, server_id) is not None
 
 
+@offload
 def add_or_update_binding(tg: int, server_id: str, embyid: str, is_primary: bool = False) -> bool:
     """
     添加或更新绑定（如果已存在则更新）
@@ -12,6 +12,7 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from .api import emby_api_route, user_api_route
+from .api.webhook.ingest import webhook_queue
 from bot import api as config_api, LOGGER
 
 
@@ -73,6 +74,8 @@ class Web:
             LOGGER.error("【API服务】启动失败，退出ing...")
             raise SystemExit from None
 
+        # Webhook 事件处理协程，同时回填上次退出时未处理的事件
+        webhook_queue.start()
         LOGGER.info("【API服务】 启动成功!")
 
     def stop(self):
@@ -6,9 +6,8 @@ Author:susu
 Date:2024/8/27
 """
 from fastapi import APIRouter
-from bot.sql_helper.sql_emby import sql_get_emby, sql_update_emby, Emby
+from bot.sql_helper.sql_emby import sql_get_emby_by_embyid, sql_update_emby, Emby
 from bot import LOGGER, group, bot
-from bot.func_helper.emby_utils import get_user_emby_service
 from bot.func_helper.emby_manager import emby_manager
 
 route = APIRouter()
@@ -22,18 +21,10 @@ async def ban_playlist(eid: str):
     if not eid:
         return {"user_id": None, "embyid": None, "is_baned": False}
 
-    user = sql_get_emby(eid)
+    user = await sql_get_emby_by_embyid.aio(eid)
     if user is None:
-        # 多服务器适配：遍历所有服务器尝试封禁（用户不在数据库中）
-        all_servers = emby_manager.get_all_servers()
-        banned = False
-        for server_id, emby_service in all_servers.items():
-            try:
-                if await emby_service.emby_change_policy(emby_id=eid, disable=True):
-                    banned = True
-                    break
-            except Exception as e:
-                LOGGER.warning(f"服务器 {server_id} 封禁失败: {e}")
+        # 多服务器适配：用户不在数据库中，优先发往用户目录中的所在服务器，未知时依次尝试
+        banned = await emby_manager.change_policy(eid, disable=True) is not None
 
         details = ''
         if banned:
@@ -47,20 +38,8 @@ async def ban_playlist(eid: str):
         LOGGER.info(text)
         return info
 
-    # 多服务器适配：获取用户对应的服务实例
-    emby_service, server_config, user_obj = get_user_emby_service(user.tg)
-    if not emby_service:
-        info = {"user_id": user.tg, "emby_name": user.name, "embyid": eid, "is_baned": False,
-                "details": "已拦截疑似敏感操作播放列表，但无法连接到用户所在服务器。"}
-        text = ("【新建播放列表拦截】\n\n"
-                f"[你](tg://user?id={user.tg}) 已被检测到疑似敏感操作\n"
-                f"Emby：{user.name}  |  ID：`{user.tg}`\n"
-                f'详情：{info["details"]}')
-        await bot.send_message(chat_id=group[0], text=text)
-        LOGGER.warning(text)
-        return info
-
-    if await emby_service.emby_change_policy(emby_id=eid, disable=True):
+    # 多服务器适配：封禁直接发往该 Emby 用户所在的服务器
+    if await emby_manager.change_policy(eid, disable=True) is not None:
         info = {"user_id": user.tg, "emby_name": user.name, "embyid": eid, "is_baned": True,
                 "details": "已拦截疑似敏感操作播放列表，用户已被斩杀（封禁）。请向权限管理员描述信息。"}
         text = (f"【新建播放列表拦截】\n\n"
@@ -70,7 +49,7 @@ async def ban_playlist(eid: str):
         try:
             out = await bot.send_message(group[0], text)
             await out.forward(user.tg)
-            sql_update_emby(Emby.tg == info["user_id"], lv='c')
+            await sql_update_emby.aio(Emby.tg == info["user_id"], lv='c')
         except Exception as e:
             text += e
 
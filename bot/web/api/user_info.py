@@ -16,7 +16,7 @@ route = APIRouter()
 @route.get("/user_info")
 async def user_info(tg: str):
     # 从数据库获取用户信息
-    user = sql_get_emby(tg)
+    user = await sql_get_emby.aio(tg)
 
     if not user:
         return {"code": 404, "message": "用户不存在"}
@@ -45,7 +45,7 @@ async def update_credit(request: Request):
             return {"code": 400, "message": "参数错误"}
 
         # 获取用户信息
-        user = sql_get_emby(tg)
+        user = await sql_get_emby.aio(tg)
         if not user:
             return {"code": 404, "message": "用户不存在"}
 
@@ -55,7 +55,7 @@ async def update_credit(request: Request):
             return {"code": 400, "message": "积分不足"}
         # 更新用户积分
         user.iv = new_iv
-        res = sql_update_emby(Emby.tg == tg, iv=new_iv)
+        res = await sql_update_emby.aio(Emby.tg == tg, iv=new_iv)
         if res:
 
             return {
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Request, HTTPException
-from bot.sql_helper.sql_emby import Emby, sql_get_emby, sql_update_emby
+from fastapi.responses import JSONResponse
+from bot.sql_helper.sql_emby import Emby, sql_get_emby_by_embyid, sql_update_emby
 from bot import LOGGER, bot, config
-from bot.func_helper.emby_utils import get_user_emby_service
+from bot.func_helper.client_matcher import ClientMatcher, SessionVerdicts
 from bot.func_helper.emby_manager import emby_manager
+from bot.func_helper.stream_limiter import stream_limiter
+from bot.web.api.webhook.ingest import webhook_queue
 import json
-import re
 from typing import List
 from datetime import datetime
 
@@ -38,23 +40,40 @@ async def get_blocked_clients() -> List[str]:
         return DEFAULT_BLOCKED_CLIENTS
 
 
+_matcher = ClientMatcher(())
+# (服务器, 会话) -> 判定结果与是否已处置；同一会话的后续事件只查表
+_sessions = SessionVerdicts()
+
+
+async def get_client_matcher() -> ClientMatcher:
+    """
+    返回当前规则对应的匹配器
+    配置中的规则变化时编译新的匹配器整体替换，保留相同规则的命中次数
+    """
+    global _matcher, _sessions
+    patterns = tuple(await get_blocked_clients())
+    if patterns != _matcher.patterns:
+        matcher = ClientMatcher(patterns, counts=_matcher.counts)
+        for pattern, error in matcher.invalid:
+            LOGGER.error(f"正则表达式错误: {pattern} - {error}")
+        _matcher = matcher
+        # 规则变化后已缓存的会话判定失效
+        _sessions = SessionVerdicts()
+        LOGGER.info(f"客户端拦截规则已加载: {len(patterns)} 条")
+    return _matcher
+
+
+def client_filter_stats_text() -> str:
+    """命中最多的拦截规则，供状态命令展示"""
+    top = _matcher.top()
+    return ' | '.join(f"`{pattern}` {count}" for pattern, count in top) if top else '暂无命中'
+
+
 async def is_client_blocked(client: str) -> bool:
     """检查客户端是否被拦截"""
     if not client:
         return False
-
-    blocked_clients = await get_blocked_clients()
-    client_lower = client.lower()
-
-    for pattern in blocked_clients:
-        try:
-            if re.search(pattern.lower(), client_lower):
-                return True
-        except re.error as e:
-            LOGGER.error(f"正则表达式错误: {pattern} - {str(e)}")
-            continue
-
-    return False
+    return (await get_client_matcher()).is_blocked(client)
 
 
 async def log_blocked_request(
@@ -93,34 +112,100 @@ async def log_blocked_request(
         LOGGER.error(f"记录拦截请求失败: {str(e)}")
 
 
-async def terminate_blocked_session(session_id: str, client_name: str) -> bool:
-    """终止被拦截的会话"""
+async def terminate_blocked_session(session_id: str, client_name: str, server_id: str = None,
+                                    emby_id: str = None) -> bool:
+    """终止被拦截的会话（优先发往会话所在服务器，未知时依次尝试所有服务器）"""
     try:
         reason = f"检测到可疑客户端: {client_name}"
-
-        # 多服务器适配：遍历所有服务器尝试终止会话
-        all_servers = emby_manager.get_all_servers()
-        success = False
-        for server_id, emby_service in all_servers.items():
-            try:
-                if await emby_service.terminate_session(session_id, reason):
-                    success = True
-                    LOGGER.info(f"成功在服务器 {server_id} 终止可疑会话 {session_id}")
-                    break
-            except Exception as e:
-                LOGGER.debug(f"服务器 {server_id} 终止会话失败: {e}")
-
-        if not success:
+        owner = await emby_manager.terminate_session(session_id, reason, server_id=server_id, emby_id=emby_id)
+        if owner:
+            LOGGER.info(f"成功在服务器 {owner} 终止可疑会话 {session_id}")
+        else:
             LOGGER.error(f"所有服务器终止会话失败 {session_id}")
-        return success
+        return owner is not None
     except Exception as e:
         LOGGER.error(f"终止会话异常 {session_id}: {str(e)}")
         return False
 
 
+def _session_key(webhook_data: dict):
+    """(服务器, 会话) 键，没有会话 ID 时返回 None"""
+    session_id = (webhook_data.get("Session") or {}).get("Id")
+    if not session_id:
+        return None
+    return (webhook_data.get("Server") or {}).get("Id", ""), session_id
+
+
+async def _process_client_filter(server_id, webhook_data: dict):
+    """处理一个客户端拦截事件（在 Webhook 队列的工作协程中执行）"""
+    event = webhook_data.get("Event", "")
+    # 获取会话信息
+    session_info = webhook_data.get("Session", {})
+    user_info = webhook_data.get("User", {})
+    user_name = user_info.get("Name", "")
+    emby_id = user_info.get("Id", "")
+    session_id = session_info.get("Id", "")
+    client_name = session_info.get("Client", "")
+
+    # 检查Client是否被拦截，并记录到会话表
+    key = _session_key(webhook_data)
+    pattern = (await get_client_matcher()).match(client_name)
+    if key is not None:
+        _sessions.set(key, pattern)
+    if pattern is None:
+        return
+    # 同一会话只处置一次：终止、封禁、通知
+    if key is not None and not _sessions.claim(key):
+        return
+
+    # 根据配置决定是否终止会话
+    if getattr(config, "client_filter_terminate_session", True):
+        await terminate_blocked_session(session_id, client_name, server_id=server_id, emby_id=emby_id)
+    block_success = False
+
+    user_details = await sql_get_emby_by_embyid.aio(emby_id)
+    if getattr(config, "client_filter_block_user", False):
+        # 多服务器适配：直接发往该用户所在服务器，未知时依次尝试所有服务器
+        owner = await emby_manager.change_policy(emby_id, disable=True, server_id=server_id, session_id=session_id)
+        block_success = owner is not None
+        if not block_success:
+            LOGGER.warning(f"所有服务器封禁用户失败 {user_name}({emby_id})")
+
+        if block_success:
+            if user_details:
+                await sql_update_emby.aio(Emby.tg == user_details.tg, lv="c")
+
+    # 记录拦截信息
+    await log_blocked_request(
+        user_id=emby_id,
+        user_name=user_name,
+        session_id=session_id,
+        client_name=client_name,
+        tg_id=user_details.tg if user_details else None,
+        block_success=block_success,
+    )
+    LOGGER.debug(f"客户端拦截事件处理完成: {event} {client_name}")
+
+
+webhook_queue.register("client_filter", _process_client_filter, workers=config.webhook_queue.client_filter_workers)
+
+
+@router.post("/webhook/{server_id}/client-filter")
+async def handle_client_filter_webhook_with_server(server_id: str, request: Request):
+    """处理Emby用户代理拦截webhook（带 server_id，拦截操作直接发往该服务器）"""
+    if not config.get_server_by_id(server_id):
+        return {"status": "error", "message": f"Invalid server_id: {server_id}"}
+    return await _accept_client_filter(server_id, request)
+
+
 @router.post("/webhook/client-filter")
 async def handle_client_filter_webhook(request: Request):
-    """处理Emby用户代理拦截webhook"""
+    """兼容旧路由（不带 server_id），按 Webhook 中的 Emby 服务器 Id 反查，建议迁移到 /webhook/{server_id}/client-filter"""
+    return await _accept_client_filter(None, request)
+
+
+async def _accept_client_filter(server_id, request: Request):
+    """处理Emby用户代理拦截webhook：校验后入队，立即返回 202"""
     try:
         # 检查Content-Type
         content_type = request.headers.get("content-type", "").lower()
@@ -137,6 +222,12 @@ async def handle_client_filter_webhook(request: Request):
         if not webhook_data:
             return {"status": "error", "message": "No data received"}
 
+        # 记录会话/用户归属，旧路由按 Emby 服务器 Id 反查
+        if server_id:
+            emby_manager.note_webhook(server_id, webhook_data)
+        else:
+            server_id = emby_manager.server_of_webhook(webhook_data)
+
         # 获取事件类型
         event = webhook_data.get("Event", "")
 
@@ -148,6 +239,7 @@ async def handle_client_filter_webhook(request: Request):
             "playback.progress",
             "playback.stop",
             "session.start",
+            "session.end",
         ]:
             return {
                 "status": "ignored",
@@ -155,79 +247,43 @@ async def handle_client_filter_webhook(request: Request):
                 "event": event,
             }
 
-        # 获取会话信息
+        # 跨服务器并发限制：开始 / 结束事件即时计数
+        if config.stream_limit.status:
+            stream_limiter.on_webhook(server_id, event, webhook_data)
+
+        key = _session_key(webhook_data)
+        if event == "session.end":
+            if key is not None:
+                _sessions.end(key, grace=False)
+            return {"status": "ended", "event": event}
+
         session_info = webhook_data.get("Session", {})
-        user_info = webhook_data.get("User", {})
-        user_name = user_info.get("Name", "")
-        emby_id = user_info.get("Id", "")
-        session_id = session_info.get("Id", "")
         client_name = session_info.get("Client", "")
-
         if not client_name:
             return {"status": "ignored", "message": "No Client info found"}
 
-        # 检查Client是否被拦截
-        is_blocked = await is_client_blocked(client_name)
-
-        if is_blocked:
-            # 根据配置决定是否终止会话
-            if getattr(config, "client_filter_terminate_session", True):
-                await terminate_blocked_session(session_id, client_name)
-            block_success = False
-
-            user_details = sql_get_emby(emby_id)
-            if getattr(config, "client_filter_block_user", False):
-                # 多服务器适配：根据用户数据定位服务器，或遍历所有服务器
-                if user_details and user_details.tg:
-                    emby_service, server_config, user_obj = get_user_emby_service(user_details.tg)
-                    if emby_service:
-                        block_success = await emby_service.emby_change_policy(emby_id=emby_id, disable=True)
-                    else:
-                        LOGGER.warning(f"无法定位用户 {user_details.name} 的服务器")
-                else:
-                    # 用户不在数据库中，遍历所有服务器尝试封禁
-                    all_servers = emby_manager.get_all_servers()
-                    for server_id, emby_service in all_servers.items():
-                        try:
-                            if await emby_service.emby_change_policy(emby_id=emby_id, disable=True):
-                                block_success = True
-                                break
-                        except Exception as e:
-                            LOGGER.debug(f"服务器 {server_id} 封禁用户失败: {e}")
-
-                if block_success:
-                    if user_details:
-                        sql_update_emby(Emby.tg == user_details.tg, lv="c")
-
-            # 记录拦截信息
-            await log_blocked_request(
-                user_id=emby_id,
-                user_name=user_name,
-                session_id=session_id,
-                client_name=client_name,
-                tg_id=user_details.tg if user_details else None,
-                block_success=block_success,
-            )
-
-            return {
-                "status": "blocked",
-                "message": "Client blocked",
-                "data": {
-                    "user_id": emby_id,
-                    "user_name": user_name,
-                    "session_id": session_id,
-                    "client_name": client_name,
-                    "user_details": user_details,
-                    "event": event,
-                    "timestamp": datetime.now().isoformat(),
-                },
-            }
-
-        return {
-            "status": "allowed",
-            "message": "Client allowed",
-            "data": {"client": client_name, "user_id": emby_id, "event": event},
-        }
+        # 已判定过的会话：放行或已处置的直接返回，不再入队（先确认规则未变化）
+        await get_client_matcher()
+        known = _sessions.get(key) if key is not None else None
+        if event == "playback.stop" and key is not None:
+            _sessions.end(key)
+        if known is not None and (not known.blocked or known.actioned):
+            return JSONResponse(status_code=202, content={
+                "status": "blocked" if known.blocked else "allowed",
+                "data": {"client": client_name, "event": event, "cached": True},
+            })
+
+        # 播放进度事件非常频繁：同一会话只保留最新一条，队列满时丢弃
+        progress = event == "playback.progress"
+        result = webhook_queue.submit(
+            "client_filter", webhook_data, server_id=server_id,
+            merge_key=f"{session_info.get('Id', '')}:{client_name}" if progress else None,
+            droppable=progress,
+        )
+        return JSONResponse(status_code=202, content={
+            "status": result,
+            "data": {"client": client_name, "user_id": webhook_data.get("User", {}).get("Id", ""), "event": event},
+        })
 
     except Exception as e:
         LOGGER.error(f"处理Client拦截webhook失败: {str(e)}")
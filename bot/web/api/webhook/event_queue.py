@@ -0,0 +1,253 @@
+"""
+Webhook 事件接入队列
+- 路由只做解析与校验，事件入队后立即返回 202，由后台工作协程处理
+- 每类事件一个有界队列，并发数独立配置
+- 同一会话的 playback.progress 等事件在队列中合并为最新一条，队列满时直接丢弃
+- 队列满时其余事件先缓存在内存，由回填任务在线程中写入溢出文件，空闲后回填（队列中已有同键的新事件时丢弃旧的溢出事件）；
+  进程退出时排队中、处理中与尚未写盘的事件也写入该文件，重启后继续处理（处理中的事件可能重复处理一次）
+
+本模块不依赖 bot 包，便于单独测试
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+# 事件处理函数：(server_id, webhook_data) -> 任意结果
+Handler = Callable[[Optional[str], dict], Awaitable[Any]]
+
+# 回填检查间隔（秒）
+_REFILL_INTERVAL = 2
+
+
+class _Event:
+    __slots__ = ('kind', 'server_id', 'data', 'merge_key', 'droppable')
+
+    def __init__(self, kind: str, server_id: Optional[str], data: dict, merge_key: Optional[str],
+                 droppable: bool):
+        self.kind = kind
+        self.server_id = server_id
+        self.data = data
+        self.merge_key = merge_key
+        self.droppable = droppable
+
+    def to_json(self) -> str:
+        return json.dumps({'kind': self.kind, 'server_id': self.server_id, 'data': self.data,
+                           'merge_key': self.merge_key, 'droppable': self.droppable}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> '_Event':
+        raw = json.loads(line)
+        return cls(raw['kind'], raw.get('server_id'), raw['data'], raw.get('merge_key'), raw.get('droppable', False))
+
+
+class _Lane:
+    """单类事件的队列与统计"""
+
+    def __init__(self, handler: Handler, workers: int, maxsize: int):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.queue: Deque[_Event] = deque()
+        self.pending: Dict[str, _Event] = {}
+        # 已出队、处理尚未结束的事件
+        self.inflight: Set[_Event] = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.tasks = []
+        self.stats = {'accepted': 0, 'processed': 0, 'failed': 0, 'merged': 0, 'dropped': 0, 'spilled': 0}
+
+    @property
+    def full(self) -> bool:
+        return len(self.queue) >= self.maxsize
+
+
+class WebhookQueue:
+    """
+    Webhook 事件调度器
+    各路由模块导入时 register 自己的处理函数，Web 服务启动后 start 工作协程
+    """
+
+    def __init__(self, maxsize: int, spill_path: str, logger: Any = None):
+        self.maxsize = maxsize
+        self.spill_path = spill_path
+        # loguru 或标准库 logging 的日志对象
+        self.logger = logger or logging.getLogger(__name__)
+        self._lanes: Dict[str, _Lane] = {}
+        # 已溢出、尚未写入文件的事件；文件读写只在回填任务的线程中进行，不阻塞事件循环
+        self._overflow: List[_Event] = []
+        self._refill_task: Optional[asyncio.Task] = None
+        atexit.register(self._persist)
+
+    # ==================== 对外接口 ====================
+
+    def register(self, kind: str, handler: Handler, workers: int = 1):
+        """注册一类事件的处理函数与并发数"""
+        self._lanes[kind] = _Lane(handler, workers, self.maxsize)
+
+    def start(self):
+        """启动所有工作协程与溢出文件回填（需在事件循环中调用）"""
+        for kind, lane in self._lanes.items():
+            if lane.wakeup is None:
+                lane.wakeup = asyncio.Event()
+            lane.tasks = [t for t in lane.tasks if not t.done()]
+            for _ in range(lane.workers - len(lane.tasks)):
+                lane.tasks.append(asyncio.create_task(self._worker(kind, lane)))
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    def submit(self, kind: str, data: dict, server_id: str = None, merge_key: str = None,
+               droppable: bool = False) -> str:
+        """
+        提交一个事件
+
+        Args:
+            kind: 事件类别（register 时的名称）
+            data: Webhook 原始数据
+            server_id: 服务器 ID
+            merge_key: 合并键，队列中已有同键事件时用新数据替换旧数据
+            droppable: 队列满时是否可以直接丢弃（如播放进度）
+
+        Returns:
+            queued / merged / dropped / spilled
+        """
+        lane = self._lanes[kind]
+        if merge_key is not None:
+            queued = lane.pending.get(merge_key)
+            if queued is not None:
+                queued.data = data
+                lane.stats['merged'] += 1
+                return 'merged'
+        event = _Event(kind, server_id, data, merge_key, droppable)
+        if lane.full:
+            if droppable:
+                lane.stats['dropped'] += 1
+                return 'dropped'
+            self._overflow.append(event)
+            lane.stats['spilled'] += 1
+            return 'spilled'
+        self._enqueue(lane, event)
+        lane.stats['accepted'] += 1
+        return 'queued'
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        return {kind: {'depth': len(lane.queue), **lane.stats} for kind, lane in self._lanes.items()}
+
+    def metrics_text(self) -> str:
+        """一行文字的队列状态，供状态命令展示"""
+        parts = [f"{kind} {len(lane.queue)}/{lane.stats['processed']}" for kind, lane in self._lanes.items()]
+        dropped = sum(lane.stats['dropped'] for lane in self._lanes.values())
+        spilled = sum(lane.stats['spilled'] for lane in self._lanes.values())
+        return f"{' | '.join(parts)}（积压/已处理） | 丢弃 {dropped} | 溢出 {spilled}"
+
+    # ==================== 调度 ====================
+
+    def _enqueue(self, lane: _Lane, event: _Event):
+        lane.queue.append(event)
+        if event.merge_key is not None:
+            lane.pending[event.merge_key] = event
+        if lane.wakeup is not None:
+            lane.wakeup.set()
+
+    async def _worker(self, kind: str, lane: _Lane):
+        while True:
+            while not lane.queue:
+                lane.wakeup.clear()
+                await lane.wakeup.wait()
+            event = lane.queue.popleft()
+            if event.merge_key is not None and lane.pending.get(event.merge_key) is event:
+                del lane.pending[event.merge_key]
+            lane.inflight.add(event)
+            try:
+                await lane.handler(event.server_id, event.data)
+                lane.stats['processed'] += 1
+            except Exception as e:
+                lane.stats['failed'] += 1
+                self.logger.error(f"【Webhook队列】{kind} 事件处理失败: {e}")
+            finally:
+                lane.inflight.discard(event)
+
+    async def _refill_loop(self):
+        while True:
+            await asyncio.sleep(_REFILL_INTERVAL)
+            try:
+                await self._refill()
+            except Exception as e:
+                self.logger.error(f"【Webhook队列】回填溢出事件失败: {e}")
+
+    async def _refill(self):
+        """把内存中的溢出事件追加到文件，再把文件中的事件放回有空位的队列，放不下的写回文件"""
+        if self._overflow:
+            events, self._overflow = self._overflow, []
+            try:
+                await asyncio.to_thread(self._spill, events)
+            except Exception:
+                self._overflow[:0] = events
+                raise
+        lines = await asyncio.to_thread(self._read_spill)
+        if not lines:
+            return
+        remain, restored, stale = [], 0, 0
+        refilled: Set[_Event] = set()
+        for line in lines:
+            try:
+                event = _Event.from_json(line)
+            except (ValueError, KeyError):
+                self.logger.warning(f"【Webhook队列】溢出文件中有无法解析的记录，已跳过: {line[:100]}")
+                continue
+            lane = self._lanes.get(event.kind)
+            queued = lane.pending.get(event.merge_key) if lane and event.merge_key is not None else None
+            if queued is not None:
+                # 合并不占队列空位，先于容量判断，避免同键的新数据留在文件里、下一轮被当作过时丢弃：
+                # 文件内靠后的更新合并到本轮刚恢复的同键事件；
+                # 实时入队的同键事件比溢出事件新（溢出时队列中没有同键事件），旧的溢出事件不再处理
+                if queued in refilled:
+                    queued.data = event.data
+                else:
+                    stale += 1
+                lane.stats['merged'] += 1
+                continue
+            # 队列保留一半空位给实时事件
+            if lane is None or len(lane.queue) >= lane.maxsize // 2:
+                remain.append(line if line.endswith('\n') else line + '\n')
+                continue
+            self._enqueue(lane, event)
+            refilled.add(event)
+            restored += 1
+        await asyncio.to_thread(self._rewrite_spill, remain)
+        if restored or stale:
+            self.logger.info(f"【Webhook队列】从溢出文件恢复 {restored} 个事件，丢弃已过时的 {stale} 个，剩余 {len(remain)} 个")
+
+    def _read_spill(self) -> List[str]:
+        if not os.path.exists(self.spill_path):
+            return []
+        with open(self.spill_path, 'r', encoding='utf-8') as f:
+            return [line for line in f if line.strip()]
+
+    def _rewrite_spill(self, remain: List[str]):
+        if remain:
+            with open(self.spill_path, 'w', encoding='utf-8') as f:
+                f.writelines(remain)
+        else:
+            os.remove(self.spill_path)
+
+    def _spill(self, events):
+        os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(event.to_json() + '\n')
+
+    def _persist(self):
+        """进程退出时把处理中、排队中与尚未写盘的溢出事件写入溢出文件，按先后顺序（处理中的在前）"""
+        events = [event for lane in self._lanes.values() for event in (*lane.inflight, *lane.queue)]
+        events.extend(self._overflow)
+        if not events:
+            return
+        try:
+            self._spill(events)
+            self.logger.info(f"【Webhook队列】退出前保存 {len(events)} 个未处理事件")
+        except Exception as e:
+            self.logger.error(f"【Webhook队列】保存未处理事件失败: {e}")
+
@@ -0,0 +1,9 @@
+"""
+Webhook 事件接入队列
+调度逻辑在 event_queue 中，这里按配置创建全局实例，各路由模块导入时注册处理函数
+"""
+from bot import LOGGER, config
+from bot.web.api.webhook.event_queue import WebhookQueue
+
+webhook_queue = WebhookQueue(maxsize=config.webhook_queue.max_queue, spill_path=config.webhook_queue.spill_path,
+                             logger=LOGGER)
@@ -1,25 +1,21 @@
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 from bot.sql_helper.sql_emby import Emby
 from bot.sql_helper.sql_favorites import EmbyFavorites
 from bot.sql_helper.sql_server_bindings import EmbyServerBinding
 from bot.sql_helper import Session
 from bot.func_helper.emby_manager import emby_manager
-from bot import LOGGER, bot, config
+from bot.func_helper.outbox import outbox
+from bot.web.api.webhook.ingest import webhook_queue
+from bot import LOGGER, config
 import json
 
 router = APIRouter()
 
 async def send_update_notification_to_user(tg_id: int, message: str):
-    """发送通知到指定用户"""
-    try:
-        await bot.send_message(
-            chat_id=tg_id,
-            text=message
-        )
-        return True
-    except Exception as e:
-        LOGGER.error(f"发送通知失败: {str(e)}")
-        return False
+    """发送通知到指定用户（进入出站队列的群发通道，限速与 FloodWait 由队列处理）"""
+    outbox.put(tg_id, message)
+    return True
 
 async def check_and_notify_series_update(server_id: str, item_data: dict):
     """检查并通知剧集更新（按 server_id）"""
@@ -163,9 +159,23 @@ async def _parse_request(request: Request):
         return None
 
 
+async def _process_media_event(server_id: str, webhook_data: dict):
+    """处理一个媒体库新增事件（在 Webhook 队列的工作协程中执行）"""
+    item_data = webhook_data.get("Item", {})
+    if item_data.get("Type", "") == "Episode":
+        # 处理剧集更新
+        await check_and_notify_series_update(server_id, item_data)
+    else:
+        # 处理新电影或新剧集
+        await send_new_media_notification(server_id, item_data)
+
+
+webhook_queue.register("media", _process_media_event, workers=config.webhook_queue.media_workers)
+
+
 @router.post("/webhook/{server_id}/medias")
 async def handle_media_webhook_with_server(server_id: str, request: Request):
-    """处理Emby媒体库更新（带 server_id）"""
+    """处理Emby媒体库更新（带 server_id）：校验后入队，立即返回 202"""
     try:
         # 校验 server_id 合法
         if not config.get_server_by_id(server_id):
@@ -177,52 +187,30 @@ async def handle_media_webhook_with_server(server_id: str, request: Request):
                 "status": "error",
                 "message": "No data received"
             }
+        emby_manager.note_webhook(server_id, webhook_data)
             
         event = webhook_data.get("Event", "")
         item_data = webhook_data.get("Item", {})
-        
-        # 处理新增媒体事件
-        if event in ["item.added", "library.new"]:
-            # 检查媒体类型
-            item_type = item_data.get("Type", "")
-            
-            if item_type == "Episode":
-                # 处理剧集更新
-                await check_and_notify_series_update(server_id, item_data)
-                return {
-                    "status": "success",
-                    "message": "Episode update notification sent",
-                    "data": {
-                        "type": item_type,
-                        "name": item_data.get("Name"),
-                        "series": item_data.get("SeriesName"),
-                        "event": event
-                    }
-                }
-            elif item_type in ["Movie", "Series"]:
-                # 处理新电影或新剧集
-                await send_new_media_notification(server_id, item_data)
-                return {
-                    "status": "success",
-                    "message": "New media notification sent",
-                    "data": {
-                        "type": item_type,
-                        "name": item_data.get("Name"),
-                        "event": event
-                    }
-                }
-                
+        item_type = item_data.get("Type", "")
+
+        # 只处理新增媒体事件
+        if event not in ["item.added", "library.new"] or item_type not in ["Episode", "Movie", "Series"]:
             return {
                 "status": "ignored",
                 "message": "Not a new media event",
                 "event": event
             }
-                
-        return {
-            "status": "ignored",
-            "message": "Not a new media event",
-            "event": event
-        }
+
+        result = webhook_queue.submit("media", webhook_data, server_id=server_id)
+        return JSONResponse(status_code=202, content={
+            "status": result,
+            "data": {
+                "type": item_type,
+                "name": item_data.get("Name"),
+                "series": item_data.get("SeriesName"),
+                "event": event
+            }
+        })
                 
     except Exception as e:
         LOGGER.error(f"处理媒体库更新失败: {str(e)}")
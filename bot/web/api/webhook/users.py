@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from bot.func_helper.emby_manager import emby_manager
+from bot.web.api.webhook.ingest import webhook_queue
+from bot import LOGGER, config
+import json
+
+router = APIRouter()
+
+# 会改变用户目录的 Emby 事件
+USER_EVENTS = ["user.created", "user.deleted", "user.policyupdated", "user.lockedout"]
+
+
+async def _parse_request(request: Request):
+    """解析 webhook 请求体"""
+    try:
+        content_type = request.headers.get("content-type", "").lower()
+        if "application/json" in content_type:
+            return await request.json()
+        else:
+            form_data = await request.form()
+            form = dict(form_data)
+            return json.loads(form["data"]) if "data" in form else None
+    except Exception as e:
+        LOGGER.error(f"解析用户 Webhook 失败: {str(e)}")
+        return None
+
+
+async def _process_user_event(server_id: str, webhook_data: dict):
+    """处理一个用户增删改事件，即时更新用户目录（在 Webhook 队列的工作协程中执行）"""
+    emby_service = emby_manager.get_server(server_id)
+    if not emby_service:
+        return
+    event = webhook_data.get("Event", "")
+    user_data = webhook_data.get("User", {})
+    emby_id = user_data.get("Id")
+    if event == "user.deleted":
+        emby_service.directory.remove(emby_id)
+    else:
+        # Webhook 中的 User 不一定带 Policy，重新拉取一次
+        await emby_service.directory.refresh_user(emby_id)
+    LOGGER.debug(f"【用户目录】{server_id} 处理事件 {event}: {user_data.get('Name')}")
+
+
+webhook_queue.register("users", _process_user_event, workers=config.webhook_queue.users_workers)
+
+
+@router.post("/webhook/{server_id}/users")
+async def handle_user_webhook_with_server(server_id: str, request: Request):
+    """处理Emby用户增删改事件（带 server_id）：校验后入队，立即返回 202"""
+    try:
+        # 校验 server_id 合法
+        emby_service = emby_manager.get_server(server_id)
+        if not config.get_server_by_id(server_id) or not emby_service:
+            return {"status": "error", "message": f"Invalid server_id: {server_id}"}
+
+        webhook_data = await _parse_request(request)
+        if not webhook_data:
+            return {"status": "error", "message": "No data received"}
+        emby_manager.note_webhook(server_id, webhook_data)
+
+        event = webhook_data.get("Event", "")
+        user_data = webhook_data.get("User", {})
+        emby_id = user_data.get("Id")
+        if event not in USER_EVENTS or not emby_id:
+            return {"status": "ignored", "message": "Not a user event", "event": event}
+
+        # 同一用户的多次变更只需刷新一次
+        result = webhook_queue.submit("users", webhook_data, server_id=server_id,
+                                      merge_key=f"{server_id}:{emby_id}" if event != "user.deleted" else None)
+        return JSONResponse(status_code=202, content={
+            "status": result,
+            "data": {"user_id": emby_id, "name": user_data.get("Name"), "event": event}
+        })
+
+    except Exception as e:
+        LOGGER.error(f"处理用户 Webhook 失败: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+
+@router.post("/webhook/users")
+async def handle_user_webhook_legacy(request: Request):
+    """默认 main 服务器，建议使用 /webhook/{server_id}/users"""
+    return await handle_user_webhook_with_server("main", request)
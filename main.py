@@ -1,7 +1,11 @@
 #! /usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from bot import bot
+from bot import bot, config
+from bot.ranks_helper.render import start_render_pool
+
+# 渲染进程需在其他模块启动线程之前 fork
+start_render_pool(config.ranks.render_workers)
 
 # 面板
 from bot.modules.panel import *
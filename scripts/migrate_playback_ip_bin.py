@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+为播放记录镜像表 emby_playback_activity 添加 ip_bin 列（IP 的 16 字节整数）并回填历史数据，
+/auditip 的网段（CIDR）与 IPv6 查询依赖该列上的 (server_id, ip_bin) 索引。
+
+新部署由程序启动时建表，无需执行；已有镜像表的部署执行一次即可（可重复执行）：
+    python3 scripts/migrate_playback_ip_bin.py
+
+选项：
+  --batch-size   每批回填的行数（默认 50000）
+  --dry-run      仅统计待回填的行数，不实际写库
+"""
+import argparse
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from loguru import logger
+from sqlalchemy import text
+
+from bot.sql_helper import engine
+
+TABLE = "emby_playback_activity"
+
+# IPv4 存为 IPv4 映射的 IPv6 地址（::ffff:a.b.c.d），与 bot/func_helper/ip_range.py 的编码一致
+BACKFILL_SQL = f"""
+    UPDATE {TABLE}
+    SET ip_bin = CASE
+        WHEN IS_IPV4(remote_address) THEN CONCAT(UNHEX('00000000000000000000FFFF'), INET6_ATON(remote_address))
+        WHEN IS_IPV6(remote_address) THEN INET6_ATON(remote_address)
+    END
+    WHERE ip_bin IS NULL AND remote_address <> '' AND (IS_IPV4(remote_address) OR IS_IPV6(remote_address))
+    LIMIT :limit
+"""
+
+
+def get_columns() -> list:
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(f"DESCRIBE {TABLE}"))]
+
+
+def add_ip_bin_column() -> bool:
+    """添加 ip_bin 列与索引"""
+    try:
+        columns = get_columns()
+    except Exception as e:
+        logger.error(f"检查表结构失败（镜像表尚未创建时无需迁移）: {e}")
+        return False
+
+    with engine.connect() as conn:
+        if 'ip_bin' in columns:
+            logger.info("✅ ip_bin 列已存在")
+        else:
+            conn.execute(text(f"""
+                ALTER TABLE {TABLE}
+                ADD COLUMN ip_bin VARBINARY(16) NULL
+                COMMENT '来源 IP 的 16 字节整数（IPv4 映射为 ::ffff:a.b.c.d），用于网段查询'
+                AFTER remote_address
+            """))
+            conn.commit()
+            logger.info("✅ ip_bin 列添加成功")
+
+        try:
+            conn.execute(text(f"CREATE INDEX idx_playback_server_ipbin ON {TABLE}(server_id, ip_bin)"))
+            conn.commit()
+            logger.info("✅ 索引 idx_playback_server_ipbin 创建成功")
+        except Exception:
+            logger.warning("⚠️  索引 idx_playback_server_ipbin 可能已存在，跳过")
+    return True
+
+
+def count_pending() -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            f"SELECT COUNT(*) FROM {TABLE} WHERE ip_bin IS NULL AND remote_address <> ''"
+        )).scalar() or 0
+
+
+def backfill(batch_size: int) -> int:
+    """分批回填，避免单个大事务长时间锁表"""
+    total = 0
+    with engine.connect() as conn:
+        while True:
+            updated = conn.execute(text(BACKFILL_SQL), {"limit": batch_size}).rowcount
+            conn.commit()
+            total += updated
+            if updated:
+                logger.info(f"已回填 {total} 行")
+            if updated < batch_size:
+                return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为播放记录镜像表添加并回填 ip_bin 列")
+    parser.add_argument("--batch-size", type=int, default=50000, help="每批回填的行数")
+    parser.add_argument("--dry-run", action="store_true", help="仅统计，不写入")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        try:
+            columns = get_columns()
+        except Exception as e:
+            logger.error(f"检查表结构失败: {e}")
+            return 1
+        if 'ip_bin' not in columns:
+            logger.info("ip_bin 列不存在，执行迁移时将添加该列并回填全部记录")
+            return 0
+        logger.info(f"（dry-run）待回填 {count_pending()} 行")
+        return 0
+
+    if not add_ip_bin_column():
+        return 1
+    try:
+        total = backfill(max(args.batch_size, 1))
+    except Exception as e:
+        logger.error(f"回填 ip_bin 失败: {e}")
+        return 1
+
+    logger.success(f"迁移完成：回填 {total} 行，无法解析为 IP 的记录 {count_pending()} 行保持为空")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+客户端拦截匹配器测试
+验证子串快速路径、合并正则、结果缓存与命中统计与逐条 re.search 的结果一致，
+以及会话判定表的过期与一次性处置
+（不需要 bot 依赖，直接加载 bot/func_helper/client_matcher.py）
+"""
+
+import importlib.util
+import os
+import re
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("client_matcher", "bot/func_helper/client_matcher.py")
+client_matcher = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(client_matcher)
+ClientMatcher = client_matcher.ClientMatcher
+SessionVerdicts = client_matcher.SessionVerdicts
+
+PATTERNS = [r".*curl.*", r".*python.*", r".*youtube-dl.*", r"^vlc/\d+", r".*spider.*", r".*(wget|aria2).*"]
+CLIENTS = ["curl/8.1", "Python-urllib/3.11", "Emby Web", "youtube-dl", "VLC/3.0", "vlc player",
+           "Infuse-Direct", "Aria2/1.36", "Wget/1.21", "Googlebot Spider", ""]
+
+
+def _reference(client):
+    """原实现：逐条小写 re.search"""
+    for pattern in PATTERNS:
+        if client and re.search(pattern.lower(), client.lower()):
+            return True
+    return False
+
+
+def test_same_verdicts_as_reference():
+    """判定结果与逐条匹配一致"""
+    print("\n🧪 测试判定结果...")
+    matcher = ClientMatcher(PATTERNS)
+    for client in CLIENTS:
+        assert matcher.is_blocked(client) == _reference(client), client
+    print("✅ 判定结果一致")
+
+
+def test_literal_fast_path():
+    """首尾 .* 的纯文本规则走子串判断，其余进合并正则"""
+    print("\n🧪 测试子串快速路径...")
+    matcher = ClientMatcher(PATTERNS)
+    assert [p for _, p in matcher._literals] == [r".*curl.*", r".*python.*", r".*youtube-dl.*", r".*spider.*"]
+    assert matcher._regex_patterns == [r"^vlc/\d+", r".*(wget|aria2).*"]
+    print("✅ 规则分类正确")
+
+
+def test_numeric_backref_kept_separate():
+    """按编号引用分组的规则不进合并正则，合并后仍能正确匹配"""
+    print("\n🧪 测试编号反向引用...")
+    patterns = [r"^(ab)\1$", r"^vlc/\d+", r".*(wget|aria2).*"]
+    matcher = ClientMatcher(patterns)
+    assert matcher._regex_patterns == [r"^vlc/\d+", r".*(wget|aria2).*"]
+    assert [p for _, p in matcher._regex_list] == [r"^(ab)\1$"]
+    assert matcher.match("abab") == r"^(ab)\1$"
+    assert matcher.match("abba") is None
+    assert matcher.match("Wget/1.21") == r".*(wget|aria2).*"
+    print("✅ 编号反向引用正确")
+
+
+def test_cache_and_counts():
+    """重复客户端命中缓存，命中次数按规则累计"""
+    print("\n🧪 测试缓存与统计...")
+    matcher = ClientMatcher(PATTERNS, cache_size=2)
+    for _ in range(3):
+        matcher.match("curl/8.1")
+    matcher.match("Aria2/1.36")
+    assert matcher.hits == 2 and matcher.misses == 2
+    assert matcher.counts[r".*curl.*"] == 3
+    assert matcher.counts[r".*(wget|aria2).*"] == 1
+    assert matcher.top(1) == [(r".*curl.*", 3)]
+    matcher.match("Emby Web")
+    assert len(matcher._cache) == 2
+    print("✅ 缓存与统计正确")
+
+
+def test_invalid_pattern_and_reload():
+    """无效正则被跳过；新实例继承相同规则的命中次数"""
+    print("\n🧪 测试无效规则与重新加载...")
+    matcher = ClientMatcher([r".*curl.*", r"([bad"])
+    assert matcher.invalid and matcher.invalid[0][0] == r"([bad"
+    matcher.match("curl")
+    reloaded = ClientMatcher([r".*curl.*", r".*wget.*"], counts=matcher.counts)
+    assert reloaded.counts == {r".*curl.*": 1, r".*wget.*": 0}
+    print("✅ 无效规则与重新加载正确")
+
+
+def test_session_claimed_once():
+    """被拦截的会话只能被处置一次，放行的会话不能处置"""
+    print("\n🧪 测试会话一次性处置...")
+    sessions = SessionVerdicts()
+    sessions.set(('s1', 'a'), r".*curl.*")
+    sessions.set(('s1', 'b'), None)
+    assert sessions.claim(('s1', 'a'))
+    assert not sessions.claim(('s1', 'a'))
+    assert not sessions.claim(('s1', 'b'))
+    # 重复判定不会重置处置状态
+    sessions.set(('s1', 'a'), r".*curl.*")
+    assert not sessions.claim(('s1', 'a'))
+    assert sessions.get(('s1', 'a')).actioned
+    print("✅ 一次性处置正确")
+
+
+def test_session_expiry():
+    """事件续期；playback.stop 后只保留宽限期；session.end 立即删除；超量淘汰最旧"""
+    print("\n🧪 测试会话过期...")
+    now = [0.0]
+    sessions = SessionVerdicts(ttl=100, end_grace=10, maxsize=2)
+    sessions._clock = lambda: now[0]
+    sessions.set(('s', 'a'), None)
+    now[0] = 90
+    assert sessions.get(('s', 'a')) is not None
+    now[0] = 180
+    assert sessions.get(('s', 'a')) is not None, "事件应续期"
+    sessions.end(('s', 'a'))
+    now[0] = 185
+    assert sessions.get(('s', 'a')) is not None, "宽限期内保留"
+    now[0] = 191
+    assert sessions.get(('s', 'a')) is None, "宽限期后过期"
+    sessions.set(('s', 'b'), None)
+    sessions.end(('s', 'b'), grace=False)
+    assert sessions.get(('s', 'b')) is None
+    for sid in ('c', 'd', 'e'):
+        sessions.set(('s', sid), None)
+    assert len(sessions) == 2 and sessions.get(('s', 'c')) is None
+    print("✅ 会话过期正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_same_verdicts_as_reference, test_literal_fast_path, test_numeric_backref_kept_separate,
+             test_cache_and_counts,
+             test_invalid_pattern_and_reload, test_session_claimed_once, test_session_expiry]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+全量语法检查：bot 包、main.py 与 scripts 必须能被当前解释器编译（不需要安装依赖）
+"""
+
+import compileall
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_bot_package_compiles():
+    assert compileall.compile_dir(os.path.join(ROOT, 'bot'), quiet=1)
+
+
+def test_entrypoints_compile():
+    assert compileall.compile_file(os.path.join(ROOT, 'main.py'), quiet=1)
+    assert compileall.compile_dir(os.path.join(ROOT, 'scripts'), quiet=1)
+
+
+if __name__ == '__main__':
+    test_bot_package_compiles()
+    test_entrypoints_compile()
+    print("✅ 编译检查通过")
+    sys.exit(0)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Emby 请求准入控制测试（AIMD 令牌桶与熔断器状态转换）
+（不需要 bot 依赖，直接加载 bot/func_helper/emby_guard.py）
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("emby_guard", "bot/func_helper/emby_guard.py")
+emby_guard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(emby_guard)
+
+
+class _Clock:
+    """替换模块内的 time，手动推进 monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _with_clock():
+    clock = _Clock()
+    emby_guard.time = clock
+    return clock
+
+
+def test_rate_aimd():
+    """成功时加性增长，慢请求与失败乘性下降，同一秒内只降一次，且不越过上下限"""
+    print("\n🧪 测试 AIMD 速率调整...")
+    clock = _with_clock()
+    limiter = emby_guard.AdaptiveRateLimiter(rate=10, min_rate=2, max_rate=11, burst=5, latency_target_ms=500)
+    limiter.on_success(0.1)
+    assert abs(limiter.rate - 10.1) < 1e-9
+    for _ in range(100):
+        limiter.on_success(0.1)
+    assert limiter.rate == 11
+
+    limiter.on_failure()
+    assert limiter.rate == 5.5
+    # 同一批并发失败只降一次
+    limiter.on_failure()
+    limiter.on_success(2.0)
+    assert limiter.rate == 5.5
+
+    clock.now += 1
+    limiter.on_success(2.0)
+    assert abs(limiter.rate - 3.85) < 1e-9
+    for _ in range(5):
+        clock.now += 1
+        limiter.on_failure()
+    assert limiter.rate == 2
+    print("✅ AIMD 速率调整正确")
+
+
+def test_bucket_burst_then_wait():
+    """令牌桶先放行 burst 个请求，之后按当前速率等待"""
+    print("\n🧪 测试令牌桶...")
+    clock = _with_clock()
+    limiter = emby_guard.AdaptiveRateLimiter(rate=4, min_rate=1, max_rate=10, burst=2, latency_target_ms=500)
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    async def main():
+        real_sleep = asyncio.sleep
+        asyncio.sleep = fake_sleep
+        try:
+            for _ in range(3):
+                await limiter.acquire()
+        finally:
+            asyncio.sleep = real_sleep
+
+    asyncio.run(main())
+    assert slept == [0.25]
+    print("✅ 令牌桶正确")
+
+
+def test_breaker_transitions():
+    """closed -> open -> half_open（只放行一个探测）-> closed / open"""
+    print("\n🧪 测试熔断状态转换...")
+    clock = _with_clock()
+    breaker = emby_guard.CircuitBreaker(failure_threshold=3, cooldown=30)
+    CB = emby_guard.CircuitBreaker
+    assert breaker.allow() == (True, False)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CB.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CB.OPEN
+    assert breaker.allow() == (False, False)
+    assert breaker.retry_after() == 30
+
+    clock.now += 30
+    assert breaker.allow() == (True, True)
+    assert breaker.state == CB.HALF_OPEN
+    assert breaker.allow() == (False, False)
+    # 探测失败重新熔断
+    breaker.record_failure()
+    assert breaker.state == CB.OPEN and breaker.retry_after() == 30
+
+    clock.now += 30
+    assert breaker.allow() == (True, True)
+    breaker.record_success()
+    assert breaker.state == CB.CLOSED and breaker.failures == 0
+    assert breaker.allow() == (True, False)
+    print("✅ 熔断状态转换正确")
+
+
+def test_probe_release():
+    """被取消的探测释放名额，下一个请求重新探测"""
+    print("\n🧪 测试探测名额释放...")
+    clock = _with_clock()
+    breaker = emby_guard.CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow() == (True, True)
+    assert breaker.allow() == (False, False)
+    breaker.release_probe()
+    assert breaker.allow() == (True, True)
+    assert emby_guard.guard_status(
+        emby_guard.AdaptiveRateLimiter(5, 1, 10, 5, 500), breaker
+    ) == {'breaker': 'half_open', 'failures': 1, 'retry_after': 0.0, 'rate': 5.0}
+    print("✅ 探测名额释放正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_rate_aimd, test_bucket_burst_then_wait, test_breaker_transitions, test_probe_release]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Webhook 事件队列测试（合并、丢弃与溢出、回填、退出持久化）
+（不需要 bot 依赖，直接加载 bot/web/api/webhook/event_queue.py）
+"""
+
+import asyncio
+import atexit
+import importlib.util
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("event_queue", "bot/web/api/webhook/event_queue.py")
+event_queue = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(event_queue)
+
+
+def _queue(spill_path: str, maxsize: int = 4):
+    """创建队列并注册一个记录处理结果的事件类别"""
+    queue = event_queue.WebhookQueue(maxsize=maxsize, spill_path=spill_path)
+    # 测试自行调用 _persist，不在解释器退出时写入已删除的临时目录
+    atexit.unregister(queue._persist)
+    handled = []
+
+    async def handler(server_id, data):
+        handled.append((server_id, data))
+
+    queue.register('media', handler)
+    return queue, handled
+
+
+def _drain(queue) -> list:
+    lane = queue._lanes['media']
+    events = list(lane.queue)
+    lane.queue.clear()
+    lane.pending.clear()
+    return [e.data for e in events]
+
+
+def test_merge_keeps_latest():
+    """同键事件在队列中合并为最新一条，只处理一次"""
+    print("\n🧪 测试同键合并...")
+    with tempfile.TemporaryDirectory() as tmp:
+        queue, handled = _queue(os.path.join(tmp, 'spill.jsonl'))
+
+        async def main():
+            assert queue.submit('media', {'pos': 1}, 'main', merge_key='s1') == 'queued'
+            assert queue.submit('media', {'pos': 2}, 'main', merge_key='s1') == 'merged'
+            assert queue.submit('media', {'pos': 9}, 'main', merge_key='s2') == 'queued'
+            queue.start()
+            for _ in range(10):
+                await asyncio.sleep(0)
+            # 处理后同键的新事件重新入队
+            assert queue.submit('media', {'pos': 3}, 'main', merge_key='s1') == 'queued'
+            for _ in range(10):
+                await asyncio.sleep(0)
+            for task in (*queue._lanes['media'].tasks, queue._refill_task):
+                task.cancel()
+
+        asyncio.run(main())
+        assert handled == [('main', {'pos': 2}), ('main', {'pos': 9}), ('main', {'pos': 3})]
+        assert queue.metrics()['media']['merged'] == 1 and queue.metrics()['media']['processed'] == 3
+    print("✅ 同键合并正确")
+
+
+def test_full_queue_drops_or_buffers_spill():
+    """队列满时可丢弃事件直接丢弃，其余事件先缓存在内存，不在 submit 中写文件"""
+    print("\n🧪 测试队列满...")
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.jsonl')
+        queue, _ = _queue(spill_path, maxsize=2)
+        queue.submit('media', {'n': 1})
+        queue.submit('media', {'n': 2})
+        assert queue.submit('media', {'progress': 1}, droppable=True) == 'dropped'
+        assert queue.submit('media', {'n': 3}) == 'spilled'
+        assert [e.data for e in queue._overflow] == [{'n': 3}]
+        assert not os.path.exists(spill_path)
+        stats = queue.metrics()['media']
+        assert stats['dropped'] == 1 and stats['spilled'] == 1 and stats['depth'] == 2
+    print("✅ 队列满处理正确")
+
+
+def test_refill_restores_and_discards_stale():
+    """
+    回填先写盘再恢复：文件内同键后到的合并到前面（即使队列已到回填上限），
+    已有更新的实时事件时丢弃旧溢出事件，放不下的留在文件
+    """
+    print("\n🧪 测试回填...")
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.jsonl')
+        queue, _ = _queue(spill_path, maxsize=4)
+        for n in range(4):
+            queue.submit('media', {'fill': n})
+        for event in ({'k': 'a', 'v': 1}, {'k': 'a', 'v': 2}, {'k': 'x', 'v': 'old'}, {'n': 1}, {'n': 2}):
+            assert queue.submit('media', event, merge_key=event.get('k')) == 'spilled'
+
+        async def main():
+            _drain(queue)
+            # 溢出后实时到达的同键事件比文件中的新
+            queue.submit('media', {'k': 'x', 'v': 'live'}, merge_key='x')
+            await queue._refill()
+
+        asyncio.run(main())
+        # 队列只回填到一半容量，剩余的写回文件
+        assert _drain(queue) == [{'k': 'x', 'v': 'live'}, {'k': 'a', 'v': 2}]
+        assert queue._overflow == []
+        with open(spill_path, encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+
+        asyncio.run(queue._refill())
+        assert _drain(queue) == [{'n': 1}, {'n': 2}]
+        assert not os.path.exists(spill_path)
+        assert queue.metrics()['media']['merged'] == 2
+    print("✅ 回填正确")
+
+
+def test_persist_and_restart():
+    """退出时处理中、排队中与尚未写盘的事件按顺序保存，重启后回填"""
+    print("\n🧪 测试退出持久化...")
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.jsonl')
+        queue, _ = _queue(spill_path, maxsize=2)
+        lane = queue._lanes['media']
+        queue.submit('media', {'n': 'inflight'})
+        lane.inflight.add(lane.queue.popleft())
+        queue.submit('media', {'n': 'queued'})
+        queue.submit('media', {'n': 'queued2'})
+        queue.submit('media', {'n': 'overflow'})
+        queue._persist()
+
+        restarted, _ = _queue(spill_path, maxsize=8)
+        asyncio.run(restarted._refill())
+        assert _drain(restarted) == [{'n': 'inflight'}, {'n': 'queued'}, {'n': 'queued2'}, {'n': 'overflow'}]
+        assert not os.path.exists(spill_path)
+    print("✅ 退出持久化正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_merge_keeps_latest, test_full_queue_drops_or_buffers_spill, test_refill_restores_and_discards_stale,
+             test_persist_and_restart]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+IP / 网段区间编码测试
+（不需要 bot 依赖，直接加载 bot/func_helper/ip_range.py）
+"""
+
+import importlib.util
+import ipaddress
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("ip_range", "bot/func_helper/ip_range.py")
+ip_range = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ip_range)
+
+
+def test_encoding_preserves_order():
+    """16 字节编码的字节序与地址数值序一致，IPv4 与其映射地址编码相同"""
+    print("\n🧪 测试地址编码...")
+    addresses = ['0.0.0.1', '1.2.3.4', '1.2.3.255', '1.2.4.0', '255.255.255.255', '::1', '2001:db8::1', 'ffff::']
+    encoded = [ip_range.ip_to_bin(a) for a in addresses]
+    assert all(len(b) == 16 for b in encoded)
+    numeric = [int(ipaddress.ip_address(a)) for a in addresses]
+    # IPv4 落在 ::ffff:0:0/96 内，与 IPv6 的比较按映射后的数值
+    mapped = [n + (0xffff << 32) if ':' not in a else n for a, n in zip(addresses, numeric)]
+    assert sorted(encoded) == [b for _, b in sorted(zip(mapped, encoded))]
+    assert ip_range.ip_to_bin('::ffff:1.2.3.4') == ip_range.ip_to_bin('1.2.3.4')
+    assert ip_range.ip_to_bin('') is None and ip_range.ip_to_bin('not-an-ip') is None
+    print("✅ 地址编码正确")
+
+
+def test_network_bounds():
+    """网段给出闭区间，边界地址在内、相邻地址在外"""
+    print("\n🧪 测试网段区间...")
+    network = ip_range.parse_network('1.2.3.77/24')
+    assert str(network) == '1.2.3.0/24'
+    assert ip_range.in_network('1.2.3.0', network) and ip_range.in_network('1.2.3.255', network)
+    assert not ip_range.in_network('1.2.4.0', network) and not ip_range.in_network('1.2.2.255', network)
+    assert ip_range.in_network('::ffff:1.2.3.9', network)
+
+    v6 = ip_range.parse_network('2001:db8::/48')
+    lo, hi = ip_range.network_bounds(v6)
+    assert lo <= ip_range.ip_to_bin('2001:db8:0:ffff::1') <= hi
+    assert not ip_range.in_network('2001:db9::1', v6)
+    # IPv4 网段不会匹配 IPv6 地址
+    assert not ip_range.in_network('2001:db8::1', network)
+
+    single = ip_range.parse_network('10.0.0.1')
+    assert ip_range.is_single(single) and ip_range.network_bounds(single)[0] == ip_range.network_bounds(single)[1]
+    assert ip_range.parse_network('1.2.3.4/33') is None and ip_range.parse_network('abc') is None
+    print("✅ 网段区间正确")
+
+
+def test_like_prefix_and_host_bits():
+    """插件查询的前缀按八位组向外对齐，风险放宽按主机位计算"""
+    print("\n🧪 测试前缀与主机位...")
+    assert ip_range.like_prefix(ip_range.parse_network('1.2.3.0/24')) == '1.2.3.%'
+    assert ip_range.like_prefix(ip_range.parse_network('10.2.0.0/15')) == '10.%'
+    assert ip_range.like_prefix(ip_range.parse_network('0.0.0.0/0')) == '%'
+    assert ip_range.like_prefix(ip_range.parse_network('1.2.3.4')) is None
+    assert ip_range.like_prefix(ip_range.parse_network('2001:db8::/32')) is None
+
+    assert ip_range.host_bits(ip_range.parse_network('1.2.3.4')) == 0
+    assert ip_range.host_bits(ip_range.parse_network('1.2.0.0/16')) == 16
+    assert ip_range.host_bits(ip_range.parse_network('2001:db8::/64')) == 0
+    assert ip_range.host_bits(ip_range.parse_network('2001:db8::/48')) == 16
+    print("✅ 前缀与主机位正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_encoding_preserves_order, test_network_bounds, test_like_prefix_and_host_bits]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
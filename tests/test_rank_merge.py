@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+多服务器榜单合并测试
+（不需要 bot 依赖，直接加载 bot/ranks_helper/merge.py）
+"""
+
+import importlib.util
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("merge", "bot/ranks_helper/merge.py")
+merge = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(merge)
+
+
+def test_same_title_summed():
+    """两个服务器上的同名条目合并为一条，次数与时长相加"""
+    print("\n🧪 测试同名合并...")
+    server_a = [['u1', 'a1', 'Movie', '催眠', '2', '300']]
+    server_b = [['u2', 'b1', 'Movie', '催眠', '1', '900'], ['u3', 'b2', 'Movie', '毒液', '1', '100']]
+    rows = merge.merge_reports([server_a, server_b])
+    assert len(rows) == 2
+    assert rows[0][3] == '催眠' and rows[0][4] == 3 and rows[0][5] == 1200
+    # ItemId 取时长最大的服务器
+    assert rows[0][1] == 'b1'
+    print("✅ 同名条目已合并")
+
+
+def test_top_k_by_total_duration():
+    """排名按合并后的总时长，而不是服务器顺序"""
+    print("\n🧪 测试前 k 名...")
+    server_a = [['u', f'a{i}', 'Movie', f'A{i}', '1', str(100 - i)] for i in range(10)]
+    server_b = [['u', 'b0', 'Movie', 'B0', '1', '5000'], ['u', 'x', 'Movie', 'A9', '1', '1000']]
+    rows = merge.merge_reports([server_a, server_b, None], k=3)
+    assert [r[3] for r in rows] == ['B0', 'A9', 'A0']
+    assert rows[1][5] == 1091
+    print("✅ 前 k 名正确")
+
+
+def test_watch_time_merged_by_name():
+    """观影时长按账户名合并，未知账户各自保留"""
+    print("\n🧪 测试观影时长合并...")
+    rows = merge.merge_watch_time([[['alice', '60'], ['bob', '300'], [None, '10']],
+                                   [['alice', '600'], [None, '20']], None])
+    assert rows[0] == ['alice', 660]
+    assert rows[1] == ['bob', 300]
+    assert len(rows) == 4
+    assert merge.merge_watch_time([[['alice', '60'], ['bob', '300']]], k=1) == [['bob', 300]]
+    print("✅ 观影时长合并正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_same_title_summed, test_top_k_by_total_duration, test_watch_time_merged_by_name]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+数据库行读穿缓存测试（版本号防旧数据回写、二级索引、LRU 与 TTL）
+（不需要数据库和 bot 依赖，直接加载 bot/sql_helper/row_cache.py）
+"""
+
+import importlib.util
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("row_cache", "bot/sql_helper/row_cache.py")
+row_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(row_cache)
+
+
+class Row:
+    """模拟 ORM 对象"""
+
+    def __init__(self, tg, name=None, embyid=None, iv=0):
+        self.tg = tg
+        self.name = name
+        self.embyid = embyid
+        self.iv = iv
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _cache(**kwargs) -> row_cache.RowCache:
+    return row_cache.RowCache(snapshot=lambda r: dict(vars(r)), restore=lambda d: Row(**d),
+                              key_field='tg', index_fields=('name', 'embyid'), **kwargs)
+
+
+def test_read_through_and_copies():
+    """主键与二级索引都能命中，返回的是新对象，修改不污染缓存"""
+    print("\n🧪 测试读穿与瞬态对象...")
+    cache = _cache()
+    assert cache.get('tg', 1) == (False, None)
+    cache.put(cache.version, 1, Row(1, 'alice', 'e1', iv=5))
+    found, row = cache.get('name', 'alice')
+    assert found and row.tg == 1 and row.iv == 5
+    row.iv = 99
+    assert cache.get('embyid', 'e1')[1].iv == 5
+    # 主键查询缓存“不存在”，二级索引不会
+    cache.put(cache.version, 2, None)
+    assert cache.get('tg', 2) == (True, None)
+    assert cache.get('name', 'bob') == (False, None)
+    assert cache.stats['hit'] == 3
+    print("✅ 读穿与瞬态对象正确")
+
+
+def test_version_guards_stale_put():
+    """查询期间发生失效时，查询结果不再写入缓存"""
+    print("\n🧪 测试版本号防旧数据回写...")
+    cache = _cache()
+    cache.put(cache.version, 1, Row(1, 'alice', iv=5))
+    # 读线程：缓存未命中前记下版本号……
+    version = cache.version
+    stale = Row(1, 'alice', iv=5)
+    # ……写线程提交新值并失效
+    cache.invalidate(1)
+    assert cache.get('tg', 1) == (False, None) and cache.stats['invalidated'] == 1
+    # 读线程拿着旧结果回来，被丢弃
+    cache.put(version, 1, stale)
+    assert cache.get('tg', 1) == (False, None)
+    # 失效后发起的查询可以正常写入
+    cache.put(cache.version, 1, Row(1, 'alice', iv=6))
+    assert cache.get('tg', 1)[1].iv == 6
+    # clear 同样让之前的查询作废
+    version = cache.version
+    cache.clear()
+    cache.put(version, 1, stale)
+    assert cache.get('name', 'alice') == (False, None)
+    print("✅ 版本号防旧数据回写正确")
+
+
+def test_rename_updates_index():
+    """同一主键重新写入时旧的二级索引被移除"""
+    print("\n🧪 测试二级索引更新...")
+    cache = _cache()
+    cache.put(cache.version, 1, Row(1, 'alice', 'e1'))
+    cache.invalidate(1)
+    cache.put(cache.version, 1, Row(1, 'alice2', 'e1'))
+    assert cache.get('name', 'alice') == (False, None)
+    assert cache.get('name', 'alice2')[1].tg == 1
+    print("✅ 二级索引更新正确")
+
+
+def test_lru_and_ttl():
+    """超出容量淘汰最久未用的行，过期后视为未命中"""
+    print("\n🧪 测试 LRU 与 TTL...")
+    clock = _Clock()
+    row_cache.time = clock
+    cache = _cache(maxsize=2, ttl=10)
+    cache.put(cache.version, 1, Row(1, 'a'))
+    cache.put(cache.version, 2, Row(2, 'b'))
+    cache.get('tg', 1)
+    cache.put(cache.version, 3, Row(3, 'c'))
+    assert cache.get('tg', 2) == (False, None) and cache.get('name', 'b') == (False, None)
+    assert cache.get('tg', 1)[0] and cache.get('tg', 3)[0]
+    clock.now += 11
+    assert cache.get('tg', 1) == (False, None)
+    print("✅ LRU 与 TTL 正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_read_through_and_copies, test_version_guards_stale_put, test_rename_updates_index, test_lru_and_ttl]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
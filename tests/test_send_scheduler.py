@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+出站消息调度核心测试（通道优先级、限流暂停与重试、单会话限速）
+（不需要 bot 依赖，直接加载 bot/func_helper/send_scheduler.py）
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("send_scheduler", "bot/func_helper/send_scheduler.py")
+send_scheduler = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(send_scheduler)
+Lane = send_scheduler.Lane
+
+
+class Flood(Exception):
+    """模拟 pyrogram 的 FloodWait"""
+
+    def __init__(self, value: float):
+        super().__init__(f"flood {value}")
+        self.value = value
+
+
+class Scheduler(send_scheduler.SendScheduler):
+    def __init__(self, **kwargs):
+        super().__init__(**{'global_rate': 1000, 'private_rate': 1000, 'group_rate': 1000, **kwargs})
+        self.floods = []
+
+    def _flood_wait(self, error):
+        return error.value if isinstance(error, Flood) else None
+
+    def _on_flood_wait(self, lane, seconds):
+        self.floods.append((lane, seconds))
+
+
+def _recorder(order, name, result=None):
+    async def send():
+        order.append(name)
+        return result if result is not None else name
+    return send
+
+
+def test_lane_priority():
+    """同时排队时交互通道先于普通、普通先于群发"""
+    print("\n🧪 测试通道优先级...")
+    order = []
+
+    async def main():
+        scheduler = Scheduler()
+        futures = [scheduler.submit(1, _recorder(order, 'bulk'), Lane.BULK),
+                   scheduler.submit(2, _recorder(order, 'normal'), Lane.NORMAL),
+                   scheduler.submit(3, _recorder(order, 'interactive'), Lane.INTERACTIVE)]
+        await scheduler.join()
+        return [f.result() for f in futures], scheduler.metrics()
+
+    results, metrics = asyncio.run(main())
+    assert order == ['interactive', 'normal', 'bulk']
+    assert results == ['bulk', 'normal', 'interactive']
+    assert metrics['lanes']['bulk']['sent'] == 1 and metrics['in_flight'] == 0
+    print("✅ 通道优先级正确")
+
+
+def test_flood_wait_pauses_lane_and_requeues():
+    """限流错误只暂停触发的通道，任务放回队首，暂停结束后重试成功"""
+    print("\n🧪 测试限流重试...")
+    order = []
+
+    async def main():
+        scheduler = Scheduler()
+        attempts = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise Flood(0.1)
+            order.append('bulk-retry')
+            return 'ok'
+
+        started = time.monotonic()
+        first = scheduler.submit(1, flaky, Lane.BULK)
+        await asyncio.sleep(0.02)
+        # 群发通道暂停期间同通道的新任务排在重试之后，交互通道照常发送
+        second = scheduler.submit(2, _recorder(order, 'bulk-next'), Lane.BULK)
+        other = scheduler.submit(3, _recorder(order, 'interactive'), Lane.INTERACTIVE)
+        await scheduler.join()
+        stats = scheduler.metrics()['lanes']['bulk']
+        return first.result(), second.result(), other.result(), attempts[1] - started, stats, scheduler.floods
+
+    first, second, other, retry_after, stats, floods = asyncio.run(main())
+    assert (first, second, other) == ('ok', 'bulk-next', 'interactive')
+    # 放回队首：重试先于同通道后面的任务
+    assert order == ['interactive', 'bulk-retry', 'bulk-next']
+    assert retry_after >= 0.1
+    assert stats['flood_waits'] == 1 and stats['sent'] == 2 and stats['failed'] == 0
+    assert floods == [(Lane.BULK, 0.1)]
+    print("✅ 限流重试正确")
+
+
+def test_flood_retries_exhausted_and_errors():
+    """超过重试次数后 Future 得到限流异常；普通异常直接失败不重试"""
+    print("\n🧪 测试重试上限...")
+
+    async def main():
+        scheduler = Scheduler()
+        calls = []
+
+        async def always_flood():
+            calls.append(1)
+            raise Flood(0)
+
+        async def broken():
+            raise ValueError("bad request")
+
+        flooded = scheduler.submit(1, always_flood, Lane.NORMAL)
+        failed = scheduler.submit(2, broken, Lane.NORMAL)
+        await scheduler.join()
+        return flooded.exception(), failed.exception(), len(calls), scheduler.metrics()['lanes']['normal']
+
+    flood_error, error, calls, stats = asyncio.run(main())
+    assert isinstance(flood_error, Flood)
+    assert isinstance(error, ValueError)
+    assert calls == send_scheduler.SendScheduler._MAX_FLOOD_RETRIES + 1
+    assert stats['failed'] == 2 and stats['flood_waits'] == calls
+    print("✅ 重试上限正确")
+
+
+def test_cancelled_future_and_chat_rate():
+    """调用方取消 Future 不影响调度；同一会话按单会话速率间隔发送"""
+    print("\n🧪 测试取消与单会话限速...")
+    sent_at = []
+
+    async def main():
+        scheduler = Scheduler(private_rate=10)
+
+        async def send():
+            sent_at.append(time.monotonic())
+            return True
+
+        cancelled = scheduler.submit(42, send, Lane.NORMAL)
+        cancelled.cancel()
+        follow = scheduler.submit(42, send, Lane.NORMAL)
+        await asyncio.wait_for(scheduler.join(), 2)
+        return follow.result(), scheduler.metrics()
+
+    result, metrics = asyncio.run(main())
+    assert result is True
+    assert len(sent_at) == 2 and sent_at[1] - sent_at[0] >= 0.09
+    assert metrics['lanes']['normal']['sent'] == 2 and metrics['chats'] == 1
+    print("✅ 取消与单会话限速正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_lane_priority, test_flood_wait_pauses_lane_and_requeues, test_flood_retries_exhausted_and_errors,
+             test_cancelled_future_and_chat_rate]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
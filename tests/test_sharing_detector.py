@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+账号共享检测测试
+（不需要 bot 依赖，直接加载 bot/func_helper/sharing_detector.py）
+"""
+
+import importlib.util
+import os
+import sys
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("sharing_detector", "bot/func_helper/sharing_detector.py")
+sharing_detector = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sharing_detector)
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+RECENT = NOW - timedelta(days=1)
+
+
+def test_union_find():
+    """并查集合并与分组"""
+    print("\n🧪 测试并查集...")
+    uf = sharing_detector.UnionFind()
+    uf.union('a', 'b')
+    uf.union('c', 'd')
+    uf.union('b', 'd')
+    uf.find('e')
+    groups = sorted(sorted(g) for g in uf.groups().values())
+    assert groups == [['a', 'b', 'c', 'd'], ['e']]
+    print("✅ 并查集正确")
+
+
+def test_transitive_cluster_and_ranking():
+    """A-B 共用 IP、B-C 共用设备，连成一个簇；簇按人数排序"""
+    print("\n🧪 测试连通簇...")
+    rows = [
+        ('A', '8.8.8.8', 'iPhone', 'Infuse', RECENT, 5),
+        ('B', '8.8.8.8', 'TV', 'Emby', RECENT, 5),
+        ('C', '1.1.1.1', 'TV', 'Emby', RECENT, 5),
+        ('D', '9.9.9.9', 'Mac', 'Web', RECENT, 5),
+        ('E', '9.9.9.9', 'Pad', 'Emby', RECENT, 5),
+    ]
+    clusters = sharing_detector.detect_clusters(rows, now=NOW)
+    assert [sorted(c.users) for c in clusters] == [['A', 'B', 'C'], ['D', 'E']]
+    kinds = {kind for kind, _, _ in clusters[0].evidence}
+    assert kinds == {sharing_detector.IP, sharing_detector.SUBNET, sharing_detector.DEVICE}
+    print("✅ 连通簇正确")
+
+
+def test_noise_filtered():
+    """内网地址、过旧的记录和被大量用户共用的特征不参与连接"""
+    print("\n🧪 测试噪声过滤...")
+    old = NOW - timedelta(days=120)
+    rows = [
+        ('A', '192.168.1.10', 'x', 'y', RECENT, 50),
+        ('B', '192.168.1.10', 'z', 'w', RECENT, 50),
+        ('C', '8.8.8.8', 'p1', 'q', old, 3),
+        ('D', '8.8.8.8', 'p2', 'q', old, 3),
+    ]
+    # 反代 / 公共出口：20 个用户共用同一个公网 IP
+    rows += [(f'U{i}', '4.4.4.4', f'd{i}', 'c', RECENT, 10) for i in range(20)]
+    assert sharing_detector.detect_clusters(rows, now=NOW) == []
+    print("✅ 噪声已过滤")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_union_find, test_transitive_cluster_and_ranking, test_noise_filtered]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+数据库异步访问层测试
+验证 .aio 版本在线程池中执行、不阻塞事件循环，且并发受 DB_WORKERS 限制
+（不需要数据库和 bot 依赖，直接加载 bot/sql_helper/aio.py）
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+spec = importlib.util.spec_from_file_location("aio", os.path.join(ROOT, "bot", "sql_helper", "aio.py"))
+aio = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(aio)
+
+# 模拟一次慢查询
+SLOW_QUERY = 0.2
+
+
+@aio.offload
+def slow_query(value):
+    time.sleep(SLOW_QUERY)
+    return value
+
+
+async def _max_loop_lag(coro, interval=0.01):
+    """在 coro 执行期间测量事件循环的最大调度延迟（秒）"""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(lag, time.perf_counter() - start - interval)
+
+    task = asyncio.create_task(ticker())
+    # 让 ticker 先进入第一次 sleep，再开始执行被测协程
+    await asyncio.sleep(0)
+    result = await coro
+    done = True
+    await task
+    return lag, result
+
+
+def _peak_concurrency(calls: int) -> int:
+    """并发提交 calls 个短查询，返回同时执行的最大数量"""
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def query():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(aio.run_sync(query) for _ in range(calls)))
+
+    asyncio.run(main())
+    return peak
+
+
+def test_sync_shim_unchanged():
+    """同步调用方式保持不变"""
+    assert slow_query(1) == 1
+    assert slow_query.__name__ == 'slow_query'
+
+
+def test_aio_does_not_block_loop():
+    """慢查询期间事件循环延迟应远小于查询耗时"""
+    async def main():
+        return await _max_loop_lag(asyncio.gather(*(slow_query.aio(i) for i in range(8))))
+
+    lag, result = asyncio.run(main())
+    assert result == list(range(8))
+    assert lag < SLOW_QUERY / 2, f"事件循环被阻塞 {lag:.3f}s"
+
+
+def test_blocking_call_is_detected():
+    """对照组：直接在协程中调用同步函数会被测出阻塞"""
+    async def blocking():
+        return slow_query(1)
+
+    async def main():
+        return await _max_loop_lag(blocking())
+
+    lag, _ = asyncio.run(main())
+    assert lag >= SLOW_QUERY / 2
+
+
+def test_concurrency_bounded():
+    """同时执行的查询数不超过 DB_WORKERS"""
+    assert _peak_concurrency(aio.DB_WORKERS * 3) <= aio.DB_WORKERS
+
+
+def test_configure_resizes_pool():
+    """configure 按配置重建线程池，并发上限随之变化"""
+    default = aio.DB_WORKERS
+    try:
+        aio.configure(3)
+        assert aio.DB_WORKERS == 3
+        assert _peak_concurrency(12) <= 3
+        aio.configure(0)
+        assert aio.DB_WORKERS == 1
+    finally:
+        aio.configure(default)
+
+
+if __name__ == '__main__':
+    test_sync_shim_unchanged()
+    test_aio_does_not_block_loop()
+    test_blocking_call_is_detected()
+    test_concurrency_bounded()
+    test_configure_resizes_pool()
+    print("✅ 数据库异步访问层测试通过")
+    sys.exit(0)
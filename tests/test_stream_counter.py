@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+跨服务器播放流计数测试
+（不需要 bot 依赖，直接加载 bot/func_helper/stream_counter.py）
+"""
+
+import importlib.util
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+spec = importlib.util.spec_from_file_location("stream_counter", "bot/func_helper/stream_counter.py")
+stream_counter = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_counter)
+
+
+def test_limit_across_servers():
+    """同一用户在不同服务器上的流合并计数，超限时返回最新一路"""
+    print("\n🧪 测试跨服务器计数...")
+    counter = stream_counter.StreamCounter(limit=2)
+    assert counter.start(1001, ('main', 's1')) is None
+    assert counter.start(1001, ('hk', 's2')) is None
+    # 重复的开始事件不重复计数
+    assert counter.start(1001, ('hk', 's2')) is None
+    assert counter.start(1001, ('jp', 's3')) == ('jp', 's3')
+    assert counter.count(1001) == 3
+    assert counter.excess(1001) == [('jp', 's3')]
+    # 其他用户不受影响
+    assert counter.start(1002, ('main', 's4')) is None
+    counter.stop(('jp', 's3'))
+    assert counter.count(1001) == 2 and counter.excess(1001) == []
+    print("✅ 跨服务器计数正确")
+
+
+def test_stop_unknown_and_cleanup():
+    """结束未知的流无副作用，用户的流全部结束后不再占用内存"""
+    print("\n🧪 测试结束事件...")
+    counter = stream_counter.StreamCounter(limit=1)
+    assert counter.stop(('main', 'nope')) is None
+    counter.start(1001, ('main', 's1'))
+    assert counter.stop(('main', 's1')) == 1001
+    assert counter.count(1001) == 0 and len(counter) == 0
+    assert 1001 not in counter._streams
+    print("✅ 结束事件正确")
+
+
+def test_reconcile_with_snapshot():
+    """快照移除漏掉结束事件的流、补上漏掉开始事件的流，只影响该服务器"""
+    print("\n🧪 测试快照校正...")
+    counter = stream_counter.StreamCounter(limit=2)
+    counter.start(1001, ('main', 'gone'))
+    counter.start(1001, ('hk', 'h1'))
+    over = counter.reconcile('main', {('main', 'm1'): 1001, ('main', 'm2'): 1001})
+    assert counter.owner(('main', 'gone')) is None
+    assert counter.owner(('hk', 'h1')) == 1001
+    assert counter.count(1001) == 3
+    assert over == {1001}
+    assert counter.excess(1001) == [('main', 'm2')]
+    # 归属变化（绑定更新）时按新用户计数
+    counter.reconcile('main', {('main', 'm1'): 2002})
+    assert counter.owner(('main', 'm1')) == 2002
+    assert counter.count(1001) == 1
+    print("✅ 快照校正正确")
+
+
+def main():
+    """运行所有测试"""
+    tests = [test_limit_across_servers, test_stop_unknown_and_cleanup, test_reconcile_with_snapshot]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} 失败: {e}")
+    print(f"\n总计: {len(tests)} 个测试，失败: {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())